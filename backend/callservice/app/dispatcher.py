@@ -0,0 +1,271 @@
+# backend/app/dispatcher.py
+"""
+Hand incoming-call jobs to a worker instead of running them in the web process.
+
+With CALL_DISPATCH=celery (or auto with a reachable broker) jobs start the
+Celery stage chain (worker.tasks, one `calls.<stage>` queue per stage); with
+CALL_DISPATCH=local (or auto without Redis) they run on a bounded in-process
+pool. Either way at most CALL_QUEUE_MAX calls may be waiting: beyond that the
+webhook sheds load and the caller hears the fallback prompt immediately. Jobs
+are tracked by CallSid for the /calls/{sid} route. Lower priority numbers run
+first.
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+from . import prompts
+from .services import tracing
+from .services.notifier import save_tts
+from .telephony import handle_incoming_call_webhook
+
+CALL_DISPATCH = os.environ.get("CALL_DISPATCH", "auto")   # auto | celery | local
+CALL_QUEUE_MAX = int(os.environ.get("CALL_QUEUE_MAX", "32"))
+CALL_WORKERS = int(os.environ.get("CALL_WORKERS", "2"))
+CALL_JOBS_KEPT = int(os.environ.get("CALL_JOBS_KEPT", "1000"))
+CELERY_PROBE_TIMEOUT = float(os.environ.get("CELERY_PROBE_TIMEOUT", "1.0"))
+
+PRIORITY_CALL = 0
+PRIORITY_BACKGROUND = 5
+
+CALL_QUEUE_DEPTH = tracing.register(
+    tracing.Gauge("callservice_call_queue_depth", "Calls waiting for a worker."), "backend"
+)
+CALLS_TOTAL = tracing.register(
+    tracing.Counter("callservice_calls_total", "Incoming calls by dispatch outcome."), "outcome"
+)
+
+# Celery task states -> job states reported by status()
+_CELERY_STATES = {
+    "PENDING": "queued",
+    "RECEIVED": "queued",
+    "RETRY": "queued",
+    "STARTED": "running",
+    "SUCCESS": "done",
+    "FAILURE": "failed",
+    "REVOKED": "failed",
+}
+
+
+class LocalPool:
+    """
+    Fixed set of daemon worker threads pulling (priority, seq, job) from a
+    priority queue. submit() refuses work once max_queued jobs are waiting.
+    """
+
+    def __init__(self, workers: int = CALL_WORKERS, max_queued: int = CALL_QUEUE_MAX):
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._threads = []
+
+    def _start(self):
+        # caller holds _lock
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, name=f"call-worker-{len(self._threads)}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn, *args, priority: int = PRIORITY_CALL) -> bool:
+        with self._lock:
+            if self._queued >= self.max_queued:
+                return False
+            self._start()
+            self._queued += 1
+        self._queue.put((priority, next(self._seq), fn, args))
+        return True
+
+    def _work(self):
+        while True:
+            _, _, fn, args = self._queue.get()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                fn(*args)
+            except Exception as e:
+                print("[dispatcher] local job failed:", e)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+    def depth(self) -> dict:
+        with self._lock:
+            return {"queued": self._queued, "running": self._running}
+
+
+class CallDispatcher:
+    def __init__(self, mode: str = CALL_DISPATCH, max_queued: int = CALL_QUEUE_MAX, workers: int = CALL_WORKERS):
+        self.mode = mode
+        self.max_queued = max(1, max_queued)
+        self.local = LocalPool(workers=workers, max_queued=max_queued)
+        self._backend = None
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()   # CallSid -> job dict, oldest first
+
+    # -- backend selection -------------------------------------------------
+    @property
+    def backend(self) -> str:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._resolve_backend()
+                    print(f"[dispatcher] using {self._backend} backend")
+        return self._backend
+
+    def _resolve_backend(self) -> str:
+        if self.mode == "local":
+            return "local"
+        try:
+            from worker.celery_app import celery
+            if celery.conf.task_always_eager:
+                return "celery"
+            conn = celery.connection_for_write()
+            try:
+                conn.ensure_connection(max_retries=1, timeout=CELERY_PROBE_TIMEOUT)
+            finally:
+                conn.release()
+            return "celery"
+        except Exception as e:
+            if self.mode == "celery":
+                raise
+            print("[dispatcher] Celery broker unavailable, running calls in-process:", e)
+            return "local"
+
+    # -- job bookkeeping ---------------------------------------------------
+    def _track(self, call_sid: str, **fields):
+        with self._lock:
+            job = self._jobs.get(call_sid)
+            if job is None:
+                job = self._jobs[call_sid] = {"call_sid": call_sid}
+                while len(self._jobs) > CALL_JOBS_KEPT:
+                    self._jobs.popitem(last=False)
+            job.update(fields)
+            return dict(job)
+
+    def _run_local(self, payload: dict):
+        call_sid = payload["CallSid"]
+        self._track(call_sid, state="running", started_at=time.time())
+        CALL_QUEUE_DEPTH.set("local", self.local.depth()["queued"])
+        try:
+            handle_incoming_call_webhook(payload)
+            self._track(call_sid, state="done", finished_at=time.time())
+        except Exception as e:
+            self._track(call_sid, state="failed", finished_at=time.time(), error=str(e))
+            raise
+
+    def _celery_depth(self) -> int:
+        """
+        Messages waiting across all stage queues; a call sits in at most one.
+        """
+        from worker.celery_app import celery, CALL_STAGE_QUEUES
+        if celery.conf.task_always_eager:
+            return 0
+        depth = 0
+        with celery.connection_for_read() as conn:
+            for name in CALL_STAGE_QUEUES:
+                try:
+                    # a failed passive declare closes the channel, so one per queue
+                    with conn.channel() as channel:
+                        depth += channel.queue_declare(queue=name, passive=True).message_count
+                except conn.channel_errors:
+                    pass   # not declared yet, so nothing is waiting
+        CALL_QUEUE_DEPTH.set("celery", depth)
+        return depth
+
+    def _submit_celery(self, payload: dict, priority: int) -> bool:
+        if self._celery_depth() >= self.max_queued:
+            return False
+        from worker.celery_app import celery
+        from worker.tasks import start_call_pipeline
+        try:
+            start_call_pipeline(payload, priority=priority)
+        except Exception as e:
+            if not celery.conf.task_always_eager:
+                raise
+            # eager mode ran the chain inline and its error callback already answered the caller
+            print("[dispatcher] eager call chain failed:", e)
+        return True
+
+    # -- public API --------------------------------------------------------
+    def dispatch(self, payload: dict, priority: int = PRIORITY_CALL) -> dict:
+        """
+        Queue one webhook payload. Returns the job dict; job["state"] is
+        "shed" when the queue was full and the call was not accepted.
+        """
+        payload = dict(payload)
+        payload.setdefault("CallSid", payload.get("call_sid") or f"local-{uuid.uuid4().hex}")
+        call_sid = payload["CallSid"]
+        backend = self.backend
+        accepted = False
+        if backend == "celery":
+            try:
+                self._track(call_sid, backend="celery", state="queued", enqueued_at=time.time())
+                accepted = self._submit_celery(payload, priority)
+            except Exception as e:
+                print("[dispatcher] Celery enqueue failed, running in-process:", e)
+                backend = "local"
+        if backend == "local":
+            self._track(call_sid, backend="local", state="queued", enqueued_at=time.time())
+            accepted = self.local.submit(self._run_local, payload, priority=priority)
+            CALL_QUEUE_DEPTH.set("local", self.local.depth()["queued"])
+
+        CALLS_TOTAL.inc("accepted" if accepted else "shed")
+        if not accepted:
+            print(f"[dispatcher] queue full ({self.max_queued}), shedding call {call_sid}")
+            return self._track(call_sid, state="shed", finished_at=time.time())
+        return self._track(call_sid, priority=priority)
+
+    def status(self, call_sid: str):
+        with self._lock:
+            job = self._jobs.get(call_sid)
+            job = dict(job) if job else None
+        if job and job.get("backend") == "celery" and job["state"] not in ("shed", "done", "failed"):
+            try:
+                from worker.celery_app import celery
+                res = celery.AsyncResult(call_sid)
+                job["state"] = _CELERY_STATES.get(res.state, job["state"])
+                if res.state == "STARTED" and isinstance(res.info, dict):
+                    job["stage"] = res.info.get("stage")
+            except Exception as e:
+                print("[dispatcher] Celery status lookup failed:", e)
+        return job
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "max_queued": self.max_queued, "local": self.local.depth()}
+
+
+def shed_twiml(payload: dict) -> str:
+    """
+    TwiML that plays the fallback prompt right away; used when the queue is full.
+    The prompt is pre-synthesized at startup, so this is a store lookup.
+    """
+    caller = payload.get("From") or payload.get("from") or "unknown"
+    try:
+        _, play_url = save_tts(caller, prompts.PROCESSING_FAILED)
+    except Exception as e:
+        print("[dispatcher] fallback prompt unavailable:", e)
+        return "<Response><Hangup/></Response>"
+    return f"<Response><Play>{escape(play_url)}</Play></Response>"
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> CallDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = CallDispatcher()
+    return _dispatcher
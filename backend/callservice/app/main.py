@@ -1,14 +1,23 @@
 # backend/app/main.py
 
-from fastapi import FastAPI, Request, BackgroundTasks, Depends
-from fastapi.responses import PlainTextResponse, FileResponse
+from fastapi import FastAPI, Request, Depends, Query
+from fastapi.responses import PlainTextResponse, FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel   # 👈 NEW
-from .telephony import handle_incoming_call_webhook
-from .models import SessionLocal, QueryRecord
-from .services.qa_model import answer_query   # 👈 NEW
-
+from . import outbox, recorder, rollups
+from .dispatcher import get_dispatcher, shed_twiml
+from .models import SessionLocal, iter_query_records_ndjson, list_query_page, save_query_record
+from .services.qa_model import answer_query, astream_answer   # 👈 NEW
+from .services import answer_cache, preload, tracing
+from .services.audio_store import get_store, AUDIO_EXTENSIONS
+from .services.translation_cache import get_cache as get_translation_cache
+
+import datetime
+import json
 import os
+import threading
+from typing import Optional
 
 app = FastAPI()
 
@@ -21,65 +30,205 @@ def get_db():
         db.close()
 
 
+@app.on_event("startup")
+def warm_models():
+    # load the models this process serves (PRELOAD_API) before the first call arrives
+    preload.preload("api")
+    # pick Celery or the local pool now rather than on the first call
+    threading.Thread(target=get_dispatcher().stats, name="dispatcher-probe", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def flush_records():
+    # write out call records still queued in the write-behind recorder,
+    # and send the SMS still waiting in the outbox
+    recorder.shutdown()
+    outbox.shutdown()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
 @app.post("/webhook/call")
-async def call_webhook(request: Request, background_tasks: BackgroundTasks):
+async def call_webhook(request: Request):
     form = await request.form()
     payload = {k: form.get(k) for k in form.keys()}
-    background_tasks.add_task(handle_incoming_call_webhook, payload)
+    # queued to Celery or the local call pool; never run in the web process
+    job = await run_in_threadpool(get_dispatcher().dispatch, payload)
+    if job["state"] == "shed":
+        twiml = await run_in_threadpool(shed_twiml, payload)
+        return PlainTextResponse(twiml, status_code=200, media_type="application/xml")
     return PlainTextResponse("<Response></Response>", status_code=200)
 
 
+@app.post("/webhook/sms-status")
+async def sms_status_webhook(request: Request):
+    # Twilio StatusCallback (TWILIO_STATUS_CALLBACK) for messages sent by the outbox
+    form = await request.form()
+    await run_in_threadpool(outbox.record_status, form.get("MessageSid"), form.get("MessageStatus"), form.get("ErrorCode"))
+    return PlainTextResponse("", status_code=204)
+
+
+@app.get("/sms/stats")
+def sms_stats():
+    return outbox.get_outbox().stats()
+
+
+@app.get("/calls/{call_sid}")
+def call_status(call_sid: str):
+    job = get_dispatcher().status(call_sid)
+    if job is None:
+        return PlainTextResponse("Not found", status_code=404)
+    return job
+
+
+QUERIES_PAGE_MAX = int(os.environ.get("QUERIES_PAGE_MAX", "500"))
+
+
+def _query_filters(
+    caller: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    fields: Optional[str] = Query(None, description="comma-separated columns; id and created_at are always included"),
+    cursor: Optional[str] = None,
+):
+    return {
+        "caller": caller,
+        "since": since,
+        "until": until,
+        "min_confidence": min_confidence,
+        "max_confidence": max_confidence,
+        "fields": [f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+        "cursor": cursor,
+    }
+
+
 @app.get("/queries")
-def list_queries(db: Session = Depends(get_db)):
-    records = db.query(QueryRecord).order_by(QueryRecord.created_at.desc()).all()
-    return [
-        {
-            "id": r.id,
-            "caller": r.caller,
-            "question": r.question,
-            "answer": r.answer,
-            "sources": r.sources,
-            "confidence": r.confidence,
-            "created_at": r.created_at,
-        }
-        for r in records
-    ]
+def list_queries(
+    limit: int = Query(50, ge=1),
+    filters: dict = Depends(_query_filters),
+    db: Session = Depends(get_db),
+):
+    # newest first, one page at a time; pass next_cursor back as ?cursor=
+    try:
+        return list_query_page(db, limit=min(limit, QUERIES_PAGE_MAX), **filters)
+    except ValueError as e:
+        return PlainTextResponse(str(e), status_code=400)
+
+
+@app.get("/queries/export")
+def export_queries(limit: Optional[int] = Query(None, ge=1), filters: dict = Depends(_query_filters)):
+    # bulk pull as NDJSON, streamed from a server-side cursor
+    lines = iter_query_records_ndjson(limit=limit, **filters)
+    try:
+        first = next(lines, "")   # surface bad fields/cursor as a 400, not a broken stream
+    except ValueError as e:
+        return PlainTextResponse(str(e), status_code=400)
+
+    def body():
+        yield first
+        yield from lines
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.get("/stats")
+def query_stats(
+    granularity: str = Query("day", regex="^(hour|day)$"),
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    region: Optional[str] = None,
+    topic: Optional[str] = None,
+    top_clusters: int = Query(10, ge=0, le=100),
+    db: Session = Depends(get_db),
+):
+    # answered from the rollup tables, never by scanning query_records
+    return rollups.stats(db, granularity, since, until, region=region, topic=topic, top_clusters=top_clusters)
+
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(tracing.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/startup")
+def startup_stats():
+    # preload timings and lazily imported backends of this process
+    return preload.stats()
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "answers": answer_cache.get_cache().stats(),
+        "translations": get_translation_cache().stats(),
+        "tts_audio": get_store().stats(),
+    }
 
 
 @app.get("/static/tts/{fname}")
 def serve_tts(fname: str):
-    p = f"/tmp/tts/{fname}"
+    ext = fname.rsplit(".", 1)[-1]
+    if os.path.basename(fname) != fname or ext not in AUDIO_EXTENSIONS:
+        return PlainTextResponse("Not found", status_code=404)
+    p = get_store().path(fname)
     if not os.path.exists(p):
         return PlainTextResponse("Not found", status_code=404)
-    return FileResponse(p, media_type="audio/mpeg")
+    # names are content hashes, so a URL's bytes never change
+    return FileResponse(
+        p,
+        media_type=AUDIO_EXTENSIONS[ext],
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
 
 
 # 👇 NEW — API for querying directly
 class QueryRequest(BaseModel):
     question: str
+    stream: bool = False
+
+def _sse(data: dict, event: str = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _stream_answer_events(question: str):
+    """
+    Server-sent events: one `data` event per token, then a `done` event with
+    the stored record id (or an `error` event if generation fails).
+    """
+    parts = []
+    try:
+        async for token in astream_answer(question):
+            parts.append(token)
+            yield _sse({"token": token})
+    except Exception as e:
+        yield _sse({"error": str(e)}, event="error")
+        return
+    answer_text = "".join(parts).strip()
+    record = await run_in_threadpool(save_query_record, "api-user", question, answer_text, [], 0.0)
+    yield _sse({"id": record.id, "question": question, "answer": answer_text}, event="done")
 
 @app.post("/query")
-async def query_endpoint(req: QueryRequest, db: Session = Depends(get_db)):
+async def query_endpoint(req: QueryRequest):
+    if req.stream:
+        return StreamingResponse(
+            _stream_answer_events(req.question),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     try:
-        # Await the async Gemini function
+        # Await the async Ollama client (runs off the event loop)
         answer_text = await answer_query(req.question)
 
-        # Store in DB
-        record = QueryRecord(
-            caller="api-user",
-            question=req.question,
-            answer=answer_text,
-            sources=[],
-            confidence=0.0
+        # Store in DB without blocking the event loop
+        record = await run_in_threadpool(
+            save_query_record, "api-user", req.question, answer_text, [], 0.0
         )
-        db.add(record)
-        db.commit()
-        db.refresh(record)
 
         return {"id": record.id, "question": req.question, "answer": answer_text}
 
@@ -1,19 +1,63 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, create_engine
+from sqlalchemy import (
+    Column, Integer, String, Text, DateTime, Float, Index, create_engine, event, func, insert, select, text, tuple_, update,
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import base64
 import datetime
+import json
 import os
 
+from .services.tracing import traced
+
 # -------------------------------------------------------------------
 # Database Configuration
 # -------------------------------------------------------------------
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./krishi.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# connection pool (ignored for in-memory SQLite, which keeps one connection per thread)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))   # seconds; -1 never
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+# SQLite: WAL lets the dashboard read while the recorder writes; NORMAL only
+# fsyncs at checkpoints, which is durable across app crashes (not power loss)
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def _engine_kwargs():
+    kwargs = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if IS_SQLITE:
+        # SQLite requires check_same_thread=False for multi-threaded apps
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in DATABASE_URL or DATABASE_URL.rstrip("/") == "sqlite:":
+            return kwargs
+    kwargs.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return kwargs
 
-# SQLite requires check_same_thread=False for multi-threaded apps
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs())
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        if SQLITE_JOURNAL_MODE:
+            cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        if SQLITE_SYNCHRONOUS:
+            cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.close()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -35,6 +79,83 @@ class QueryRecord(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     confidence = Column(Float, default=0.0)              # model confidence score
 
+    __table_args__ = (
+        # keyset pagination walks (created_at, id) newest first; the caller
+        # variant serves the per-farmer history without a sort
+        Index("ix_query_records_created_at_id", "created_at", "id"),
+        Index("ix_query_records_caller_created_at_id", "caller", "created_at", "id"),
+    )
+
+
+class IdBlock(Base):
+    """
+    Hi/lo id allocation: next_id is the first id not yet handed out for a
+    table. Writers reserve a block of ids in one short transaction and assign
+    them locally, so a record has its id before it is inserted.
+    """
+    __tablename__ = "id_blocks"
+
+    name = Column(String(64), primary_key=True)          # table the ids are for
+    next_id = Column(Integer, nullable=False)
+
+
+class QueryRollup(Base):
+    """
+    Query counts and confidence sums per time bucket, caller region and
+    topic, kept up to date by app.rollups in the same transaction as the
+    query_records insert.
+    """
+    __tablename__ = "query_rollups"
+
+    granularity = Column(String(8), primary_key=True)    # hour | day
+    bucket = Column(DateTime, primary_key=True)          # UTC start of the hour/day
+    region = Column(String(16), primary_key=True)        # caller number prefix
+    topic = Column(String(32), primary_key=True)
+    queries = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+
+
+class QuestionCluster(Base):
+    """
+    Daily counts of near-identical questions (same content-word key).
+    """
+    __tablename__ = "question_clusters"
+
+    day = Column(DateTime, primary_key=True)
+    cluster = Column(String(128), primary_key=True)
+    topic = Column(String(32))
+    example = Column(Text)                               # first question seen that day
+    queries = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("ix_question_clusters_day_queries", "day", "queries"),)
+
+
+class SmsDelivery(Base):
+    """
+    Delivery state of each outbound SMS part sent by app.outbox: sending ->
+    sent | failed, then Twilio's status callback moves sent parts to
+    delivered | undelivered | failed.
+    """
+    __tablename__ = "sms_deliveries"
+
+    id = Column(Integer, primary_key=True)
+    message_id = Column(String(32), index=True)          # one logical message, all its parts
+    part = Column(Integer, nullable=False, default=1)
+    parts = Column(Integer, nullable=False, default=1)
+    to_number = Column(String(64), nullable=False)
+    from_number = Column(String(64))
+    body = Column(Text)
+    encoding = Column(String(8))                         # gsm7 | ucs2
+    segments = Column(Integer, nullable=False, default=1)
+    status = Column(String(16), nullable=False, default="sending")
+    attempts = Column(Integer, nullable=False, default=0)
+    sid = Column(String(64), unique=True)                # Twilio message sid once accepted
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (Index("ix_sms_deliveries_to_created_at", "to_number", "created_at"),)
+
 # -------------------------------------------------------------------
 # Utility Functions
 # -------------------------------------------------------------------
@@ -43,16 +164,224 @@ def init_db():
     Initializes database (creates tables if not already present).
     """
     Base.metadata.create_all(bind=engine)
+    # create_all skips indexes of tables that already exist
+    for index in QueryRecord.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+def allocate_id_block(model, size: int) -> int:
+    """
+    Reserve `size` consecutive ids for model's table and return the first.
+    The first reservation starts after the table's current max(id); a race
+    between two first reservations is retried. On Postgres the table's
+    SERIAL sequence is moved past the block too, so rows inserted without
+    an id (psql, older deployments) do not collide with reserved ids.
+    """
+    name = model.__tablename__
+    for _ in range(5):
+        with engine.begin() as conn:
+            bumped = conn.execute(
+                update(IdBlock).where(IdBlock.name == name).values(next_id=IdBlock.next_id + size)
+            ).rowcount
+            if bumped:
+                # the row stays locked until commit, so this is our block
+                end = conn.execute(select(IdBlock.next_id).where(IdBlock.name == name)).scalar_one()
+                _advance_sequence(conn, name, end - 1)
+                return end - size
+        start = (_scalar(select(func.max(model.id))) or 0) + 1
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(IdBlock).values(name=name, next_id=start + size))
+                _advance_sequence(conn, name, start + size - 1)
+            return start
+        except IntegrityError:
+            continue   # another process created the row first; bump it instead
+    raise RuntimeError(f"could not allocate ids for {name}")
+
+
+def _advance_sequence(conn, table: str, last_id: int) -> None:
+    # never moves the sequence backwards; no-op for tables without one
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(
+        text(
+            "SELECT setval(s, GREATEST(:last_id, pg_sequence_last_value(s::regclass))) "
+            "FROM pg_get_serial_sequence(:table, 'id') AS s WHERE s IS NOT NULL"
+        ),
+        {"table": table, "last_id": last_id},
+    )
+
+
+def _scalar(stmt):
+    with engine.connect() as conn:
+        return conn.execute(stmt).scalar()
+
+
+def new_query_record(caller, question, answer, sources, confidence=0.0) -> QueryRecord:
+    """
+    Unsaved QueryRecord with the column values save_query_record stores.
+    """
+    if not isinstance(sources, str):
+        sources = json.dumps(sources, ensure_ascii=False)
+    return QueryRecord(
+        caller=caller, question=question, answer=answer, sources=sources,
+        confidence=confidence, created_at=datetime.datetime.utcnow(),
+    )
+
+
+def insert_query_records(rows) -> None:
+    """
+    One bulk INSERT (executemany) of column dicts, in one transaction that
+    also adds them to the analytics rollups. The rollups run under a
+    savepoint: if they fail, the records are committed without them and
+    `python -m app.rollups rebuild` catches up.
+    """
+    from . import rollups
+    with engine.begin() as conn:
+        conn.execute(insert(QueryRecord), rows)
+        if rollups.STATS_ROLLUPS:
+            try:
+                with conn.begin_nested():
+                    rollups.apply(conn, rows)
+            except Exception as e:
+                print(f"[rollups] skipped {len(rows)} records, run `python -m app.rollups rebuild`: {e}")
+                rollups.ROLLUP_FAILURES.inc("query_rollups", len(rows))
+
+
+def insert_sms_deliveries(rows) -> list:
+    """
+    Insert delivery rows (column dicts) in one transaction; returns their ids.
+    """
+    now = datetime.datetime.utcnow()
+    with engine.begin() as conn:
+        return [
+            conn.execute(insert(SmsDelivery).values(created_at=now, updated_at=now, **row)).inserted_primary_key[0]
+            for row in rows
+        ]
+
+
+def update_sms_delivery(delivery_id: int = None, message_sid: str = None, only_status=None, **values) -> int:
+    """
+    Update one delivery row, by id or by Twilio message sid, optionally only
+    while its status is one of only_status. Returns rows matched.
+    """
+    if delivery_id is not None:
+        where = [SmsDelivery.id == delivery_id]
+    else:
+        where = [SmsDelivery.sid == message_sid]
+    if only_status:
+        where.append(SmsDelivery.status.in_(only_status))
+    with engine.begin() as conn:
+        return conn.execute(
+            update(SmsDelivery).where(*where).values(updated_at=datetime.datetime.utcnow(), **values)
+        ).rowcount
+
 
 # in backend/app/models.py (existing)
+@traced("db")
 def save_query_record(caller, question, answer, sources, confidence=0.0):
+    """
+    Record a call. The returned QueryRecord already has its id and
+    created_at; with DB_WRITE_BEHIND on (default) the row is inserted by the
+    background recorder shortly after, otherwise before this returns.
+    """
+    from .recorder import get_recorder
+    return get_recorder().record(new_query_record(caller, question, answer, sources, confidence))
+
+
+
+# -------------------------------------------------------------------
+# Listing (keyset pagination over created_at, id)
+# -------------------------------------------------------------------
+QUERY_FIELDS = ("id", "caller", "question", "answer", "sources", "confidence", "created_at")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime.datetime, record_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, record_id = raw.rsplit("|", 1)
+        return datetime.datetime.fromisoformat(created_at), int(record_id)
+    except Exception:
+        raise InvalidCursor(f"invalid cursor {cursor!r}")
+
+
+def _query_columns(fields=None):
+    """
+    Columns to select: the requested fields plus id and created_at, which
+    the cursor is built from.
+    """
+    names = list(fields or QUERY_FIELDS)
+    unknown = [f for f in names if f not in QUERY_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields {unknown}; expected some of {list(QUERY_FIELDS)}")
+    names = [f for f in QUERY_FIELDS if f in names or f in ("id", "created_at")]
+    return [getattr(QueryRecord, f) for f in names]
+
+
+def query_records_select(fields=None, cursor=None, caller=None, since=None, until=None,
+                         min_confidence=None, max_confidence=None):
+    """
+    SELECT of query records newest first, after `cursor` when given, with the
+    optional filters applied; the (created_at, id) indexes serve the order.
+    """
+    stmt = select(*_query_columns(fields))
+    if caller:
+        stmt = stmt.where(QueryRecord.caller == caller)
+    if since is not None:
+        stmt = stmt.where(QueryRecord.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(QueryRecord.created_at < until)
+    if min_confidence is not None:
+        stmt = stmt.where(QueryRecord.confidence >= min_confidence)
+    if max_confidence is not None:
+        stmt = stmt.where(QueryRecord.confidence <= max_confidence)
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(QueryRecord.created_at, QueryRecord.id) < tuple_(created_at, record_id))
+    return stmt.order_by(QueryRecord.created_at.desc(), QueryRecord.id.desc())
+
+
+def _record_dict(row) -> dict:
+    item = row._asdict()
+    if isinstance(item.get("created_at"), datetime.datetime):
+        item["created_at"] = item["created_at"].isoformat()
+    return item
+
+
+def list_query_page(db, limit: int = 50, **filters) -> dict:
+    """
+    One page of query records: {"items": [...], "next_cursor": str or None}.
+    Pass next_cursor back as `cursor` to get the following page.
+    """
+    rows = db.execute(query_records_select(**filters).limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if more else None
+    return {"items": [_record_dict(r) for r in rows], "next_cursor": next_cursor}
+
+
+def iter_query_records_ndjson(limit: int = None, batch_size: int = 1000, **filters):
+    """
+    Yield matching records as NDJSON lines, streaming rows from the database
+    batch_size at a time (a server-side cursor on Postgres) so the full
+    result set is never held in memory. Owns its session, since the response
+    outlives the request's.
+    """
+    stmt = query_records_select(**filters)
+    if limit:
+        stmt = stmt.limit(limit)
     db = SessionLocal()
     try:
-        rec = QueryRecord(caller=caller, question=question, answer=answer, sources=str(sources), confidence=confidence)
-        db.add(rec)
-        db.commit()
-        db.refresh(rec)
-        return rec
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        for row in result:
+            yield json.dumps(_record_dict(row), ensure_ascii=False) + "\n"
     finally:
         db.close()
-
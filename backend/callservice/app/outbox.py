@@ -0,0 +1,312 @@
+# backend/app/outbox.py
+"""
+Outbound SMS queue.
+
+send_sms_stub() used to build a twilio.rest.Client and POST the message on
+the call's own thread, so one slow Twilio round trip held a call worker.
+The outbox instead splits the message into SMS-sized parts
+(services.sms.split_message, UCS-2 for Malayalam) and puts it on a bounded
+queue. SMS_WORKERS threads send the parts in order through the shared,
+pooled Twilio client:
+
+- Rate limit: a token bucket per sending number allows
+  SMS_RATE_PER_NUMBER segments per second (Twilio long codes take 1).
+  Parts wait for their turn instead of collecting 429s.
+- Retries: timeouts, connection errors, 429 and 5xx are retried
+  SMS_RETRIES times with exponential backoff and jitter (or Retry-After).
+  Other 4xx (bad number, opted out) fail at once. When a part fails, the
+  parts after it are not sent.
+- Delivery state: every part gets a sms_deliveries row (sending -> sent |
+  failed), and Twilio's status callback (POST /webhook/sms-status) records
+  delivered / undelivered.
+- Backpressure and shutdown work like the recorder: a full queue makes
+  send() wait SMS_ENQUEUE_TIMEOUT seconds and then deliver inline; close()
+  lets the workers finish what is queued.
+
+SMS_ASYNC=0 delivers before send() returns, with the same retries.
+"""
+import atexit
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+from . import models
+from .services import sms, tracing
+
+SMS_ASYNC = os.environ.get("SMS_ASYNC", "1") == "1"
+SMS_WORKERS = int(os.environ.get("SMS_WORKERS", "4"))
+SMS_MAX_PENDING = int(os.environ.get("SMS_MAX_PENDING", "1000"))
+SMS_ENQUEUE_TIMEOUT = float(os.environ.get("SMS_ENQUEUE_TIMEOUT", "2.0"))
+SMS_RETRIES = int(os.environ.get("SMS_RETRIES", "5"))
+SMS_BACKOFF_S = float(os.environ.get("SMS_BACKOFF_S", "1.0"))
+SMS_BACKOFF_MAX_S = float(os.environ.get("SMS_BACKOFF_MAX_S", "60"))
+# segments per second per sending number; 0 disables the limit
+SMS_RATE_PER_NUMBER = float(os.environ.get("SMS_RATE_PER_NUMBER", "1"))
+SMS_RATE_BURST = int(os.environ.get("SMS_RATE_BURST", "1"))
+SMS_RECORD_DELIVERIES = os.environ.get("SMS_RECORD_DELIVERIES", "1") == "1"
+
+# Twilio statuses that replace what the outbox recorded
+FINAL_STATUSES = ("delivered", "undelivered", "failed")
+
+SMS_TOTAL = tracing.register(
+    tracing.Counter("callservice_sms_total", "SMS parts sent, retried, failed or skipped; messages delivered inline on a full queue (overflow)."),
+    "outcome",
+)
+SMS_PENDING = tracing.register(
+    tracing.Gauge("callservice_sms_pending", "Messages waiting for an outbox worker."), "queue"
+)
+
+_STOP = object()
+
+
+class RateLimiter:
+    """
+    Token bucket per key. reserve() takes the tokens right away (the bucket
+    may go negative) and returns how long to wait before using them, so
+    concurrent senders are spaced out instead of racing.
+    """
+
+    def __init__(self, rate: float = SMS_RATE_PER_NUMBER, burst: int = SMS_RATE_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._buckets = {}   # key -> (tokens, monotonic time)
+
+    def reserve(self, key: str, n: int = 1) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            tokens, then = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - then) * self.rate) - n
+            self._buckets[key] = (tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+    def wait(self, key: str, n: int = 1) -> float:
+        delay = self.reserve(key, n)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class SmsOutbox:
+    def __init__(self, client=None, async_send: bool = SMS_ASYNC, workers: int = SMS_WORKERS,
+                 max_pending: int = SMS_MAX_PENDING, enqueue_timeout: float = SMS_ENQUEUE_TIMEOUT,
+                 retries: int = SMS_RETRIES, backoff_s: float = SMS_BACKOFF_S,
+                 backoff_max_s: float = SMS_BACKOFF_MAX_S, limiter: RateLimiter = None,
+                 record_deliveries: bool = SMS_RECORD_DELIVERIES):
+        self.client = client or sms.get_client()
+        self.async_send = async_send
+        self.workers = max(1, workers)
+        self.enqueue_timeout = enqueue_timeout
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.limiter = limiter or RateLimiter()
+        self.record_deliveries = record_deliveries
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._closed = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._unsent = 0   # messages queued or being sent
+        self._enqueuing = 0   # send() calls between the closed check and the put
+        self._threads = []
+        self.counts = {"sent": 0, "failed": 0, "retried": 0, "skipped": 0, "overflow": 0}
+
+    def send(self, to: str, body: str) -> str:
+        """
+        Queue body for `to` (split into parts) and return the message id that
+        groups its sms_deliveries rows; None for an empty body.
+        """
+        parts = sms.split_message(body)
+        if not parts:
+            return None
+        msg = {"id": uuid.uuid4().hex, "to": to, "from": sms.sender_for(to), "parts": parts}
+        with self._lock:
+            # close() waits for _enqueuing to drop to 0 before stopping the
+            # workers, so a message that passes this check is always sent
+            queued = self.async_send and not self._closed
+            if queued:
+                self._enqueuing += 1
+                self._unsent += 1
+        if not queued:
+            self._deliver(msg)
+            return msg["id"]
+        try:
+            self._ensure_workers()
+            self._queue.put(msg, timeout=self.enqueue_timeout)
+        except queue.Full:
+            # workers cannot keep up (Twilio slow or rate limited): send this one inline
+            with self._lock:
+                self._unsent -= 1
+            self._count("overflow")
+            self._deliver(msg)
+            return msg["id"]
+        finally:
+            with self._lock:
+                self._enqueuing -= 1
+                if self._enqueuing == 0:
+                    self._idle.notify_all()
+        SMS_PENDING.set("sms", self._queue.qsize())
+        return msg["id"]
+
+    def _ensure_workers(self):
+        if len(self._threads) < self.workers:
+            with self._lock:
+                while len(self._threads) < self.workers:
+                    t = threading.Thread(target=self._run, name=f"sms-outbox-{len(self._threads)}", daemon=True)
+                    t.start()
+                    self._threads.append(t)
+
+    def _run(self):
+        while True:
+            msg = self._queue.get()
+            if msg is _STOP:
+                return
+            try:
+                self._deliver(msg)
+            except Exception as e:
+                print(f"[outbox] message {msg['id']} to {msg['to']} failed: {e}")
+            with self._lock:
+                self._unsent -= 1
+                if self._unsent == 0:
+                    self._idle.notify_all()
+            SMS_PENDING.set("sms", self._queue.qsize())
+
+    @tracing.traced("sms_deliver")
+    def _deliver(self, msg):
+        parts = msg["parts"]
+        rows = [
+            {
+                "message_id": msg["id"], "part": i, "parts": len(parts), "to_number": msg["to"],
+                "from_number": msg["from"], "body": body, "encoding": sms.encoding_of(body),
+                "segments": sms.segment_count(body), "status": "sending",
+            }
+            for i, body in enumerate(parts, 1)
+        ]
+        ids = self._db(models.insert_sms_deliveries, rows) or [None] * len(rows)
+        for n, (row, delivery_id) in enumerate(zip(rows, ids)):
+            if not self._send_part(msg, row, delivery_id):
+                # later parts make no sense without this one
+                for skipped in ids[n + 1:]:
+                    self._db(models.update_sms_delivery, skipped, status="failed",
+                             error=f"not sent: part {row['part']} failed")
+                self._count("skipped", len(ids) - n - 1)
+                return False
+        return True
+
+    def _send_part(self, msg, row, delivery_id) -> bool:
+        delay = self.backoff_s
+        for attempt in range(1, self.retries + 2):
+            self.limiter.wait(msg["from"], row["segments"])
+            try:
+                res = self.client.send(msg["to"], row["body"], msg["from"])
+            except sms.SmsError as e:
+                if not e.retryable or attempt > self.retries:
+                    print(f"[outbox] part {row['part']}/{row['parts']} to {msg['to']} failed: {e}")
+                    self._db(models.update_sms_delivery, delivery_id, status="failed", attempts=attempt, error=str(e))
+                    self._count("failed")
+                    return False
+                self._db(models.update_sms_delivery, delivery_id, attempts=attempt, error=str(e))
+                self._count("retried")
+                time.sleep(e.retry_after or min(self.backoff_max_s, delay) * random.uniform(0.5, 1.0))
+                delay *= 2
+                continue
+            self._db(models.update_sms_delivery, delivery_id, status="sent", attempts=attempt,
+                     sid=res.get("sid"), error=None)
+            self._count("sent")
+            return True
+        return False
+
+    def _db(self, fn, *args, **kwargs):
+        # delivery bookkeeping must never stop a message from going out
+        if not self.record_deliveries or (args and args[0] is None):
+            return None
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            print(f"[outbox] could not record delivery state: {e}")
+            return None
+
+    def _count(self, outcome: str, n: int = 1):
+        if n <= 0:
+            return
+        with self._lock:
+            self.counts[outcome] += n
+        SMS_TOTAL.inc(outcome, n)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every message queued so far has been sent or has failed.
+        False on timeout.
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: self._unsent == 0, timeout=timeout)
+
+    def close(self, timeout: float = 30.0):
+        """
+        Stop taking messages and let the workers send what is queued. Later
+        send() calls deliver inline.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # let send() calls already past the closed check finish their put,
+            # so nothing can land behind the stop markers
+            if not self._idle.wait_for(lambda: self._enqueuing == 0, timeout=timeout):
+                print(f"[outbox] shutdown gave up waiting for {self._enqueuing} messages being queued")
+                return
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        if any(t.is_alive() for t in self._threads):
+            print(f"[outbox] shutdown timed out with {self._unsent} messages unsent")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"async": self.async_send, "workers": len(self._threads), "pending": self._unsent, **self.counts}
+
+
+def record_status(sid: str, status: str, error_code: str = None) -> bool:
+    """
+    Apply a Twilio status callback to the delivery row of message `sid`.
+    Callbacks can arrive out of order, so "sent" never overwrites a final
+    status. Returns whether a row was updated.
+    """
+    if not sid or not status:
+        return False
+    values = {"status": status}
+    if error_code:
+        values["error"] = f"Twilio error {error_code}"
+    if status in FINAL_STATUSES:
+        return models.update_sms_delivery(message_sid=sid, **values) > 0
+    if status == "sent":
+        return models.update_sms_delivery(message_sid=sid, only_status=("sending", "sent"), **values) > 0
+    return False   # queued / sending / accepted: nothing new
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> SmsOutbox:
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                if SMS_RECORD_DELIVERIES:
+                    models.SmsDelivery.__table__.create(bind=models.engine, checkfirst=True)
+                _outbox = SmsOutbox()
+                atexit.register(_outbox.close)
+    return _outbox
+
+
+def shutdown():
+    if _outbox is not None:
+        _outbox.close()
@@ -0,0 +1,13 @@
+# backend/app/prompts.py
+# Fixed Malayalam prompts spoken to callers. They are pre-synthesized into the
+# audio store at startup so the fallback paths never wait on TTS.
+
+NO_RECORDING = "ക്ഷമിക്കണം, നിങ്ങളുടെ ശബ്ദം ലഭിച്ചില്ല. ദയവായി വീണ്ടും ശ്രമിക്കുക."
+UNCLEAR_AUDIO = "ക്ഷമിക്കണം, ശബ്ദം വ്യക്തമല്ല. ദയവായി ചെറിയ വാചകമായി വീണ്ടും പറയുക."
+PROCESSING_FAILED = "ക്ഷമിക്കണം, പ്രവേശനം പരിഗണിക്കപ്പെട്ടില്ല. പിന്നീട് ശ്രമിക്കുക."
+NOT_RECOGNIZED = "ക്ഷമിക്കണം, നിങ്ങളുടെ ശബ്ദം തിരിച്ചറിയാനായില്ല. ദയവായി വീണ്ടും വിളിക്കൂ അല്ലെങ്കിൽ SMS വഴി അറിയിക്കുക."
+
+# SMS sent with every answer; {answer} is the Malayalam answer text
+SMS_ANSWER = "നിങ്ങളുടെ ചോദ്യം: \n\n{answer}\n"
+
+FALLBACK_PROMPTS = [NO_RECORDING, UNCLEAR_AUDIO, PROCESSING_FAILED, NOT_RECOGNIZED]
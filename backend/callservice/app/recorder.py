@@ -0,0 +1,265 @@
+# backend/app/recorder.py
+"""
+Write-behind persistence of call records.
+
+save_query_record() used to open a session, INSERT one row, commit and
+refresh it on the call's own thread. The recorder instead gives the record
+its id from a locally held block (models.allocate_id_block, hi/lo) and puts
+it on a bounded queue. One writer thread drains the queue and writes rows
+with a single bulk INSERT per batch: when DB_FLUSH_ROWS rows are waiting or
+the oldest has waited DB_FLUSH_MS.
+
+- Backpressure: when DB_MAX_PENDING rows are queued, record() blocks for up
+  to DB_ENQUEUE_TIMEOUT seconds, then writes that record itself rather than
+  drop it.
+- Failures: a batch that fails to insert is retried with backoff
+  (DB_FLUSH_RETRIES; constraint violations are not retried), then written
+  row by row so one bad row cannot sink the rest.
+- Shutdown: close() (API shutdown hook, Celery worker_process_shutdown and
+  atexit) stops intake and flushes everything still queued.
+
+DB_WRITE_BEHIND=0 writes each record before record() returns, still
+with a preallocated id.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+from . import models
+from .services import tracing
+
+DB_WRITE_BEHIND = os.environ.get("DB_WRITE_BEHIND", "1") == "1"
+DB_FLUSH_ROWS = int(os.environ.get("DB_FLUSH_ROWS", "200"))
+DB_FLUSH_MS = float(os.environ.get("DB_FLUSH_MS", "500"))
+DB_MAX_PENDING = int(os.environ.get("DB_MAX_PENDING", "10000"))
+DB_ENQUEUE_TIMEOUT = float(os.environ.get("DB_ENQUEUE_TIMEOUT", "2.0"))
+DB_FLUSH_RETRIES = int(os.environ.get("DB_FLUSH_RETRIES", "3"))
+DB_ID_BLOCK = int(os.environ.get("DB_ID_BLOCK", "100"))
+
+RECORDS_TOTAL = tracing.register(
+    tracing.Counter("callservice_db_records_total", "Call records written, failed, or written inline on a full queue (overflow)."),
+    "outcome",
+)
+RECORDS_PENDING = tracing.register(
+    tracing.Gauge("callservice_db_records_pending", "Call records waiting for the write-behind flush."), "table"
+)
+
+_COLUMNS = ("id", "caller", "question", "answer", "sources", "confidence", "created_at")
+_STOP = object()
+
+
+class IdAllocator:
+    """
+    Hands out ids from blocks reserved with models.allocate_id_block; ids
+    left in a block when the process exits are skipped, never reused.
+    """
+
+    def __init__(self, model, block_size: int = DB_ID_BLOCK):
+        self.model = model
+        self.block_size = max(1, block_size)
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._next >= self._end:
+                self._next = models.allocate_id_block(self.model, self.block_size)
+                self._end = self._next + self.block_size
+            self._next += 1
+            return self._next - 1
+
+
+class QueryRecorder:
+    def __init__(self, write_behind: bool = DB_WRITE_BEHIND, flush_rows: int = DB_FLUSH_ROWS,
+                 flush_ms: float = DB_FLUSH_MS, max_pending: int = DB_MAX_PENDING,
+                 enqueue_timeout: float = DB_ENQUEUE_TIMEOUT, retries: int = DB_FLUSH_RETRIES,
+                 ids: IdAllocator = None):
+        self.write_behind = write_behind
+        self.flush_rows = max(1, flush_rows)
+        self.flush_s = flush_ms / 1000.0
+        self.enqueue_timeout = enqueue_timeout
+        self.retries = retries
+        self.ids = ids or IdAllocator(models.QueryRecord)
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._closed = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._unwritten = 0   # queued or being written
+        self._enqueuing = 0   # record() calls between the closed check and the put
+        self._thread = None
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.overflowed = 0
+
+    def record(self, rec):
+        """
+        Assign rec its id and persist it (soon, with write-behind). Returns rec.
+        """
+        rec.id = self.ids.next_id()
+        row = {c: getattr(rec, c) for c in _COLUMNS}
+        with self._lock:
+            # close() waits for _enqueuing to drop to 0 before stopping the
+            # writer, so a row that passes this check is always written
+            queued = self.write_behind and not self._closed
+            if queued:
+                self._enqueuing += 1
+                self._unwritten += 1
+        if not queued:
+            self._write([row])
+            return rec
+        try:
+            self._ensure_writer()
+            self._queue.put(row, timeout=self.enqueue_timeout)
+        except queue.Full:
+            # writer cannot keep up: slow this caller down instead of dropping the row
+            with self._lock:
+                self._unwritten -= 1
+                self.overflowed += 1
+            RECORDS_TOTAL.inc("overflow")
+            self._write([row])
+            return rec
+        finally:
+            with self._lock:
+                self._enqueuing -= 1
+                if self._enqueuing == 0:
+                    self._idle.notify_all()
+        RECORDS_PENDING.set("query_records", self._queue.qsize())
+        return rec
+
+    def _ensure_writer(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="db-recorder", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_s
+            stop = False
+            while len(batch) < self.flush_rows:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            with self._lock:
+                self._unwritten -= len(batch)
+                if self._unwritten == 0:
+                    self._idle.notify_all()
+            RECORDS_PENDING.set("query_records", self._queue.qsize())
+            if stop:
+                return
+
+    @tracing.traced("db_flush")
+    def _write(self, rows):
+        delay = 0.1
+        for attempt in range(self.retries + 1):
+            try:
+                models.insert_query_records(rows)
+                with self._lock:
+                    self.batches += 1
+                self._count(len(rows), "written")
+                return
+            except Exception as e:
+                # a constraint violation will fail the same way again: go row by row
+                if attempt == self.retries or isinstance(e, IntegrityError):
+                    print(f"[recorder] bulk insert of {len(rows)} rows failed: {e}")
+                    break
+                time.sleep(delay)
+                delay *= 2
+        if len(rows) > 1:
+            for row in rows:
+                self._write_one(row)
+        else:
+            self._count(1, "failed")
+
+    def _write_one(self, row):
+        try:
+            models.insert_query_records([row])
+            self._count(1, "written")
+        except Exception as e:
+            print(f"[recorder] dropping record {row['id']} for {row['caller']}: {e}")
+            self._count(1, "failed")
+
+    def _count(self, n: int, outcome: str):
+        with self._lock:
+            if outcome == "written":
+                self.written += n
+            else:
+                self.failed += n
+        RECORDS_TOTAL.inc(outcome, n)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every record queued so far is written. False on timeout.
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: self._unwritten == 0, timeout=timeout)
+
+    def close(self, timeout: float = 30.0):
+        """
+        Stop taking records and write out everything still queued. Later
+        record() calls write synchronously.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # let record() calls already past the closed check finish their put,
+            # so nothing can land behind the stop marker
+            if not self._idle.wait_for(lambda: self._enqueuing == 0, timeout=timeout):
+                print(f"[recorder] shutdown gave up waiting for {self._enqueuing} records being queued")
+                return
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                print(f"[recorder] shutdown flush timed out with {self._queue.qsize()} records queued")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "write_behind": self.write_behind,
+                "pending": self._unwritten,
+                "written": self.written,
+                "batches": self.batches,
+                "failed": self.failed,
+                "overflowed": self.overflowed,
+            }
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> QueryRecorder:
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                # databases created before hi/lo ids and rollups have query_records only
+                for model in (models.IdBlock, models.QueryRollup, models.QuestionCluster):
+                    model.__table__.create(bind=models.engine, checkfirst=True)
+                _recorder = QueryRecorder()
+                atexit.register(_recorder.close)
+    return _recorder
+
+
+def shutdown():
+    if _recorder is not None:
+        _recorder.close()
@@ -0,0 +1,318 @@
+# backend/app/rollups.py
+"""
+Analytics rollups over query_records for the /stats route.
+
+Every batch the recorder inserts is also folded into two small tables in
+the same transaction (models.insert_query_records -> apply()), under a
+savepoint: if the rollup upserts fail the records are still stored, the
+failure is counted in callservice_rollup_failures_total, and `rebuild`
+repairs the rollups later:
+
+- query_rollups: per hour and per day, per caller region and topic, the
+  number of queries and the sum of their confidence (average = sum / n)
+- question_clusters: per day, how often each question cluster was asked,
+  with an example question
+
+Increments are upserts (INSERT ... ON CONFLICT DO UPDATE), supported by both
+SQLite (3.24+) and Postgres. stats() reads only these tables, so its cost
+depends on the date range asked for, not on how many calls were recorded.
+
+Regions are caller number prefixes (country code plus the first digits of
+the number). Topics come from a keyword lexicon over the question: English
+words, and Malayalam stems matched as word prefixes, since Malayalam attaches
+case endings to the noun (the Celery chain stores the Malayalam transcript).
+Clusters are the question's first few content words, sorted.
+
+Existing databases, or rollups after a lexicon change, are rebuilt from
+query_records with:
+
+    cd backend/callservice
+    python -m app.rollups rebuild [--since 2026-01-01]
+"""
+import argparse
+import datetime
+import os
+import re
+from collections import defaultdict
+
+from sqlalchemy import delete, func, select
+
+from . import models
+from .services import tracing
+
+STATS_ROLLUPS = os.environ.get("STATS_ROLLUPS", "1") == "1"
+# digits of the caller number, country code included, that name its region
+STATS_REGION_DIGITS = int(os.environ.get("STATS_REGION_DIGITS", "6"))
+STATS_CLUSTER_WORDS = int(os.environ.get("STATS_CLUSTER_WORDS", "4"))
+
+GRANULARITIES = ("hour", "day")
+
+ROLLUP_FAILURES = tracing.register(
+    tracing.Counter(
+        "callservice_rollup_failures_total",
+        "Record batches stored without their rollup increments; repair with `python -m app.rollups rebuild`.",
+    ),
+    "table",
+)
+
+TOPIC_KEYWORDS = {
+    "pests": ["pest", "insect", "worm", "aphid", "caterpillar", "borer", "mite", "beetle", "locust", "weevil"],
+    "disease": ["disease", "fungus", "fungal", "blight", "rot", "wilt", "spot", "mildew", "rust", "virus", "yellowing"],
+    "fertilizer": ["fertilizer", "fertiliser", "manure", "compost", "urea", "npk", "potash", "nitrogen", "nutrient"],
+    "irrigation": ["water", "irrigation", "irrigate", "drip", "watering", "drought", "pump"],
+    "weather": ["rain", "weather", "monsoon", "temperature", "flood", "heat", "wind", "forecast"],
+    "market": ["price", "market", "sell", "rate", "buyer", "mandi", "cost"],
+    "seeds": ["seed", "variety", "sowing", "sow", "nursery", "seedling", "planting"],
+    "schemes": ["scheme", "subsidy", "loan", "insurance", "government", "pension", "credit"],
+    "livestock": ["cow", "cattle", "goat", "poultry", "chicken", "milk", "buffalo", "pig", "fish"],
+}
+_TOPIC_OF = {word: topic for topic, words in TOPIC_KEYWORDS.items() for word in words}
+
+# Malayalam stems; a word belongs to a topic when it starts with one of them
+# (വളം, വളത്തിന്, വളത്തിൽ), the longest match winning (വെള്ളപ്പൊക്കം over വെള്ളം)
+TOPIC_KEYWORDS_ML = {
+    "pests": ["കീട", "പുഴു", "ചാഴി", "വണ്ട", "മുഞ്ഞ", "തുരപ്പ", "ശലഭ", "വെട്ടുക്കിളി"],
+    "disease": ["രോഗ", "കുമിൾ", "കുമിള", "ചീയ", "വാട്ട", "പുള്ളി", "മഞ്ഞളി", "വൈറസ"],
+    "fertilizer": ["വളം", "വളത്ത", "വളപ്രയോഗ", "ജൈവവള", "യൂറിയ", "പൊട്ടാഷ", "ചാണക", "കമ്പോസ്റ്റ", "കുമ്മായ"],
+    "irrigation": ["വെള്ളം", "വെള്ളത്ത", "ജലസേചന", "നനയ", "നനയ്ക്ക", "പമ്പ", "വരൾച്ച"],
+    "weather": ["മഴ", "കാലാവസ്ഥ", "വെള്ളപ്പൊക്ക", "ചൂട", "കാറ്റ"],
+    "market": ["വില", "വിപണി", "ചന്ത", "വിൽ"],
+    "seeds": ["വിത്ത", "നടീ", "തൈ", "ഞാറ"],
+    "schemes": ["പദ്ധതി", "സബ്സിഡി", "വായ്പ", "ഇൻഷുറൻസ", "സർക്കാര", "പെൻഷൻ"],
+    "livestock": ["പശു", "കന്നുകാലി", "ആട", "കോഴി", "പാൽ", "എരുമ", "പന്നി", "മത്സ്യ", "മീൻ"],
+}
+_ML_STEMS = sorted(
+    ((stem, topic) for topic, stems in TOPIC_KEYWORDS_ML.items() for stem in stems),
+    key=lambda pair: -len(pair[0]),
+)
+
+_STOPWORDS = frozenset(
+    "a an the is are was were be been to of in on for and or but with my our your their this that these those "
+    "what which how why when where who whom can could should would will do does did i we you he she it they me "
+    "us them there here have has had get got any some much many about from at by as if so not no please tell "
+    "know want need use using up down out into than then also very just".split()
+    # Malayalam question words, pronouns and auxiliaries
+    + "ഏത് ഏതു എന്ത് എന്താണ് എന്തു എങ്ങനെ എപ്പോൾ എവിടെ എത്ര ആര് ഞാൻ എന്റെ ഞങ്ങളുടെ ഈ ആ ഇത് അത് "
+      "ആണ് ഉണ്ട് ഇല്ല ചെയ്യണം ചെയ്യാം ചെയ്യും പറയാമോ പറയൂ വേണം കഴിയും എന്ന് ഒരു".split()
+)
+# Latin words, or Malayalam ones: \w would split the latter at every vowel
+# sign and virama, which are combining marks, not word characters
+_WORD = re.compile(r"[a-z]+|[\u0D00-\u0D65\u0D70-\u0D7F\u200c\u200d]+")
+
+
+def caller_region(caller: str) -> str:
+    digits = "".join(ch for ch in caller or "" if ch.isdigit())
+    if len(digits) < 8:
+        return "unknown"   # not a phone number (e.g. "api-user")
+    return "+" + digits[:STATS_REGION_DIGITS]
+
+
+def _stem(word: str) -> str:
+    if not word.isascii():
+        return word
+    for suffix in ("ing", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def _content_words(question: str):
+    return [_stem(w) for w in _WORD.findall((question or "").lower()) if w not in _STOPWORDS]
+
+
+def _ml_topic(word: str):
+    if word.isascii():
+        return None
+    for stem, topic in _ML_STEMS:
+        if word.startswith(stem):
+            return topic
+    return None
+
+
+def question_topic(question: str) -> str:
+    words = _WORD.findall((question or "").lower())
+    if not words:
+        return "none"
+    hits = defaultdict(int)
+    for w in words:
+        topic = _TOPIC_OF.get(w) or _TOPIC_OF.get(_stem(w)) or _ml_topic(w)
+        if topic:
+            hits[topic] += 1
+    return max(hits, key=hits.get) if hits else "other"
+
+
+def question_cluster(question: str) -> str:
+    """
+    Key shared by rewordings of the same question: its first
+    STATS_CLUSTER_WORDS distinct content words, sorted.
+    """
+    seen = []
+    for w in _content_words(question):
+        if w not in seen:
+            seen.append(w)
+        if len(seen) == STATS_CLUSTER_WORDS:
+            break
+    return " ".join(sorted(seen))[:128]
+
+
+def bucket_start(ts: datetime.datetime, granularity: str) -> datetime.datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _upsert(conn, model, rows, keys, add):
+    """
+    INSERT rows; on a key conflict add the `add` columns to the stored
+    values and leave the other columns as they are.
+    """
+    if not rows:
+        return
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"rollup upserts are not implemented for {dialect}")
+    table = model.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={c: table.c[c] + stmt.excluded[c] for c in add},
+    )
+    conn.execute(stmt, rows)
+
+
+def apply(conn, records) -> None:
+    """
+    Add query_records rows (column dicts) to the rollups, within the
+    caller's transaction.
+    """
+    totals = defaultdict(lambda: [0, 0.0])
+    clusters = {}
+    for r in records:
+        created = r.get("created_at") or datetime.datetime.utcnow()
+        question = r.get("question") or ""
+        region, topic = caller_region(r.get("caller")), question_topic(question)
+        for granularity in GRANULARITIES:
+            t = totals[(granularity, bucket_start(created, granularity), region, topic)]
+            t[0] += 1
+            t[1] += r.get("confidence") or 0.0
+        cluster = question_cluster(question)
+        if cluster:
+            key = (bucket_start(created, "day"), cluster)
+            if key in clusters:
+                clusters[key]["queries"] += 1
+            else:
+                clusters[key] = {"day": key[0], "cluster": cluster, "topic": topic,
+                                 "example": question[:500], "queries": 1}
+
+    rollup_rows = [
+        {"granularity": g, "bucket": b, "region": region, "topic": topic, "queries": n, "confidence_sum": conf}
+        for (g, b, region, topic), (n, conf) in totals.items()
+    ]
+    _upsert(conn, models.QueryRollup, rollup_rows, ["granularity", "bucket", "region", "topic"],
+            add=["queries", "confidence_sum"])
+    _upsert(conn, models.QuestionCluster, list(clusters.values()), ["day", "cluster"], add=["queries"])
+
+
+def rebuild(since: datetime.datetime = None, batch_size: int = 5000) -> int:
+    """
+    Recompute the rollups from query_records, from the day of `since` (or
+    from scratch). Run it while the recorder is quiet: records written during
+    the rebuild can be counted twice. Returns the number of records read.
+    """
+    day = bucket_start(since, "day") if since else None
+    stmt = select(models.QueryRecord.caller, models.QueryRecord.question,
+                  models.QueryRecord.confidence, models.QueryRecord.created_at)
+    if day:
+        stmt = stmt.where(models.QueryRecord.created_at >= day)
+    n = 0
+    with models.engine.begin() as conn:
+        rollups, clusters = delete(models.QueryRollup), delete(models.QuestionCluster)
+        if day:
+            rollups = rollups.where(models.QueryRollup.bucket >= day)
+            clusters = clusters.where(models.QuestionCluster.day >= day)
+        conn.execute(rollups)
+        conn.execute(clusters)
+        result = conn.execution_options(yield_per=batch_size).execute(stmt)
+        for part in result.mappings().partitions():
+            apply(conn, part)
+            n += len(part)
+    return n
+
+
+def _avg(total, n):
+    return round(total / n, 4) if n else None
+
+
+def stats(db, granularity: str = "day", since: datetime.datetime = None, until: datetime.datetime = None,
+          region: str = None, topic: str = None, top_clusters: int = 10) -> dict:
+    """
+    Query volume and average confidence over [since, until), as a time series
+    and split by region and by topic, plus the most asked question clusters.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}")
+    until = until or datetime.datetime.utcnow()
+    since = since or until - (datetime.timedelta(hours=48) if granularity == "hour" else datetime.timedelta(days=30))
+    R = models.QueryRollup
+    where = [R.granularity == granularity, R.bucket >= bucket_start(since, granularity), R.bucket < until]
+    if region:
+        where.append(R.region == region)
+    if topic:
+        where.append(R.topic == topic)
+    n, conf = func.sum(R.queries).label("queries"), func.sum(R.confidence_sum).label("confidence_sum")
+
+    def grouped(column):
+        rows = db.execute(select(column, n, conf).where(*where).group_by(column).order_by(column)).all()
+        return [(key, int(q or 0), c or 0.0) for key, q, c in rows]
+
+    series = grouped(R.bucket)
+    total_n = sum(q for _, q, _ in series)
+    total_conf = sum(c for _, _, c in series)
+    C = models.QuestionCluster
+    cluster_where = [C.day >= bucket_start(since, "day"), C.day < until]
+    if topic:
+        cluster_where.append(C.topic == topic)
+    clusters = []
+    if top_clusters and not region:   # clusters are not kept per region
+        clusters = db.execute(
+            select(C.cluster, C.topic, func.min(C.example), func.sum(C.queries).label("queries"))
+            .where(*cluster_where).group_by(C.cluster, C.topic)
+            .order_by(func.sum(C.queries).desc()).limit(top_clusters)
+        ).all()
+    return {
+        "granularity": granularity,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "total": {"queries": total_n, "avg_confidence": _avg(total_conf, total_n)},
+        "series": [{"bucket": b.isoformat(), "queries": q, "avg_confidence": _avg(c, q)} for b, q, c in series],
+        "by_region": sorted(
+            ({"region": k, "queries": q, "avg_confidence": _avg(c, q)} for k, q, c in grouped(R.region)),
+            key=lambda d: -d["queries"],
+        ),
+        "by_topic": sorted(
+            ({"topic": k, "queries": q, "avg_confidence": _avg(c, q)} for k, q, c in grouped(R.topic)),
+            key=lambda d: -d["queries"],
+        ),
+        "top_clusters": [
+            {"cluster": key, "topic": t, "example": example, "queries": int(q)} for key, t, example, q in clusters
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebuild", help="recompute rollups from query_records")
+    rb.add_argument("--since", type=datetime.datetime.fromisoformat, default=None)
+    args = parser.parse_args(argv)
+    if args.command == "rebuild":
+        models.init_db()
+        print(f"[rollups] rebuilt from {rebuild(args.since)} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# backend/app/services/answer_cache.py
+"""
+Semantic cache of LLM answers for near-duplicate farmer questions.
+
+Questions are embedded with the shared retrieval embedder; a new question
+whose cosine similarity to a cached one reaches ANSWER_CACHE_THRESHOLD gets
+the cached answer without calling the model. Entries expire after
+ANSWER_CACHE_TTL_SECONDS and the least-recently-used ones are evicted beyond
+ANSWER_CACHE_MAX_ENTRIES. The cache can be warmed from QueryRecord history.
+"""
+import datetime
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE = os.environ.get("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_WARM_ROWS = int(os.environ.get("ANSWER_CACHE_WARM_ROWS", "500"))
+
+_MALAYALAM = re.compile(r"[\u0D00-\u0D7F]")
+
+
+def is_cacheable(answer: str) -> bool:
+    return bool(answer and answer.strip()) and not answer.startswith("[ERROR]")
+
+
+class SemanticAnswerCache:
+    def __init__(self, embedder=None, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self._embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # id -> entry dict (LRU order)
+        self._next_id = 0
+        self._matrix = None             # stacked vectors of _entries, rebuilt when dirty
+        self._matrix_ids = []
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "stores": 0}
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            from .retrieval import get_embedder
+            self._embedder = get_embedder()
+        return self._embedder
+
+    def _embed(self, text: str) -> np.ndarray:
+        return self.embedder.encode([text])[0]
+
+    def _drop_expired(self, now):
+        # caller holds _lock
+        expired = [k for k, e in self._entries.items() if now - e["created"] > self.ttl]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self.counters["expired"] += len(expired)
+            self._matrix = None
+
+    def _ensure_matrix(self):
+        if self._matrix is None:
+            self._matrix_ids = list(self._entries)
+            self._matrix = (
+                np.vstack([self._entries[k]["vec"] for k in self._matrix_ids])
+                if self._matrix_ids else np.zeros((0, 1), dtype=np.float32)
+            )
+
+    def lookup(self, question: str):
+        """
+        Return {"answer", "confidence", "sources", "cache_hit", "matched_question"}
+        for the closest cached question at or above the threshold, else None.
+        """
+        if not question or not question.strip():
+            return None
+        vec = self._embed(question)
+        now = time.time()
+        with self._lock:
+            self._drop_expired(now)
+            self._ensure_matrix()
+            if not self._matrix_ids:
+                self.counters["misses"] += 1
+                return None
+            sims = self._matrix @ vec
+            best = int(np.argmax(sims))
+            sim = float(sims[best])
+            if sim < self.threshold:
+                self.counters["misses"] += 1
+                return None
+            key = self._matrix_ids[best]
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return {
+                "answer": entry["answer"],
+                "confidence": round(sim, 4),
+                "sources": entry["sources"],
+                "cache_hit": True,
+                "matched_question": entry["question"],
+            }
+
+    def store(self, question: str, answer: str, sources=None, created: float = None, vec=None):
+        if not question or not is_cacheable(answer):
+            return
+        vec = self._embed(question) if vec is None else vec
+        with self._lock:
+            self._entries[self._next_id] = {
+                "question": question,
+                "answer": answer,
+                "sources": sources or [],
+                "created": created or time.time(),
+                "vec": np.asarray(vec, dtype=np.float32),
+            }
+            self._next_id += 1
+            self.counters["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self._matrix = None
+
+    def warm_from_history(self, limit: int = ANSWER_CACHE_WARM_ROWS) -> int:
+        """
+        Seed the cache with recent English (question, answer) pairs from
+        QueryRecord. Telephony rows store the Malayalam answer, so rows whose
+        answer contains Malayalam script are skipped.
+        """
+        from ..models import SessionLocal, QueryRecord
+
+        cutoff = time.time() - self.ttl
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(QueryRecord.question, QueryRecord.answer, QueryRecord.created_at)
+                .filter(QueryRecord.question != "", QueryRecord.answer != "")
+                .order_by(QueryRecord.created_at.desc())
+                .limit(limit)
+                .all()
+            )
+        finally:
+            db.close()
+        pairs = []
+        for question, answer, created_at in reversed(rows):
+            # created_at is naive UTC (datetime.utcnow)
+            created = created_at.replace(tzinfo=datetime.timezone.utc).timestamp() if created_at else time.time()
+            if created < cutoff or not question or _MALAYALAM.search(answer or "") or not is_cacheable(answer):
+                continue
+            pairs.append((question, answer, created))
+        if not pairs:
+            return 0
+        vecs = self.embedder.encode([q for q, _, _ in pairs])
+        for (question, answer, created), vec in zip(pairs, vecs):
+            self.store(question, answer, created=created, vec=vec)
+        return len(pairs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                "threshold": self.threshold,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SemanticAnswerCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache()
+    return _cache
+
+
+def warmup():
+    if not ANSWER_CACHE:
+        return
+    try:
+        n = get_cache().warm_from_history()
+        print(f"[answer-cache] warmed with {n} past answers")
+    except Exception as e:
+        print("[answer-cache] warmup failed:", e)
@@ -1,32 +1,58 @@
 import os
-from ..utils import ensure_wav_16khz
-import tempfile
+import numpy as np
+from . import whisper_registry
+from .audio import decode_audio
+from .transcriber import _openai_lock, clean_beam_size, merge_texts, prepare_windows
+from .tracing import traced
 
-def transcribe_audio(filepath, language='ml'):
+def _avg_logprob(res) -> float:
+    # confidence not provided reliably; use avg_logprob if present, else the segments' mean
+    if res.get('avg_logprob') is not None:
+        return float(res['avg_logprob'])
+    logprobs = [seg['avg_logprob'] for seg in res.get('segments') or [] if 'avg_logprob' in seg]
+    return float(np.mean(logprobs)) if logprobs else 0.0
+
+@traced("transcribe")
+def transcribe_audio(filepath, language='ml', beam_size=None):
     """
     Offline-first: Whisper (openai-whisper). language code 'ml' for Malayalam.
+    Silence is trimmed and long speech windowed as in transcriber
+    (prepare_windows / merge_texts); the windows run one after another,
+    since one openai-whisper model serves a single call at a time.
+    beam_size: beam search width; None or 1 decodes greedily.
     Returns (transcript, confidence)
     """
+    samples = None
     try:
-        import whisper
+        # 16 kHz mono float32, decoded in-process (no ffmpeg, no temp file)
+        samples = decode_audio(filepath)
+        windows = prepare_windows(samples)
+        if not windows:
+            return "", 0.0
         model_name = os.environ.get('WHISPER_MODEL','small')
-        model = whisper.load_model(model_name)
-        # ensure 16k wav for better accuracy
-        tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False).name
-        ensure_wav_16khz(filepath, tmp)
-        res = model.transcribe(tmp, language=language)
-        text = res.get('text','').strip()
-        # confidence not provided reliably; use avg_logprob if present
-        confidence = res.get('avg_logprob', 0)
-        return text, float(confidence or 0.0)
+        model = whisper_registry.get_model(whisper_registry.OPENAI_WHISPER, model_name)
+        beam_size = clean_beam_size(beam_size, default=1)
+        options = {"beam_size": beam_size} if beam_size > 1 else {}
+        texts, confidence = [], 0.0
+        for window in windows:
+            with _openai_lock:
+                res = model.transcribe(window, language=language, **options)
+            texts.append(res.get('text','').strip())
+            # windows weighted by their length
+            confidence += _avg_logprob(res) * window.size
+        return merge_texts(texts), confidence / sum(w.size for w in windows)
     except Exception as e:
         # fallback to Google STT if configured
         if os.environ.get('USE_GOOGLE_STT','0') == '1':
             try:
                 from google.cloud import speech_v1p1beta1 as speech
                 client = speech.SpeechClient()
-                with open(filepath,'rb') as f:
-                    content = f.read()
+                if samples is not None:
+                    # LINEAR16 at 16 kHz, as declared in the config below
+                    content = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+                else:
+                    with open(filepath,'rb') as f:
+                        content = f.read()
                 audio = speech.RecognitionAudio(content=content)
                 config = speech.RecognitionConfig(
                     encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
@@ -0,0 +1,319 @@
+# backend/app/services/audio.py
+"""
+In-process audio decoding and resampling for the ASR stage.
+
+decode_audio() turns a path, bytes or file object into the 16 kHz mono
+float32 NumPy array Whisper expects, without temp files or an ffmpeg process
+per call:
+
+- WAV (PCM 8/16/24/32-bit, IEEE float, WAVE_FORMAT_EXTENSIBLE) is parsed
+  here and viewed with np.frombuffer over the raw data chunk, so in-memory
+  sources are never copied before conversion (bytes input that is already
+  16 kHz mono float32 comes back as a view).
+- Other formats are decoded by PyAV, which links the libav* libraries into
+  this process (one decoder library, no process per file). openai-whisper's
+  ffmpeg CLI loader is the last resort when PyAV is missing.
+
+Resampling is a vectorized polyphase FIR (resample()); filters are cached
+per rate pair. G.711 mu-law (8-bit, the telephone codec) is read and
+written here too, so synthesized prompts can be stored as the 8 kHz mu-law
+WAV Twilio plays without transcoding.
+"""
+import io
+import math
+import os
+import shutil
+import struct
+import tempfile
+import wave
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .tracing import traced
+
+SAMPLE_RATE = 16000
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_MULAW = 0x0007
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# taps per polyphase branch on each side of the centre, and the Kaiser beta
+# of the anti-aliasing filter (~80 dB stopband)
+RESAMPLE_HALF_TAPS = 16
+RESAMPLE_KAISER_BETA = 8.0
+
+
+class UnsupportedAudio(ValueError):
+    pass
+
+
+# -- G.711 mu-law -----------------------------------------------------------
+_MULAW_BIAS = 0x84
+_MULAW_CLIP = 32635
+# segment (exponent) of a biased magnitude, indexed by magnitude >> 7
+_MULAW_SEGMENT = np.array([max(0, i.bit_length() - 1) for i in range(256)], dtype=np.int32)
+
+
+def _mulaw_table() -> np.ndarray:
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent, mantissa = (u >> 4) & 0x07, u & 0x0F
+    magnitude = (((mantissa << 3) + _MULAW_BIAS) << exponent) - _MULAW_BIAS
+    return (np.where(u & 0x80, -magnitude, magnitude) / 32768.0).astype(np.float32)
+
+
+_MULAW_DECODE = _mulaw_table()
+
+
+def mulaw_encode(audio: np.ndarray) -> np.ndarray:
+    """
+    float32 [-1, 1] -> G.711 mu-law bytes (uint8), vectorized.
+    """
+    pcm = (np.clip(np.asarray(audio, dtype=np.float32), -1.0, 1.0) * 32767.0).astype(np.int32)
+    sign = (pcm < 0).astype(np.int32) << 7
+    magnitude = np.minimum(np.abs(pcm), _MULAW_CLIP) + _MULAW_BIAS
+    exponent = _MULAW_SEGMENT[magnitude >> 7]
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+def mulaw_decode(data) -> np.ndarray:
+    return _MULAW_DECODE[np.frombuffer(data, dtype=np.uint8)]
+
+
+# -- resampling -------------------------------------------------------------
+@lru_cache(maxsize=32)
+def _polyphase_filter(up: int, down: int):
+    """
+    Kaiser-windowed sinc low-pass for an up/down rational resampler, split
+    into `up` branches of equal length. Returns (branches, half_len).
+    """
+    factor = max(up, down)
+    half_len = RESAMPLE_HALF_TAPS * factor
+    n = np.arange(-half_len, half_len + 1, dtype=np.float64)
+    cutoff = 1.0 / factor
+    h = cutoff * np.sinc(cutoff * n) * np.kaiser(n.size, RESAMPLE_KAISER_BETA)
+    h *= up   # unity DC gain after zero-stuffing
+    taps = -(-h.size // up)
+    h = np.concatenate([h, np.zeros(taps * up - h.size)])
+    # branch p holds h[p], h[p + up], h[p + 2*up], ..., stored reversed so it
+    # can be dotted with an input window in ascending time order
+    branches = h.reshape(taps, up).T[:, ::-1].astype(np.float32)
+    return np.ascontiguousarray(branches), half_len
+
+
+def resample(audio: np.ndarray, src_rate: int, dst_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Polyphase resample of a mono float32 signal from src_rate to dst_rate.
+
+    Outputs n, n+up, n+2*up, ... all use the same filter branch and read
+    input windows `down` samples apart, so each of the `up` output phases is
+    one matrix-vector product over a strided (uncopied) window view.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if src_rate == dst_rate or audio.size == 0:
+        return audio
+    g = math.gcd(int(src_rate), int(dst_rate))
+    up, down = dst_rate // g, src_rate // g
+    branches, half_len = _polyphase_filter(up, down)
+    taps = branches.shape[1]
+
+    n_out = -(-audio.size * up // down)
+    padded = np.concatenate([np.zeros(taps, np.float32), audio, np.zeros(taps, np.float32)])
+    windows = sliding_window_view(padded, taps)   # windows[i] = padded[i:i + taps]
+    out = np.empty(n_out, dtype=np.float32)
+    for r in range(min(up, n_out)):
+        pos = r * down + half_len          # output r in the filtered, zero-stuffed signal
+        phase, first = pos % up, pos // up + 1
+        count = (n_out - 1 - r) // up + 1
+        # branch taps run backwards in time, the window forwards
+        out[r::up] = windows[first: first + (count - 1) * down + 1: down] @ branches[phase]
+    return out
+
+
+# -- WAV --------------------------------------------------------------------
+def _buffer_of(f):
+    """
+    The whole content of f as a buffer, without copying when f is a BytesIO
+    (media.Media.file for a recording that stayed in memory).
+    """
+    if isinstance(f, io.BytesIO):
+        return f.getbuffer()
+    f.seek(0, os.SEEK_END)
+    buf = bytearray(f.tell())
+    f.seek(0)
+    f.readinto(buf)
+    f.seek(0)
+    return memoryview(buf)
+
+
+def _is_wav(buf) -> bool:
+    return len(buf) >= 12 and bytes(buf[:4]) == b"RIFF" and bytes(buf[8:12]) == b"WAVE"
+
+
+def _parse_wav(buf):
+    """
+    Walk the RIFF chunks. Returns (format_tag, channels, rate, bits, data view).
+    """
+    fmt, data, pos = None, None, 12
+    while pos + 8 <= len(buf):
+        cid, size = struct.unpack_from("<4sI", buf, pos)
+        body = buf[pos + 8: pos + 8 + size]
+        if cid == b"fmt ":
+            tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", body)
+            if tag == _WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                tag = struct.unpack_from("<H", body, 24)[0]   # first two bytes of the SubFormat GUID
+            fmt = (tag, channels, rate, bits)
+        elif cid == b"data":
+            data = body   # streaming writers may leave size 0xFFFFFFFF; slicing clamps it
+        pos += 8 + size + (size & 1)
+        if fmt and data is not None:
+            break
+    if fmt is None or data is None:
+        raise UnsupportedAudio("WAV without fmt/data chunk")
+    return fmt + (data,)
+
+
+def _samples_to_float32(data, tag: int, bits: int) -> np.ndarray:
+    width = bits // 8
+    usable = len(data) - len(data) % width
+    data = data[:usable]
+    if tag == _WAVE_FORMAT_MULAW and bits == 8:
+        return mulaw_decode(data)
+    if tag == _WAVE_FORMAT_IEEE_FLOAT:
+        if bits == 32:
+            return np.frombuffer(data, dtype="<f4")
+        if bits == 64:
+            return np.frombuffer(data, dtype="<f8").astype(np.float32)
+    elif tag == _WAVE_FORMAT_PCM:
+        if bits == 8:
+            return (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) * (1.0 / 128)
+        if bits == 16:
+            return np.frombuffer(data, dtype="<i2").astype(np.float32) * (1.0 / 32768)
+        if bits == 24:
+            b = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            ints = (b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8   # sign-extend 24 -> 32
+            return ints.astype(np.float32) * (1.0 / 8388608)
+        if bits == 32:
+            return np.frombuffer(data, dtype="<i4").astype(np.float32) * (1.0 / 2147483648)
+    raise UnsupportedAudio(f"unsupported WAV encoding: format {tag:#x}, {bits} bits")
+
+
+def _decode_wav(buf, sample_rate: int) -> np.ndarray:
+    tag, channels, rate, bits, data = _parse_wav(buf)
+    audio = _samples_to_float32(data, tag, bits)
+    if channels > 1:
+        frames = audio[: audio.size - audio.size % channels].reshape(-1, channels)
+        audio = frames.mean(axis=1, dtype=np.float32)
+    return resample(audio, rate, sample_rate)
+
+
+# -- compressed formats -----------------------------------------------------
+def _decode_with_av(f, sample_rate: int) -> np.ndarray:
+    try:
+        import av
+    except Exception:
+        return _decode_with_ffmpeg(f, sample_rate)
+    f.seek(0)
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+    chunks = []
+    try:
+        with av.open(f, mode="r", metadata_errors="ignore") as container:
+            for frame in container.decode(audio=0):
+                frame.pts = None
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+            for out in resampler.resample(None):
+                chunks.append(out.to_ndarray().reshape(-1))
+    except av.error.FFmpegError as e:
+        raise UnsupportedAudio(f"PyAV could not decode audio: {e}")
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def _decode_with_ffmpeg(f, sample_rate: int) -> np.ndarray:
+    # last resort: openai-whisper's loader runs the ffmpeg CLI on a temp copy
+    try:
+        from whisper.audio import load_audio
+    except Exception:
+        raise UnsupportedAudio("only WAV can be decoded without PyAV or openai-whisper")
+    f.seek(0)
+    fd, path = tempfile.mkstemp(prefix="audio_")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(f, out)
+        return load_audio(path, sr=sample_rate)
+    finally:
+        os.remove(path)
+
+
+def _decode_buffer(buf, f, sample_rate: int) -> np.ndarray:
+    if _is_wav(buf):
+        try:
+            return _decode_wav(buf, sample_rate)
+        except UnsupportedAudio:
+            pass
+    if f is None:
+        f = io.BytesIO(buf)
+    return _decode_with_av(f, sample_rate)
+
+
+def _decode_stream(f, sample_rate: int) -> np.ndarray:
+    buf = _buffer_of(f)
+    try:
+        audio = _decode_buffer(buf, f, sample_rate)
+        # the caller may close f, which fails while a view of its BytesIO is alive
+        if np.may_share_memory(audio, np.frombuffer(buf, dtype=np.uint8)):
+            audio = audio.copy()
+        return audio
+    finally:
+        buf.release()
+
+
+@traced("decode")
+def decode_audio(source, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode source (path, bytes or binary file object) to mono float32 at
+    sample_rate. For bytes input the result may be a read-only view of it.
+    Raises UnsupportedAudio when the format cannot be decoded in-process.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return _decode_buffer(memoryview(source).cast("B"), None, sample_rate)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return _decode_stream(f, sample_rate)
+    return _decode_stream(source, sample_rate)
+
+
+def write_wav(path: str, audio: np.ndarray, sample_rate: int = SAMPLE_RATE, encoding: str = "pcm16") -> str:
+    """
+    Write mono float32 audio as 16-bit PCM WAV, or with encoding="ulaw" as
+    8-bit G.711 mu-law WAV.
+    """
+    if encoding == "ulaw":
+        return _write_mulaw_wav(path, audio, sample_rate)
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767.0).astype("<i2")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(memoryview(pcm).cast("B"))
+    return path
+
+
+def _write_mulaw_wav(path: str, audio: np.ndarray, sample_rate: int) -> str:
+    # the wave module only writes PCM; non-PCM formats need cbSize and a fact chunk
+    data = mulaw_encode(audio).tobytes()
+    fmt = struct.pack("<HHIIHHH", _WAVE_FORMAT_MULAW, 1, sample_rate, sample_rate, 1, 8, 0)
+    fact = struct.pack("<I", len(data))
+    pad = b"\0" if len(data) & 1 else b""
+    riff_size = 4 + (8 + len(fmt)) + (8 + len(fact)) + (8 + len(data) + len(pad))
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE"))
+        f.write(struct.pack("<4sI", b"fmt ", len(fmt)) + fmt)
+        f.write(struct.pack("<4sI", b"fact", len(fact)) + fact)
+        f.write(struct.pack("<4sI", b"data", len(data)) + data + pad)
+    return path
@@ -0,0 +1,140 @@
+# backend/app/services/audio_store.py
+"""
+Content-addressed store for synthesized audio.
+
+A clip's file name is the SHA-256 of (engine, voice, lang, format, text), so
+the same sentence is synthesized once and then served from disk for every
+caller. Files live flat under TTS_DIR (the directory /static/tts serves) and
+the least-recently-used ones are deleted when the store grows past
+TTS_CACHE_MAX_MB. A hit refreshes the file's mtime, which is the LRU clock.
+"""
+import hashlib
+import json
+import os
+import threading
+
+TTS_DIR = os.environ.get("TTS_DIR", "/tmp/tts")
+TTS_CACHE_MAX_MB = int(os.environ.get("TTS_CACHE_MAX_MB", "512"))
+
+AUDIO_EXTENSIONS = {"mp3": "audio/mpeg", "wav": "audio/wav"}
+# formats stored under another format's extension (8 kHz mu-law is a WAV)
+_FORMAT_EXTENSIONS = {"ulaw": "wav"}
+
+
+def audio_key(text: str, lang: str, voice: str, engine: str, fmt: str = "mp3") -> str:
+    norm = " ".join((text or "").split())
+    payload = json.dumps([engine, voice, lang, fmt, norm], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf8")).hexdigest()
+
+
+class AudioStore:
+    def __init__(self, root: str = TTS_DIR, max_bytes: int = TTS_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._bytes = self._scan_size()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _scan_size(self) -> int:
+        total = 0
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_file():
+                    total += entry.stat().st_size
+        return total
+
+    def filename(self, key: str, fmt: str = "mp3") -> str:
+        return f"{key}.{_FORMAT_EXTENSIONS.get(fmt, fmt)}"
+
+    def path(self, fname: str) -> str:
+        return os.path.join(self.root, fname)
+
+    def get_or_create(self, text: str, lang: str, voice: str, engine: str, synthesize, fmt: str = "mp3"):
+        """
+        Return (path, fname) for the clip, calling synthesize(tmp_path) only on a miss.
+        synthesize must write the audio to the path it is given.
+        """
+        key = audio_key(text, lang, voice, engine, fmt)
+        fname = self.filename(key, fmt)
+        path = self.path(fname)
+        if self._touch(path):
+            return path, fname
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                # another thread may have produced it while we waited
+                if self._touch(path):
+                    return path, fname
+                self._count("misses")
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    synthesize(tmp)
+                    # sized before the rename: once the file is in place,
+                    # another process's eviction may delete it at any time
+                    size = os.path.getsize(tmp)
+                    os.replace(tmp, path)  # atomic: readers never see a partial file
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+        with self._lock:
+            self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict()
+        return path, fname
+
+    def _touch(self, path: str) -> bool:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        self._count("hits")
+        return True
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _evict(self):
+        # caller holds _lock; rescans because other processes share the directory
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, p in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.counters["evictions"] += 1
+        self._bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> AudioStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AudioStore()
+    return _store
@@ -0,0 +1,99 @@
+# backend/app/services/batching.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Gathers items submitted from many threads into batches for one model call.
+
+    A batch is dispatched when it reaches max_batch_size or when the oldest
+    item has waited max_wait_ms, whichever comes first. process_batch receives
+    a list of items and must return a list of results in the same order.
+    """
+
+    def __init__(self, process_batch, max_batch_size: int = 16, max_wait_ms: float = 10.0, name: str = "batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, item) -> Future:
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        fut = Future()
+        self._ensure_started()
+        self._queue.put((item, fut))
+        return fut
+
+    def submit_many(self, items):
+        return [self.submit(item) for item in items]
+
+    def __call__(self, item, timeout: float = None):
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # close() sentinel: run what we have, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # futures cancelled by their caller while queued are left out
+            batch = [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            futures = [fut for _, fut in batch]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: got {len(results)} results for {len(items)} items")
+            except BaseException as e:
+                # BaseException too: this is the only thread serving the
+                # queue, and if it died every later caller would wait forever
+                for fut in futures:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(items)
+            for fut, res in zip(futures, results):
+                fut.set_result(res)
+
+    def close(self):
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
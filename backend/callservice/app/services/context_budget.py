@@ -0,0 +1,182 @@
+# backend/app/services/context_budget.py
+"""
+Assemble the RAG context for a prompt under a fixed token budget.
+
+Chunks are taken best-score first, near-duplicates of already selected chunks
+are skipped, and the last chunk that does not fit is cut at a sentence
+boundary. Tokens are counted with the target model's own tokenizer when it can
+be loaded, otherwise with a conservative byte-based estimate.
+"""
+import math
+import os
+import re
+import threading
+
+from .sentences import split_sentences
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "768"))
+# Jaccard similarity of word 3-gram shingles above which a chunk is a near-duplicate
+CONTEXT_DEDUP_THRESHOLD = float(os.environ.get("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+# model name -> Hugging Face tokenizer with the same vocabulary
+HF_TOKENIZERS = {
+    "tinyllama:1.1b": "TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+    "tinyllama": "TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+}
+
+CONTEXT_SEPARATOR = "\n---\n"
+
+
+class ApproxTokenCounter:
+    """
+    Upper-bound estimate for when no tokenizer is available. Byte-level BPE
+    vocabularies rarely go below ~3 UTF-8 bytes per token, and Malayalam
+    (3 bytes per code point) often lands at one token per code point.
+    """
+    name = "approx"
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text.encode("utf8")) / 3)
+
+
+class HFTokenCounter:
+    def __init__(self, name: str):
+        from transformers import AutoTokenizer
+        self._tok = AutoTokenizer.from_pretrained(name)
+        self.name = name
+
+    def count(self, text: str) -> int:
+        return len(self._tok.encode(text, add_special_tokens=False))
+
+
+class TiktokenCounter:
+    def __init__(self, model: str):
+        import tiktoken
+        try:
+            self._enc = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self._enc = tiktoken.get_encoding("o200k_base")
+        self.name = f"tiktoken:{model}"
+
+    def count(self, text: str) -> int:
+        return len(self._enc.encode(text))
+
+
+_counters = {}
+_counters_lock = threading.Lock()
+_load_locks = {}   # model -> Lock, so concurrent callers share one tokenizer load
+
+
+def _load_counter(model: str):
+    try:
+        if model.startswith("gpt-"):
+            return TiktokenCounter(model)
+        if model in HF_TOKENIZERS:
+            return HFTokenCounter(HF_TOKENIZERS[model])
+    except Exception as e:
+        print(f"[context] tokenizer for {model} unavailable, estimating: {e}")
+    return ApproxTokenCounter()
+
+
+def get_token_counter(model: str):
+    """
+    Token counter for the target model, cached per model name. A tokenizer
+    may be downloaded from the hub on first use; that happens under a lock
+    for this model only, so lookups for other models are not held up.
+    """
+    with _counters_lock:
+        counter = _counters.get(model)
+        if counter is not None:
+            return counter
+        load_lock = _load_locks.setdefault(model, threading.Lock())
+    with load_lock:
+        # another thread may have finished loading while we waited
+        with _counters_lock:
+            counter = _counters.get(model)
+        if counter is None:
+            counter = _load_counter(model)
+            with _counters_lock:
+                _counters[model] = counter
+                _load_locks.pop(model, None)
+        return counter
+
+
+_WORD = re.compile(r"\S+")
+
+
+def _shingles(text: str, n: int = 3):
+    words = _WORD.findall(text.lower())
+    if len(words) < n:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _jaccard(a, b) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _fit_sentences(text: str, budget: int, counter) -> str:
+    """
+    Longest prefix of whole sentences of text that fits in budget tokens.
+    """
+    kept = []
+    for sentence in split_sentences(text):
+        candidate = " ".join(kept + [sentence])
+        if counter.count(candidate) > budget:
+            break
+        kept.append(sentence)
+    return " ".join(kept)
+
+
+def assemble_context(chunks, model: str, budget: int = CONTEXT_TOKEN_BUDGET,
+                     dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD, counter=None) -> dict:
+    """
+    chunks: dicts with at least "text" and "score" (as returned by retrieval).
+    Returns {"context", "chunks", "tokens", "budget", "tokenizer",
+             "deduplicated", "dropped", "truncated_tokens"} where chunks are
+    the selected (possibly shortened) chunks and truncated_tokens counts the
+    candidate tokens left out of the prompt.
+    """
+    counter = counter or get_token_counter(model)
+    sep_tokens = counter.count(CONTEXT_SEPARATOR)
+    selected, selected_shingles = [], []
+    used = deduplicated = dropped = truncated = 0
+
+    for chunk in sorted(chunks, key=lambda c: c.get("score", 0.0), reverse=True):
+        text = chunk["text"]
+        tokens = counter.count(text)
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, s) >= dedup_threshold for s in selected_shingles):
+            deduplicated += 1
+            continue
+        cost = tokens + (sep_tokens if selected else 0)
+        if used + cost <= budget:
+            selected.append(chunk)
+            selected_shingles.append(shingles)
+            used += cost
+            continue
+        # does not fit whole: keep its leading sentences if any fit
+        room = budget - used - (sep_tokens if selected else 0)
+        partial = _fit_sentences(text, room, counter) if room > 0 else ""
+        if partial:
+            partial_tokens = counter.count(partial)
+            selected.append({**chunk, "text": partial, "truncated": True})
+            selected_shingles.append(_shingles(partial))
+            used += partial_tokens + (sep_tokens if len(selected) > 1 else 0)
+            truncated += tokens - partial_tokens
+        else:
+            dropped += 1
+            truncated += tokens
+
+    return {
+        "context": CONTEXT_SEPARATOR.join(c["text"] for c in selected),
+        "chunks": selected,
+        "tokens": used,
+        "budget": budget,
+        "tokenizer": counter.name,
+        "deduplicated": deduplicated,
+        "dropped": dropped,
+        "truncated_tokens": truncated,
+    }
@@ -1,6 +1,7 @@
 # backend/app/services/image_model.py
 import os
 import json
+import threading
 from typing import List, Tuple, Dict, Optional
 from pathlib import Path
 from io import BytesIO
@@ -8,38 +9,58 @@ from io import BytesIO
 import numpy as np
 from PIL import Image
 
-# Try TF first
-try:
-    import tensorflow as tf
-    from tensorflow.keras.models import load_model as tf_load_model
-    TF_AVAILABLE = True
-except Exception:
-    TF_AVAILABLE = False
-
-# Try ONNX Runtime fallback
-try:
-    import onnxruntime as ort
-    ONNX_AVAILABLE = True
-except Exception:
-    ONNX_AVAILABLE = False
+from . import lazy
+from .batching import MicroBatcher
+from .tracing import traced
+
+# TensorFlow is imported on first use (_import_tf): the import alone takes
+# seconds, and ONNX-first deployments never need it
+tf = None
+tf_load_model = None
+TF_AVAILABLE = None  # unknown until _import_tf() runs
+
+# ONNX Runtime, imported when the first session is created
+ort = lazy.lazy_import("onnxruntime")
+ONNX_AVAILABLE = lazy.available("onnxruntime")
 
 # Optional: for Grad-CAM visualization if TF available
-try:
-    import matplotlib.pyplot as plt   # only needed if you save/display heatmaps
-    MATPLOTLIB_AVAILABLE = True
-except Exception:
-    MATPLOTLIB_AVAILABLE = False
+MATPLOTLIB_AVAILABLE = lazy.available("matplotlib")
 
 # Configuration / defaults
 MODEL_DIR = os.environ.get("IMAGE_MODEL_DIR", "./ml/image/exported_model")
+# backends tried by initialize_model, in order; "onnx" alone never imports TF
+IMAGE_BACKENDS = [b.strip() for b in os.environ.get("IMAGE_BACKENDS", "tf,onnx").split(",") if b.strip()]
+# ONNX file inside MODEL_DIR, e.g. model.int8.onnx from ml/image/export.py
+IMAGE_ONNX_FILE = os.environ.get("IMAGE_ONNX_FILE", "model.onnx")
+# ONNX Runtime session options; 0 threads = ORT's default (one per core)
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.environ.get("ORT_INTER_OP_THREADS", "0"))
+ORT_GRAPH_OPTIMIZATION = os.environ.get("ORT_GRAPH_OPTIMIZATION", "all")  # disabled | basic | extended | all
+# when set, ORT writes the graph it optimized at load time to this path
+ORT_OPTIMIZED_MODEL_PATH = os.environ.get("ORT_OPTIMIZED_MODEL_PATH", "")
 DEFAULT_TARGET_SIZE = (224, 224)
 TOP_K = 3
+# concurrent predict_from_pil calls are batched into one model call
+IMAGE_BATCHING = os.environ.get("IMAGE_BATCHING", "1") == "1"
+IMAGE_MAX_BATCH = int(os.environ.get("IMAGE_MAX_BATCH", "16"))
+IMAGE_MAX_WAIT_MS = float(os.environ.get("IMAGE_MAX_WAIT_MS", "10"))
+# per-channel normalisation applied after scaling to [0, 1], e.g.
+# "0.485,0.456,0.406" / "0.229,0.224,0.225"; empty keeps plain [0, 1] input
+IMAGE_MEAN = os.environ.get("IMAGE_MEAN", "")
+IMAGE_STD = os.environ.get("IMAGE_STD", "")
+# large non-JPEG images are box-reduced to within this factor of the target
+# before the bilinear resize
+IMAGE_REDUCING_GAP = float(os.environ.get("IMAGE_REDUCING_GAP", "3.0"))
 
 # Internal caches
 _tf_model = None
 _onnx_session = None
 _labels = None
 _model_type = None  # 'tf' | 'onnx' | None
+_input_spec_cache = None  # (layout, (height, width), dtype) of the loaded model
+_scratch = threading.local()  # reusable preprocessing buffers
+_batcher = None
+_batcher_lock = threading.Lock()
 
 def _load_labels(model_dir: str) -> List[str]:
     global _labels
@@ -65,11 +86,21 @@ def _load_labels(model_dir: str) -> List[str]:
     _labels = labels
     return labels
 
+def _import_tf() -> bool:
+    global tf, tf_load_model, TF_AVAILABLE
+    if TF_AVAILABLE is None:
+        try:
+            tensorflow = lazy.import_module("tensorflow")
+            tf, tf_load_model, TF_AVAILABLE = tensorflow, tensorflow.keras.models.load_model, True
+        except Exception:
+            TF_AVAILABLE = False
+    return TF_AVAILABLE
+
 def _load_tf_model(model_dir: str):
     global _tf_model, _model_type
     if _tf_model is not None:
         return _tf_model
-    if not TF_AVAILABLE:
+    if not _import_tf():
         raise RuntimeError("TensorFlow not available in this environment.")
     if Path(model_dir).exists():
         try:
@@ -85,98 +116,290 @@ def _load_tf_model(model_dir: str):
                     return _tf_model
     raise FileNotFoundError(f"No TF model found at {model_dir}")
 
-def _load_onnx_session(onnx_path: str):
-    global _onnx_session, _model_type
-    if _onnx_session is not None:
-        return _onnx_session
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disabled": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+def session_options(intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None,
+                    optimization: Optional[str] = None, optimized_model_path: Optional[str] = None):
+    """
+    ort.SessionOptions from the ORT_* settings; arguments override them.
+    """
+    intra = ORT_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+    inter = ORT_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+    level = (optimization or ORT_GRAPH_OPTIMIZATION).lower()
+    if level not in _GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"unknown graph optimization level {level!r}; expected one of {sorted(_GRAPH_OPTIMIZATION_LEVELS)}")
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = getattr(ort.GraphOptimizationLevel, _GRAPH_OPTIMIZATION_LEVELS[level])
+    if intra > 0:
+        opts.intra_op_num_threads = intra
+    if inter > 0:
+        # inter-op threads only run independent graph branches in parallel mode
+        opts.inter_op_num_threads = inter
+        opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    path = ORT_OPTIMIZED_MODEL_PATH if optimized_model_path is None else optimized_model_path
+    if path:
+        opts.optimized_model_filepath = str(path)
+    return opts
+
+def create_onnx_session(onnx_path: str, options=None):
+    """
+    A CPU InferenceSession for onnx_path with session_options() unless
+    options is given. Used for the serving model and by the comparison tools.
+    """
     if not ONNX_AVAILABLE:
         raise RuntimeError("ONNX runtime is not available.")
     if not Path(onnx_path).exists():
         raise FileNotFoundError(f"ONNX model not found at {onnx_path}")
-    sess = ort.InferenceSession(str(onnx_path), providers=['CPUExecutionProvider'])
+    return ort.InferenceSession(str(onnx_path), sess_options=options or session_options(),
+                                providers=['CPUExecutionProvider'])
+
+def _load_onnx_session(onnx_path: str):
+    global _onnx_session, _model_type
+    if _onnx_session is not None:
+        return _onnx_session
+    sess = create_onnx_session(onnx_path)
     _onnx_session = sess
     _model_type = 'onnx'
     return sess
 
 def initialize_model(model_dir: Optional[str] = None, onnx_file: Optional[str] = None):
-    global _labels, _model_type
+    global _labels, _model_type, _input_spec_cache
     model_dir = model_dir or MODEL_DIR
+    _input_spec_cache = None
     _labels = _load_labels(model_dir)
 
-    # Try TF first
-    if TF_AVAILABLE:
+    for backend in IMAGE_BACKENDS:
+        if backend == "tf":
+            try:
+                _load_tf_model(model_dir)
+                return
+            except Exception:
+                pass
+        elif backend == "onnx" and ONNX_AVAILABLE:
+            onnx_path = Path(onnx_file or Path(model_dir) / IMAGE_ONNX_FILE)
+            if onnx_path.exists():
+                _load_onnx_session(str(onnx_path))
+                return
+
+    # No model loaded
+    _model_type = None
+
+def _input_spec(shape) -> Tuple[str, Tuple[int, int]]:
+    """
+    (layout, (height, width)) from a model input shape such as
+    (None, 224, 224, 3) or ['batch', 3, 224, 224]. Unknown dims fall back to
+    DEFAULT_TARGET_SIZE; channels-first is recognised by a leading 3.
+    """
+    dims = list(shape or [])[1:]
+    if len(dims) != 3:
+        return "NHWC", DEFAULT_TARGET_SIZE
+    as_int = [d if isinstance(d, int) else (int(d) if str(d).isdigit() else None) for d in dims]
+    if as_int[0] == 3 and as_int[2] != 3:
+        layout, (h, w) = "NCHW", as_int[1:]
+    else:
+        layout, (h, w) = "NHWC", as_int[:2]
+    if not h or not w:
+        h, w = DEFAULT_TARGET_SIZE[1], DEFAULT_TARGET_SIZE[0]
+    return layout, (h, w)
+
+def _model_input_spec() -> Tuple[str, Tuple[int, int], type]:
+    """
+    (layout, (height, width), dtype) the loaded model takes. dtype is uint8
+    for quantized models that take raw pixels, float32 otherwise.
+    """
+    global _input_spec_cache
+    if _input_spec_cache is None:
+        shape, dtype = None, np.float32
         try:
-            _load_tf_model(model_dir)
-            return
+            if _model_type == 'tf' and _tf_model is not None:
+                shape = _tf_model.input_shape
+                if _tf_model.inputs[0].dtype == tf.uint8:
+                    dtype = np.uint8
+            elif _model_type == 'onnx' and _onnx_session is not None:
+                inp = _onnx_session.get_inputs()[0]
+                shape = inp.shape
+                if inp.type == "tensor(uint8)":
+                    dtype = np.uint8
         except Exception:
             pass
+        _input_spec_cache = _input_spec(shape) + (dtype,)
+    return _input_spec_cache
 
-    # ONNX fallback
-    if ONNX_AVAILABLE:
-        onnx_path = onnx_file or Path(model_dir) / "model.onnx"
-        if onnx_path.exists():
-            _load_onnx_session(str(onnx_path))
-            return
+def _parse_channels(spec: str) -> Optional[np.ndarray]:
+    values = [float(v) for v in spec.split(",") if v.strip()] if spec else []
+    if not values:
+        return None
+    if len(values) == 1:
+        values = values * 3
+    return np.asarray(values[:3], dtype=np.float32)
 
-    # No model loaded
-    _model_type = None
+_MEAN = _parse_channels(IMAGE_MEAN)
+_STD = _parse_channels(IMAGE_STD)
 
-def _preprocess_image(img: Image.Image, target_size: Tuple[int,int]=DEFAULT_TARGET_SIZE) -> np.ndarray:
+def _buffer(name: str, shape: Tuple[int, ...], dtype) -> np.ndarray:
+    """
+    Per-thread scratch array of at least shape[0] rows, grown on demand and
+    reused across calls; returns a view with exactly shape[0] rows.
+    """
+    key = (name, shape[1:], np.dtype(dtype).str)
+    buffers = getattr(_scratch, "buffers", None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buf = buffers.get(key)
+    if buf is None or buf.shape[0] < shape[0]:
+        buf = buffers[key] = np.empty((max(shape[0], IMAGE_MAX_BATCH),) + tuple(shape[1:]), dtype=dtype)
+    return buf[: shape[0]]
+
+def _fit(img: Image.Image, target_size: Tuple[int, int]) -> np.ndarray:
+    """
+    Decode and resize one image to target_size (width, height) as an
+    (h, w, 3) uint8 array. JPEGs that are not loaded yet are decoded in draft
+    mode: libjpeg scales by 1/2, 1/4 or 1/8 while decoding, so a 12 MP photo
+    is never fully decoded just to be shrunk to 224x224. Other formats are
+    box-reduced before the final filter (reducing_gap).
+    """
+    if isinstance(img, np.ndarray):
+        return img
+    w, h = target_size
+    if img.format == "JPEG":
+        img.draft("RGB", (w, h))   # no-op once the image is loaded
     if img.mode != "RGB":
         img = img.convert("RGB")
-    img = img.resize(target_size, Image.BILINEAR)
-    arr = np.asarray(img).astype("float32") / 255.0
-    batch = np.expand_dims(arr, axis=0)
-    return batch
+    if img.size != (w, h):
+        img = img.resize((w, h), Image.BILINEAR, reducing_gap=IMAGE_REDUCING_GAP)
+    return np.asarray(img)
+
+def preprocess_batch(images, target_size: Tuple[int, int] = None, layout: str = None, dtype=None) -> np.ndarray:
+    """
+    Fit images (PIL images or arrays already returned by _fit) into one
+    reused uint8 batch buffer, then write the model input in a single pass
+    into a second reused buffer, already in the requested layout (NHWC or
+    NCHW): pixels * scale (+ bias for IMAGE_MEAN/IMAGE_STD, in place), or the
+    raw uint8 pixels when dtype is uint8. The returned array is a per-thread
+    buffer: consume it before the next call on the same thread.
+    """
+    spec_layout, (spec_h, spec_w), spec_dtype = _model_input_spec()
+    layout = layout or spec_layout
+    dtype = np.dtype(dtype or spec_dtype)
+    w, h = target_size or (spec_w, spec_h)
+    n = len(images)
+    pixels = _buffer("pixels", (n, h, w, 3), np.uint8)
+    for i, img in enumerate(images):
+        pixels[i] = _fit(img, (w, h))
+
+    src = pixels.transpose(0, 3, 1, 2) if layout == "NCHW" else pixels
+    if dtype == np.uint8:
+        if layout != "NCHW":
+            return pixels
+        out = _buffer("input_u8", src.shape, np.uint8)
+        np.copyto(out, src)
+        return out
+
+    out = _buffer("input_" + layout, src.shape, np.float32)
+    channel_axis = (3, 1, 1) if layout == "NCHW" else (3,)
+    std = _STD if _STD is not None else np.ones(3, np.float32)
+    scale = (np.float32(1.0 / 255.0) / std).reshape(channel_axis)
+    np.multiply(src, scale, out=out)
+    if _MEAN is not None:
+        np.subtract(out, (_MEAN / std).reshape(channel_axis), out=out)
+    return out
+
+def _preprocess_image(img: Image.Image, target_size: Tuple[int,int]=DEFAULT_TARGET_SIZE) -> np.ndarray:
+    # single NHWC float image (Grad-CAM); a copy, since the batch buffer is reused
+    return preprocess_batch([img], target_size=target_size, layout="NHWC", dtype=np.float32).copy()
 
 def _softmax(x: np.ndarray) -> np.ndarray:
-    e = np.exp(x - np.max(x))
+    e = np.exp(x - np.max(x, axis=-1, keepdims=True))
     return e / e.sum(axis=-1, keepdims=True)
 
 def _get_top_k_from_probs(probs: np.ndarray, labels: List[str], k:int=TOP_K):
     top_idx = np.argsort(probs)[::-1][:k]
     return [(labels[i], float(probs[i]), int(i)) for i in top_idx]
 
-def predict_from_pil(img: Image.Image, top_k: int = TOP_K) -> Dict:
-    global _tf_model, _onnx_session, _labels, _model_type
-    if _labels is None:
-        _labels = _load_labels(MODEL_DIR)
-
-    batch = _preprocess_image(img)
-
-    if _model_type == 'tf' and TF_AVAILABLE:
+def _run_model(batch: np.ndarray) -> np.ndarray:
+    """
+    One forward pass over the batch; returns (N, classes) scores.
+    """
+    if _model_type == 'tf':
         model = _tf_model or _load_tf_model(MODEL_DIR)
-        preds = model.predict(batch)
-        if preds.ndim == 2 and preds.shape[0] == 1:
-            probs = _softmax(preds[0])
-        elif preds.ndim == 1:
-            probs = _softmax(preds)
+        # a direct call skips model.predict's per-call tf.data/callback setup
+        out = model(batch, training=False)
+        if isinstance(out, (list, tuple)):
+            out = out[0]
+        elif isinstance(out, dict):
+            out = next(iter(out.values()))
+        out = out.numpy() if hasattr(out, "numpy") else np.asarray(out)
+    else:
+        sess = _onnx_session or _load_onnx_session(str(Path(MODEL_DIR) / IMAGE_ONNX_FILE))
+        inp, output_name = sess.get_inputs()[0], sess.get_outputs()[0].name
+        if inp.shape and inp.shape[0] == 1 and batch.shape[0] > 1:
+            # exported with a fixed batch of one: run the rows one by one
+            out = np.concatenate([sess.run([output_name], {inp.name: batch[i:i + 1]})[0] for i in range(batch.shape[0])])
         else:
-            probs = preds[0] if preds.shape[0] == 1 else preds.flatten()
-            probs = _softmax(probs)
-        preds_top = _get_top_k_from_probs(probs, _labels, k=top_k)
-        return {"predictions": preds_top, "model_type": "tf"}
-
-    if _model_type == 'onnx' and ONNX_AVAILABLE:
-        sess = _onnx_session or _load_onnx_session(str(Path(MODEL_DIR) / "model.onnx"))
-        input_name = sess.get_inputs()[0].name
-        inp = batch
-        # ONNX may expect NCHW
-        try:
-            in_shape = sess.get_inputs()[0].shape
-            if in_shape and len(in_shape) == 4 and (in_shape[1] == 3 or in_shape[1] == '3'):
-                inp = np.transpose(inp, (0,3,1,2)).astype(np.float32)
-        except Exception:
-            pass
-        out_names = [o.name for o in sess.get_outputs()]
-        res = sess.run(out_names, {input_name: inp.astype(np.float32)})
-        logits = res[0]
-        probs = logits[0] if logits.shape[0] == 1 else logits.flatten()
-        probs = _softmax(probs)
-        preds_top = _get_top_k_from_probs(probs, _labels, k=top_k)
-        return {"predictions": preds_top, "model_type": "onnx"}
+            out = sess.run([output_name], {inp.name: batch})[0]
+    return out.reshape(batch.shape[0], -1)
 
-    return {"predictions": [], "model_type": None, "message": "No image model loaded."}
+def _batch_probs(images: List[Image.Image]) -> List[np.ndarray]:
+    """
+    Class probabilities for each image, from one model call.
+    """
+    probs = _softmax(_run_model(preprocess_batch(images)))
+    return list(probs)
+
+@traced("image_batch")
+def predict_batch(images: List[Image.Image], top_k: int = TOP_K) -> List[Dict]:
+    """
+    Classify several images with one model call. Returns one result dict per
+    image, in order, shaped like predict_from_pil's.
+    """
+    global _labels
+    if _labels is None:
+        _labels = _load_labels(MODEL_DIR)
+    if _model_type not in ('tf', 'onnx'):
+        return [{"predictions": [], "model_type": None, "message": "No image model loaded."} for _ in images]
+    results = []
+    for start in range(0, len(images), IMAGE_MAX_BATCH):
+        for probs in _batch_probs(images[start:start + IMAGE_MAX_BATCH]):
+            results.append({"predictions": _get_top_k_from_probs(probs, _labels, k=top_k), "model_type": _model_type})
+    return results
+
+def _get_batcher() -> MicroBatcher:
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    _batch_probs,
+                    max_batch_size=IMAGE_MAX_BATCH,
+                    max_wait_ms=IMAGE_MAX_WAIT_MS,
+                    name="image-batcher",
+                )
+    return _batcher
+
+@traced("image")
+def predict_from_pil(img: Image.Image, top_k: int = TOP_K) -> Dict:
+    """
+    Classify one image. With IMAGE_BATCHING on, concurrent callers share
+    model calls through a micro-batcher (up to IMAGE_MAX_BATCH images or
+    IMAGE_MAX_WAIT_MS of waiting).
+    """
+    global _labels
+    if _labels is None:
+        _labels = _load_labels(MODEL_DIR)
+    if _model_type not in ('tf', 'onnx'):
+        return {"predictions": [], "model_type": None, "message": "No image model loaded."}
+    if not IMAGE_BATCHING:
+        return predict_batch([img], top_k=top_k)[0]
+    # decode/resize here, in the caller's thread, so the batcher thread only
+    # stacks small arrays and runs the model
+    _, (h, w), _ = _model_input_spec()
+    probs = _get_batcher()(_fit(img, (w, h)))
+    return {"predictions": _get_top_k_from_probs(probs, _labels, k=top_k), "model_type": _model_type}
 
 def predict_image(img_path: str, top_k: int = TOP_K) -> Dict:
     img = Image.open(img_path)
@@ -219,7 +442,7 @@ def analyze_image(img_path: str, top_k: int = TOP_K) -> Dict:
 
 # --- Optional: Grad-CAM (TF models only) ---
 def gradcam_heatmap(img_path: str, class_index: int, last_conv_layer_name: Optional[str]=None):
-    if not TF_AVAILABLE:
+    if not _import_tf():
         raise RuntimeError("TensorFlow required for Grad-CAM.")
     model = _tf_model or _load_tf_model(MODEL_DIR)
 
@@ -0,0 +1,101 @@
+# backend/app/services/lazy.py
+"""
+Deferred imports for the heavy optional backends (TensorFlow, transformers,
+faster-whisper / openai-whisper, gTTS, matplotlib).
+
+lazy_import(name) returns a stand-in module that does the real import on
+first attribute access, so an API process or a worker that never touches a
+backend never pays its import time or memory. available(name) answers "is it
+installed?" from import metadata alone, without importing it.
+
+Every deferred import is timed into the callservice_import_seconds gauge and
+import_times(), which the startup profile (/startup, bench.startup_profile)
+reads.
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+import types
+
+from . import tracing
+
+IMPORT_SECONDS = tracing.register(
+    tracing.Gauge("callservice_import_seconds", "Time spent importing each lazily loaded backend module."),
+    "module",
+)
+
+_lock = threading.RLock()
+_import_seconds = {}
+
+
+def available(name: str) -> bool:
+    """
+    True when module `name` can be imported, without importing it.
+    """
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        # a missing parent package raises instead of returning None
+        return False
+
+
+def import_module(name: str):
+    """
+    importlib.import_module, timed the first time `name` is imported.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        elapsed = time.perf_counter() - started
+        _import_seconds[name] = elapsed
+        IMPORT_SECONDS.set(name, elapsed)
+        print(f"[lazy] imported {name} in {elapsed:.2f}s")
+        return module
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module placeholder that imports the real module on first attribute access.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = import_module(self.__name__)
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def is_loaded(name: str) -> bool:
+    return name in sys.modules
+
+
+def import_times() -> dict:
+    with _lock:
+        return {name: round(seconds, 3) for name, seconds in _import_seconds.items()}
@@ -0,0 +1,214 @@
+# backend/app/services/llm_client.py
+"""
+HTTP client for the local Ollama server.
+
+One pooled keep-alive session is shared by the whole process, replacing the
+`ollama run` subprocess per question. `keep_alive` is sent with every request
+so the model stays resident between calls, and a semaphore caps the number of
+generations in flight. The async variant runs on a dedicated executor sized to
+that cap, so awaiting it never blocks the event loop.
+"""
+import asyncio
+import functools
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "tinyllama:1.1b")
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", "2"))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "3"))
+OLLAMA_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", "30"))
+
+
+class OllamaError(RuntimeError):
+    pass
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        host: str = OLLAMA_HOST,
+        model: str = OLLAMA_MODEL,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        max_concurrency: int = OLLAMA_MAX_CONCURRENCY,
+        timeout: float = OLLAMA_TIMEOUT,
+        connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+    ):
+        self.host = host.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+
+        self._session = requests.Session()
+        # one connection per concurrent generation, all reused (keep-alive)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency, pool_block=True)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="ollama")
+
+    def _payload(self, prompt, model=None, options=None, stream=False):
+        payload = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        return payload
+
+    def generate(self, prompt: str, model: str = None, options: dict = None, timeout: float = None) -> str:
+        """
+        Run one non-streaming generation and return the response text.
+        Raises OllamaError on transport or server errors.
+        """
+        payload = self._payload(prompt, model=model, options=options)
+        with self._slots:
+            try:
+                r = self._session.post(
+                    f"{self.host}/api/generate",
+                    json=payload,
+                    timeout=(self.connect_timeout, timeout or self.timeout),
+                )
+                r.raise_for_status()
+            except requests.RequestException as e:
+                raise OllamaError(f"Ollama request failed: {e}") from e
+            try:
+                data = r.json()
+            except ValueError as e:
+                raise OllamaError(f"Ollama returned invalid JSON: {e}") from e
+        if data.get("error"):
+            raise OllamaError(data["error"])
+        return (data.get("response") or "").strip()
+
+    def stream(self, prompt: str, model: str = None, options: dict = None, timeout: float = None):
+        """
+        Yield response tokens as Ollama produces them (NDJSON stream).
+        The concurrency slot is held until the stream is exhausted or closed.
+        """
+        payload = self._payload(prompt, model=model, options=options, stream=True)
+        with self._slots:
+            try:
+                r = self._session.post(
+                    f"{self.host}/api/generate",
+                    json=payload,
+                    stream=True,
+                    timeout=(self.connect_timeout, timeout or self.timeout),
+                )
+                r.raise_for_status()
+            except requests.RequestException as e:
+                raise OllamaError(f"Ollama request failed: {e}") from e
+            try:
+                for line in r.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except ValueError as e:
+                        raise OllamaError(f"Ollama returned invalid JSON: {e}") from e
+                    if chunk.get("error"):
+                        raise OllamaError(chunk["error"])
+                    token = chunk.get("response")
+                    if token:
+                        yield token
+                    if chunk.get("done"):
+                        break
+            except requests.RequestException as e:
+                raise OllamaError(f"Ollama stream failed: {e}") from e
+            finally:
+                r.close()
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """
+        Async variant of generate(); runs on the client's own executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self.generate, prompt, **kwargs))
+
+    async def astream(self, prompt: str, **kwargs):
+        """
+        Async variant of stream(). The blocking HTTP read runs on the client's
+        executor and tokens are handed to the event loop through a queue.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+        cancelled = threading.Event()
+
+        def pump():
+            gen = self.stream(prompt, **kwargs)
+            try:
+                for token in gen:
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, token)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                gen.close()
+
+        loop.run_in_executor(self._executor, pump)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # consumer went away: the pump stops at the next token and
+            # releases its concurrency slot
+            cancelled.set()
+
+    def preload(self, model: str = None):
+        """
+        Ask Ollama to load the model and keep it resident for keep_alive.
+        """
+        payload = {"model": model or self.model, "keep_alive": self.keep_alive}
+        try:
+            r = self._session.post(
+                f"{self.host}/api/generate",
+                json=payload,
+                timeout=(self.connect_timeout, self.timeout),
+            )
+            r.raise_for_status()
+        except requests.RequestException as e:
+            raise OllamaError(f"Ollama preload failed: {e}") from e
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """
+    Return the process-wide client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient()
+    return _client
+
+
+def warmup():
+    try:
+        get_client().preload()
+    except Exception as e:
+        print("[ollama] warmup failed:", e)
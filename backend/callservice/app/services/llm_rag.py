@@ -1,7 +1,30 @@
 import os
 from typing import Tuple, List
 
-# Local simple RAG stub: you should replace with FAISS + sentence-transformers retrieval.
+from .retrieval import get_index, RETRIEVAL_TOP_K
+from .context_budget import assemble_context
+from .llm_client import get_client, OllamaError, OLLAMA_MODEL
+from .tracing import traced
+
+OPENAI_MODEL = "gpt-4o-mini"
+# chunks fetched from the index; the context budget decides how many reach the prompt
+RAG_CANDIDATES = int(os.environ.get("RAG_CANDIDATES", "8"))
+
+def retrieve_docs(query, top_k=RETRIEVAL_TOP_K) -> List[dict]:
+    """
+    Top-k KB chunks for the query from the FAISS index:
+    [{"source": fname, "chunk": n, "text": ..., "score": cosine}, ...]
+    Falls back to retrieve_docs_stub if the index cannot be built.
+    """
+    try:
+        hits = get_index().search(query, top_k=top_k)
+        if hits:
+            return hits
+    except Exception as e:
+        print("[RAG] vector retrieval unavailable:", e)
+    return [{"source": None, "chunk": i, "text": d, "score": 0.0} for i, d in enumerate(retrieve_docs_stub(query, top_k))]
+
+# Query-independent fallback used when the vector index is unavailable.
 def retrieve_docs_stub(query, top_k=3):
     # For demo: read a small file or return canned text
     kb_dir = "./data/kb"
@@ -17,25 +40,51 @@ def retrieve_docs_stub(query, top_k=3):
         ]
     return docs
 
-def generate_answer(question: str, caller: str) -> Tuple[str, List[str]]:
-    docs = retrieve_docs_stub(question)
-    context = "\n---\n".join(docs)
+def _build_prompt(context: str, question: str) -> str:
+    return f"""You are an agricultural assistant for Kerala farmers. Use the context to reply in Malayalam in short simple steps. Context: {context}\n\nQuestion: {question}\nAnswer:"""
+
+@traced("llm")
+def generate_answer(question: str, caller: str) -> Tuple[str, List[dict]]:
+    """
+    Returns (answer, sources); sources are the chunks that made it into the
+    prompt, without their text, i.e. what save_query_record stores.
+    """
+    use_openai = os.environ.get('USE_OPENAI','0') == '1' and os.environ.get('OPENAI_API_KEY')
+    target_model = OPENAI_MODEL if use_openai else OLLAMA_MODEL
+
+    # keep the prompt within CONTEXT_TOKEN_BUDGET tokens of the target model
+    pack = assemble_context(retrieve_docs(question, top_k=RAG_CANDIDATES), model=target_model)
+    print(
+        f"[RAG] context {pack['tokens']}/{pack['budget']} tokens ({pack['tokenizer']}): "
+        f"{len(pack['chunks'])} chunks, {pack['deduplicated']} near-duplicates, "
+        f"{pack['dropped']} dropped, {pack['truncated_tokens']} tokens truncated"
+    )
+    context = pack["context"]
+    sources = [{k: c[k] for k in ("source", "chunk", "score")} for c in pack["chunks"]]
+    prompt = _build_prompt(context, question)
+
     # Prefer OpenAI if configured
-    if os.environ.get('USE_OPENAI','0') == '1' and os.environ.get('OPENAI_API_KEY'):
+    if use_openai:
         import openai
         openai.api_key = os.environ['OPENAI_API_KEY']
-        prompt = f"""You are an agricultural assistant for Kerala farmers. Use the context to reply in Malayalam in short simple steps. Context: {context}\n\nQuestion: {question}\nAnswer:"""
         try:
             resp = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
+                model=OPENAI_MODEL,
                 messages=[{"role":"user","content":prompt}],
                 max_tokens=300
             )
             ans = resp['choices'][0]['message']['content']
-            return ans.strip(), docs
+            return ans.strip(), sources
         except Exception:
             pass
+    # Local TinyLlama via Ollama
+    try:
+        ans = get_client().generate(prompt)
+        if ans:
+            return ans, sources
+    except OllamaError as e:
+        print("[RAG] Ollama unavailable:", e)
     # Offline fallback: very simple template
     answer = "നിങ്ങളുടെ ചോദ്യം: " + (question or "") + "\n\nസൂചനകൾ:\n"
     answer += "- രോഗനിർണയം ഫോട്ടോ അയച്ചു തന്നാല്‍ നന്നായിരിക്കും.\n- സാധാരണയായി ഫംഗസ് ബാധയായി হলেও Krishi Bhavan-നെ സന്ദർശിക്കുക.\n"
-    return answer, docs
+    return answer, sources
@@ -0,0 +1,199 @@
+# backend/app/services/media.py
+"""
+Shared fetcher for call recordings and other media.
+
+One pooled keep-alive requests session (with retries on connection errors and
+5xx/429) is reused for every download instead of a fresh requests.get per
+call. Bodies stream into a spool buffer: recordings up to MEDIA_SPOOL_BYTES
+stay in memory, longer ones spill to a temporary file, and anything past
+MEDIA_MAX_BYTES is refused. afetch() runs the same download on a dedicated
+executor so async callers never block the event loop.
+"""
+import asyncio
+import functools
+import io
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .tracing import traced
+
+MEDIA_POOL_SIZE = int(os.environ.get("MEDIA_POOL_SIZE", "8"))
+MEDIA_RETRIES = int(os.environ.get("MEDIA_RETRIES", "3"))
+MEDIA_CONNECT_TIMEOUT = float(os.environ.get("MEDIA_CONNECT_TIMEOUT", "5"))
+MEDIA_READ_TIMEOUT = float(os.environ.get("MEDIA_READ_TIMEOUT", "30"))
+MEDIA_SPOOL_BYTES = int(os.environ.get("MEDIA_SPOOL_BYTES", str(8 * 1024 * 1024)))
+MEDIA_MAX_BYTES = int(os.environ.get("MEDIA_MAX_BYTES", str(50 * 1024 * 1024)))
+MEDIA_CHUNK_BYTES = 64 * 1024
+
+
+class MediaTooLarge(ValueError):
+    pass
+
+
+class _Spool:
+    """
+    Write buffer kept in memory up to max_memory bytes, then moved to a
+    temporary file. Tracks its own size, so whether it spilled is known
+    without looking into the file object.
+    """
+
+    def __init__(self, max_memory: int):
+        self.max_memory = max_memory
+        self.file = io.BytesIO()
+        self.size = 0
+        self.in_memory = True
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.in_memory and self.size > self.max_memory:
+            disk = tempfile.TemporaryFile(prefix="media_")
+            disk.write(self.file.getbuffer())
+            self.file.close()
+            self.file = disk
+            self.in_memory = False
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+class Media:
+    """
+    A downloaded body: `file` is a binary file positioned at 0 (BytesIO, or a
+    temporary file when it spilled to disk). Use as a context manager (or
+    call close()) to release it.
+    """
+
+    def __init__(self, url: str, file, size: int, content_type: str, in_memory: bool = True):
+        self.url = url
+        self.file = file
+        self.size = size
+        self.content_type = content_type
+        self.in_memory = in_memory
+
+    @property
+    def suffix(self) -> str:
+        path = urlparse(self.url).path.lower()
+        if "wav" in self.content_type or path.endswith(".wav"):
+            return ".wav"
+        if "mpeg" in self.content_type or path.endswith(".mp3"):
+            return ".mp3"
+        return Path(path).suffix or ".wav"
+
+    def read(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def save(self, dest: str) -> str:
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        self.file.seek(0)
+        with open(dest, "wb") as f:
+            shutil.copyfileobj(self.file, f, MEDIA_CHUNK_BYTES)
+        self.file.seek(0)
+        return dest
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MediaFetcher:
+    def __init__(self, pool_size: int = MEDIA_POOL_SIZE, retries: int = MEDIA_RETRIES,
+                 spool_bytes: int = MEDIA_SPOOL_BYTES, max_bytes: int = MEDIA_MAX_BYTES,
+                 connect_timeout: float = MEDIA_CONNECT_TIMEOUT, read_timeout: float = MEDIA_READ_TIMEOUT):
+        self.spool_bytes = spool_bytes
+        self.max_bytes = max_bytes
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False,
+        )
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="media")
+
+    def _spool(self) -> _Spool:
+        return _Spool(self.spool_bytes)
+
+    @traced("download")
+    def fetch(self, url: str, auth=None) -> Media:
+        """
+        Download url (http(s) or file://) into a spooled buffer.
+        Raises MediaTooLarge past max_bytes and requests errors on failure.
+        """
+        if url.startswith("file://"):
+            return self._fetch_file(url)
+        r = self._session.get(url, stream=True, timeout=self.timeout, auth=auth)
+        try:
+            r.raise_for_status()
+            declared = int(r.headers.get("content-length") or 0)
+            if declared > self.max_bytes:
+                raise MediaTooLarge(f"{url} is {declared} bytes (limit {self.max_bytes})")
+            buf = self._spool()
+            try:
+                for chunk in r.iter_content(chunk_size=MEDIA_CHUNK_BYTES):
+                    if buf.size + len(chunk) > self.max_bytes:
+                        raise MediaTooLarge(f"{url} exceeds {self.max_bytes} bytes")
+                    buf.write(chunk)
+            except BaseException:
+                buf.close()
+                raise
+            buf.file.seek(0)
+            return Media(url, buf.file, buf.size, r.headers.get("content-type", ""), buf.in_memory)
+        finally:
+            r.close()
+
+    def _fetch_file(self, url: str) -> Media:
+        src = urlparse(url).path
+        size = os.path.getsize(src)
+        if size > self.max_bytes:
+            raise MediaTooLarge(f"{src} is {size} bytes (limit {self.max_bytes})")
+        buf = self._spool()
+        with open(src, "rb") as f:
+            shutil.copyfileobj(f, buf, MEDIA_CHUNK_BYTES)
+        buf.file.seek(0)
+        return Media(url, buf.file, buf.size, "", buf.in_memory)
+
+    async def afetch(self, url: str, auth=None) -> Media:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self.fetch, url, auth=auth))
+
+    def fetch_to_file(self, url: str, dest: str) -> str:
+        with self.fetch(url) as media:
+            return media.save(dest)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher() -> MediaFetcher:
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = MediaFetcher()
+    return _fetcher
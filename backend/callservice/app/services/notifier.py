@@ -1,44 +1,43 @@
 # backend/app/services/notifier.py
 import os
-from pathlib import Path
 import json
-from gtts import gTTS
-import requests
 
-TW_SID = os.environ.get("TW_SID")
-TW_TOKEN = os.environ.get("TW_TOKEN")
-TW_FROM = os.environ.get("TW_FROM")
+from . import sms
+from .tts import synthesize_cached
+from .tracing import traced
+
 TTS_HOST = os.environ.get("TTS_HOST") or "http://localhost:8000/static/tts"
 
 def serialize_sources(sources):
     return json.dumps(sources)
 
-def save_tts(to_number: str, text: str, lang: str = "ml"):
+@traced("tts")
+def save_tts(to_number: str, text: str, lang: str = "ml", part: int = None):
     """
-    Save TTS mp3 under backend/app/static/tts/ so FastAPI can serve it.
+    Get a TTS clip for text (MP3 or WAV, per TTS_FORMAT) from the
+    content-addressed audio store (synthesized only the first time this text
+    is spoken) so FastAPI can serve it from /static/tts. to_number and part
+    are kept for callers; they no longer name the file.
     Returns (filepath, url).
     """
-    folder = Path("backend/app/static/tts")
-    folder.mkdir(parents=True, exist_ok=True)
-    fname = f"tts_{to_number.replace('+','')}.mp3"
-    filepath = folder / fname
     try:
-        # gTTS expects language codes like 'ml' for Malayalam
-        tts = gTTS(text=text, lang=lang)
-        tts.save(str(filepath))
+        filepath, fname = synthesize_cached(text, lang=lang)
     except Exception as e:
-        # fallback: write a small silent file or re-raise
-        print("[TTS] gTTS error:", e)
+        print("[TTS] synthesis error:", e)
         raise
     play_url = f"{TTS_HOST}/{fname}"
-    return str(filepath), play_url
+    return filepath, play_url
 
+@traced("sms")
 def send_sms_stub(to, message):
-    # stub or Twilio
-    if TW_SID and TW_TOKEN and TW_FROM:
-        from twilio.rest import Client
-        client = Client(TW_SID, TW_TOKEN)
-        client.messages.create(body=message, from_=TW_FROM, to=to)
+    """
+    Hand message to the SMS outbox (app.outbox), which splits, rate limits,
+    retries and records it off this thread. Prints it instead when Twilio is
+    not configured. Returns True when it was queued for Twilio.
+    """
+    if sms.configured():
+        from ..outbox import get_outbox
+        get_outbox().send(to, message)
         return True
     else:
         print("[SMS STUB] To:", to)
@@ -1,9 +1,11 @@
 # offline_farmer_assistant.py
-import subprocess
 from pathlib import Path
 
-# Faster Whisper for offline speech-to-text
-from faster_whisper import WhisperModel
+# Faster Whisper for offline speech-to-text (models shared via the registry)
+from . import whisper_registry
+
+# Local Ollama server over a pooled HTTP session
+from .llm_client import get_client, OllamaError
 
 # Argos Translate for offline translation
 import argostranslate.package
@@ -16,7 +18,9 @@ def transcribe_file_to_english(file_path: str, model_size="tiny"):
     if not Path(file_path).exists():
         raise FileNotFoundError(f"Audio file not found: {file_path}")
 
-    model = WhisperModel(model_size, device="cpu", compute_type="int8")  # CPU-friendly
+    model = whisper_registry.get_model(
+        whisper_registry.FASTER_WHISPER, model_size, device="cpu", compute_type="int8"
+    )  # CPU-friendly
     segments, info = model.transcribe(file_path, task="translate")
     return " ".join([s.text for s in segments]).strip()
 
@@ -26,14 +30,12 @@ def transcribe_file_to_english(file_path: str, model_size="tiny"):
 # -----------------------------
 def ask_llm(question_en: str) -> str:
     """
-    Ask TinyLlama offline via Ollama CLI
+    Ask TinyLlama offline via the local Ollama server
     """
-    cmd = ["ollama", "run", "tinyllama:1.1b", question_en]
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        return f"[LLM ERROR] {e.stderr}"
+        return get_client().generate(question_en, model="tinyllama:1.1b")
+    except OllamaError as e:
+        return f"[LLM ERROR] {e}"
 
 # -----------------------------
 # 3️⃣ Translation (English -> Local)
@@ -0,0 +1,141 @@
+# backend/app/services/preload.py
+"""
+Per-process model warmup.
+
+Each process type warms only what it serves, so an API in front of Celery
+does not hold Whisper and a notify worker does not load MarianMT. Targets are
+picked from, in order:
+
+    PRELOAD_<PROCESS>   e.g. PRELOAD_WORKER=whisper,translator
+    PRELOAD             the same list for every process type
+    DEFAULT_PRELOAD     below
+
+Targets: whisper, translator, image, llm, tts, answer_cache, retrieval.
+"none" (or an empty value) preloads nothing. Each target imports its
+backend on demand, so naming nothing here costs nothing at startup.
+"""
+import os
+import threading
+import time
+
+from . import lazy, tracing
+
+# what each process type warmed before preloading was configurable
+DEFAULT_PRELOAD = {
+    "api": "whisper,llm,tts,answer_cache",
+    "worker": "whisper",
+}
+
+PRELOAD_SECONDS = tracing.register(
+    tracing.Gauge("callservice_preload_seconds", "Time spent warming each preload target."),
+    "target",
+)
+
+_lock = threading.Lock()
+_results = {}   # target -> {"seconds": float, "ok": bool, "error": str?}
+
+
+def _warm_whisper():
+    from . import whisper_registry
+    whisper_registry.warmup()
+
+
+def _warm_translator():
+    from . import translator
+    for direction in translator.MODEL_MAPPING:
+        translator.get_engine(direction)
+
+
+def _warm_image():
+    from . import image_model
+    image_model.initialize_model()
+
+
+def _warm_llm():
+    from . import llm_client
+    llm_client.warmup()
+
+
+def _warm_tts():
+    # load local engine models into the synthesizer pool, then have the
+    # fallback prompts (spoken most often) ready up front
+    from ..prompts import FALLBACK_PROMPTS
+    from . import tts
+    tts.warmup()
+    tts.presynthesize(FALLBACK_PROMPTS)
+
+
+def _warm_answer_cache():
+    from . import answer_cache
+    answer_cache.warmup()
+
+
+def _warm_retrieval():
+    from .retrieval import get_index
+    get_index()
+
+
+TARGETS = {
+    "whisper": _warm_whisper,
+    "translator": _warm_translator,
+    "image": _warm_image,
+    "llm": _warm_llm,
+    "tts": _warm_tts,
+    "answer_cache": _warm_answer_cache,
+    "retrieval": _warm_retrieval,
+}
+
+
+def targets_for(process: str) -> list:
+    """
+    Preload targets configured for a process type ("api", "worker", ...).
+    """
+    spec = os.environ.get(f"PRELOAD_{process.upper()}")
+    if spec is None:
+        spec = os.environ.get("PRELOAD")
+    if spec is None:
+        spec = DEFAULT_PRELOAD.get(process, "")
+    names = [t.strip() for t in spec.split(",") if t.strip() and t.strip() != "none"]
+    unknown = [t for t in names if t not in TARGETS]
+    if unknown:
+        print(f"[preload] ignoring unknown targets {unknown}; known: {sorted(TARGETS)}")
+    return [t for t in names if t in TARGETS]
+
+
+def _run(target: str):
+    started = time.perf_counter()
+    result = {"ok": True}
+    try:
+        TARGETS[target]()
+    except Exception as e:
+        # a missing backend must never block startup
+        result = {"ok": False, "error": str(e)}
+        print(f"[preload] {target} failed: {e}")
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    PRELOAD_SECONDS.set(target, result["seconds"])
+    with _lock:
+        _results[target] = result
+    print(f"[preload] {target} ready in {result['seconds']:.2f}s")
+
+
+def preload(process: str, background: bool = True) -> list:
+    """
+    Warm the targets configured for `process`. With background=True each one
+    runs on its own daemon thread (returned); otherwise they run in order
+    before this returns.
+    """
+    threads = []
+    for target in targets_for(process):
+        if background:
+            t = threading.Thread(target=_run, args=(target,), name=f"preload-{target}", daemon=True)
+            t.start()
+            threads.append(t)
+        else:
+            _run(target)
+    return threads
+
+
+def stats() -> dict:
+    with _lock:
+        warmed = dict(_results)
+    return {"preload": warmed, "imports": lazy.import_times()}
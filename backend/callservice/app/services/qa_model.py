@@ -1,32 +1,108 @@
 # backend/app/services/qa_model.py
-import subprocess
-import shlex
-import html
-import json
+import asyncio
 
-MODEL_NAME = "tinyllama:1.1b"   # Ollama model you have
+from .llm_client import get_client, OllamaError, OLLAMA_MODEL
+from . import answer_cache
+from .tracing import traced
 
+MODEL_NAME = OLLAMA_MODEL   # Ollama model you have (tinyllama:1.1b by default)
+
+def _cached(question_en: str):
+    """
+    Semantic cache lookup; a cache failure must never fail the question.
+    """
+    if not answer_cache.ANSWER_CACHE:
+        return None
+    try:
+        return answer_cache.get_cache().lookup(question_en)
+    except Exception as e:
+        print("[answer-cache] lookup failed:", e)
+        return None
+
+def _remember(question_en: str, answer: str):
+    if not answer_cache.ANSWER_CACHE:
+        return
+    try:
+        answer_cache.get_cache().store(question_en, answer)
+    except Exception as e:
+        print("[answer-cache] store failed:", e)
+
+@traced("llm")
 def answer_query_english(question_en: str, timeout: int = 30) -> dict:
     """
     Send English question to local Ollama tinyllama and return answer dict:
     { "answer": "...", "confidence": 0.0, "sources": [] }
+    Near-duplicates of recent questions are answered from the semantic cache
+    (confidence is then the question similarity and "cache_hit" is True).
     """
+    hit = _cached(question_en)
+    if hit:
+        return hit
     try:
-        # Use subprocess to call ollama CLI. Quote question so shell doesn't mangle it.
-        # Better to pass as args list for safety.
-        # Note: ollama run <model> <prompt>
-        proc = subprocess.run(
-            ["ollama", "run", MODEL_NAME, question_en],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            check=True
-        )
-        out = proc.stdout.strip()
-        # sometimes Ollama prints additional info; keep stdout as answer
+        # pooled keep-alive HTTP session to the Ollama server (no CLI subprocess)
+        out = get_client().generate(question_en, model=MODEL_NAME, timeout=timeout)
+        _remember(question_en, out)
         return {"answer": out, "confidence": 0.0, "sources": []}
-    except subprocess.CalledProcessError as e:
-        stderr = e.stderr or str(e)
-        return {"answer": f"[ERROR] Ollama failed: {stderr}", "confidence": 0.0, "sources": []}
+    except OllamaError as e:
+        return {"answer": f"[ERROR] Ollama failed: {e}", "confidence": 0.0, "sources": []}
     except Exception as e:
         return {"answer": f"[ERROR] {e}", "confidence": 0.0, "sources": []}
+
+@traced("llm")
+async def answer_query(question_en: str, timeout: int = 30) -> str:
+    """
+    Async variant used by the /query endpoint. Returns the answer text and
+    raises OllamaError on failure so the caller can report it.
+    """
+    loop = asyncio.get_running_loop()
+    hit = await loop.run_in_executor(None, _cached, question_en)
+    if hit:
+        return hit["answer"]
+    out = await get_client().agenerate(question_en, model=MODEL_NAME, timeout=timeout)
+    await loop.run_in_executor(None, _remember, question_en, out)
+    return out
+
+@traced("llm")
+def stream_answer_english(question_en: str, timeout: int = 30, result: dict = None):
+    """
+    Yield answer tokens as the model generates them. Errors are yielded as a
+    final "[ERROR] ..." chunk, mirroring answer_query_english. A semantic cache
+    hit is yielded as a single chunk.
+    result, when given, receives the "confidence" and "sources" that
+    answer_query_english would return (the cache similarity on a hit).
+    """
+    hit = _cached(question_en)
+    if result is not None:
+        result.update({"confidence": 0.0, "sources": []} if not hit else
+                      {"confidence": hit["confidence"], "sources": hit["sources"], "cache_hit": True})
+    if hit:
+        yield hit["answer"]
+        return
+    tokens = []
+    try:
+        for token in get_client().stream(question_en, model=MODEL_NAME, timeout=timeout):
+            tokens.append(token)
+            yield token
+    except OllamaError as e:
+        yield f"[ERROR] Ollama failed: {e}"
+        return
+    except Exception as e:
+        yield f"[ERROR] {e}"
+        return
+    _remember(question_en, "".join(tokens).strip())
+
+@traced("llm")
+async def astream_answer(question_en: str, timeout: int = 30):
+    """
+    Async token stream used by /query?stream. Raises OllamaError on failure.
+    """
+    loop = asyncio.get_running_loop()
+    hit = await loop.run_in_executor(None, _cached, question_en)
+    if hit:
+        yield hit["answer"]
+        return
+    tokens = []
+    async for token in get_client().astream(question_en, model=MODEL_NAME, timeout=timeout):
+        tokens.append(token)
+        yield token
+    await loop.run_in_executor(None, _remember, question_en, "".join(tokens).strip())
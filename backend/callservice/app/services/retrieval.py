@@ -0,0 +1,300 @@
+# backend/app/services/retrieval.py
+"""
+Vector retrieval over the knowledge base in KB_DIR.
+
+Documents are split into sentence-packed chunks, embedded in batches and kept
+in a FAISS inner-product index (vectors are L2-normalized, so scores are
+cosine similarities). The index and its metadata are persisted to
+KB_INDEX_DIR and memory-mapped on load. refresh() re-embeds only files whose
+mtime and content hash changed, and drops chunks of deleted files.
+
+The embedding model is pluggable: SentenceTransformerEmbedder for real use,
+HashingEmbedder (deterministic, no model download) for tests.
+"""
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from .sentences import split_sentences
+
+KB_DIR = os.environ.get("KB_DIR", "./data/kb")
+KB_INDEX_DIR = os.environ.get("KB_INDEX_DIR", "./data/kb_index")
+# KB is Malayalam while questions arrive in English, so the default is multilingual
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDER = os.environ.get("EMBEDDER", "sentence-transformers")   # or "hashing"
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))
+CHUNK_CHARS = int(os.environ.get("KB_CHUNK_CHARS", "500"))
+KB_REFRESH_SECONDS = float(os.environ.get("KB_REFRESH_SECONDS", "60"))
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "3"))
+
+_INDEX_FILE = "index.faiss"
+_META_FILE = "meta.json"
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = EMBED_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+        self.name = f"st:{model_name}"
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, texts) -> np.ndarray:
+        vecs = self._model.encode(
+            list(texts), batch_size=self.batch_size, normalize_embeddings=True, show_progress_bar=False
+        )
+        return np.asarray(vecs, dtype=np.float32)
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words/char-trigram embedder using signed feature
+    hashing. No model download; good enough to exercise the index in tests.
+    """
+
+    # \w drops Malayalam vowel signs and viramas (combining marks), so split
+    # on whitespace and punctuation instead
+    _TOKEN = re.compile(r"[^\s.,!?;:()\[\]\"'/\-—]+")
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def _features(self, text):
+        words = self._TOKEN.findall(text.lower())
+        for w in words:
+            yield w
+            padded = f"#{w}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+
+    def encode(self, texts) -> np.ndarray:
+        texts = list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feat.encode("utf8"), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+def make_embedder(kind: str = EMBEDDER):
+    if kind == "hashing":
+        return HashingEmbedder()
+    return SentenceTransformerEmbedder()
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """
+    Process-wide embedder shared by the KB index and the answer cache.
+    """
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = make_embedder()
+    return _embedder
+
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS):
+    """
+    Pack whole sentences into chunks of about chunk_chars; the last sentence of
+    a chunk is repeated at the start of the next so context is not cut mid-thought.
+    """
+    sentences = split_sentences(text)
+    chunks, current = [], []
+    for sentence in sentences:
+        if current and len(" ".join(current + [sentence])) > chunk_chars:
+            chunks.append(" ".join(current))
+            current = current[-1:] if len(current) > 1 else []
+        current.append(sentence)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class KnowledgeIndex:
+    def __init__(self, kb_dir: str = KB_DIR, index_dir: str = KB_INDEX_DIR, embedder=None,
+                 chunk_chars: int = CHUNK_CHARS, refresh_seconds: float = KB_REFRESH_SECONDS):
+        import faiss
+
+        self._faiss = faiss
+        self.kb_dir = kb_dir
+        self.index_dir = index_dir
+        self.embedder = embedder or get_embedder()
+        self.chunk_chars = chunk_chars
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._last_refresh = 0.0
+        self._index = None
+        self._meta = None
+        self._load()
+
+    # -- persistence -------------------------------------------------------
+    def _empty_meta(self):
+        return {"embedder": self.embedder.name, "dim": self.embedder.dim, "next_id": 0, "files": {}, "chunks": {}}
+
+    def _new_index(self):
+        faiss = self._faiss
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.embedder.dim))
+
+    def _load(self):
+        index_path = os.path.join(self.index_dir, _INDEX_FILE)
+        meta_path = os.path.join(self.index_dir, _META_FILE)
+        if os.path.exists(index_path) and os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf8") as f:
+                meta = json.load(f)
+            if meta.get("embedder") == self.embedder.name and meta.get("dim") == self.embedder.dim:
+                # memory-mapped: vectors are paged in on demand and shared between processes
+                self._index = self._faiss.read_index(index_path, self._faiss.IO_FLAG_MMAP)
+                self._meta = meta
+                return
+            print("[retrieval] embedder changed; rebuilding index")
+        self._index = self._new_index()
+        self._meta = self._empty_meta()
+
+    def _save(self, meta, index=None):
+        os.makedirs(self.index_dir, exist_ok=True)
+        index_path = os.path.join(self.index_dir, _INDEX_FILE)
+        meta_path = os.path.join(self.index_dir, _META_FILE)
+        if index is not None:
+            self._faiss.write_index(index, index_path + ".tmp")
+            os.replace(index_path + ".tmp", index_path)
+        with open(meta_path + ".tmp", "w", encoding="utf8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+        # swap both at once so concurrent searches see a consistent pair
+        if index is not None:
+            self._index, self._meta = self._faiss.read_index(index_path, self._faiss.IO_FLAG_MMAP), meta
+        else:
+            self._meta = meta
+
+    def _writable_index(self):
+        # an mmapped index is read-only; rebuild an in-memory copy to modify
+        if self._index.ntotal == 0:
+            return self._new_index()
+        index = self._new_index()
+        ids = np.array(sorted(int(i) for i in self._meta["chunks"]), dtype=np.int64)
+        vecs = np.vstack([self._index.reconstruct(int(i)) for i in ids]).astype(np.float32)
+        index.add_with_ids(vecs, ids)
+        return index
+
+    # -- updates -----------------------------------------------------------
+    def refresh(self) -> dict:
+        """
+        Bring the index in line with KB_DIR. Returns counts of what changed.
+        """
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            # work on a copy; searches keep using the current index until _save swaps
+            meta = copy.deepcopy(self._meta)
+            files = meta["files"]
+            seen, changed, touched = set(), [], False
+            if os.path.isdir(self.kb_dir):
+                for fname in sorted(os.listdir(self.kb_dir)):
+                    path = os.path.join(self.kb_dir, fname)
+                    if not os.path.isfile(path):
+                        continue
+                    seen.add(fname)
+                    mtime = os.path.getmtime(path)
+                    entry = files.get(fname)
+                    if entry and entry["mtime"] == mtime:
+                        continue
+                    digest = _sha256(path)
+                    if entry and entry["sha256"] == digest:
+                        entry["mtime"] = mtime   # touched but unchanged: no re-embed
+                        touched = True
+                        continue
+                    changed.append((fname, mtime, digest))
+            removed = [f for f in files if f not in seen]
+            if not changed and not removed:
+                if touched:
+                    self._save(meta)
+                return {"changed": 0, "removed": 0, "chunks": len(meta["chunks"])}
+
+            index = self._writable_index()
+            stale_ids = []
+            for fname in removed + [c[0] for c in changed]:
+                stale_ids.extend(files.get(fname, {}).get("ids", []))
+            for i in stale_ids:
+                meta["chunks"].pop(str(i), None)
+            for fname in removed:
+                files.pop(fname, None)
+
+            new_texts, new_ids = [], []
+            for fname, mtime, digest in changed:
+                with open(os.path.join(self.kb_dir, fname), "r", encoding="utf8") as f:
+                    chunks = chunk_text(f.read(), self.chunk_chars)
+                ids = []
+                for n, text in enumerate(chunks):
+                    cid = meta["next_id"]
+                    meta["next_id"] += 1
+                    meta["chunks"][str(cid)] = {"source": fname, "chunk": n, "text": text}
+                    ids.append(cid)
+                    new_texts.append(text)
+                    new_ids.append(cid)
+                files[fname] = {"mtime": mtime, "sha256": digest, "ids": ids}
+
+            if stale_ids:
+                index.remove_ids(np.array(stale_ids, dtype=np.int64))
+            for start in range(0, len(new_texts), EMBED_BATCH_SIZE):
+                vecs = self.embedder.encode(new_texts[start:start + EMBED_BATCH_SIZE])
+                index.add_with_ids(vecs, np.array(new_ids[start:start + EMBED_BATCH_SIZE], dtype=np.int64))
+            self._save(meta, index)
+            print(f"[retrieval] re-embedded {len(changed)} file(s), removed {len(removed)}, {len(new_texts)} new chunks")
+            return {"changed": len(changed), "removed": len(removed), "chunks": len(meta["chunks"])}
+
+    # -- queries -----------------------------------------------------------
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K):
+        """
+        Return up to top_k chunks as dicts: {"source", "chunk", "text", "score"}.
+        """
+        if time.monotonic() - self._last_refresh > self.refresh_seconds:
+            self.refresh()
+        with self._lock:
+            index, chunks = self._index, self._meta["chunks"]
+        if index.ntotal == 0 or not query:
+            return []
+        qvec = self.embedder.encode([query])
+        scores, ids = index.search(qvec, min(top_k, index.ntotal))
+        hits = []
+        for score, cid in zip(scores[0], ids[0]):
+            meta = chunks.get(str(int(cid)))
+            if cid < 0 or meta is None:
+                continue
+            hits.append({**meta, "score": round(float(score), 4)})
+        return hits
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> KnowledgeIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = KnowledgeIndex()
+    return _index
@@ -0,0 +1,64 @@
+# backend/app/services/sentences.py
+import re
+
+# ., !, ? (and the Devanagari danda some models emit) followed by whitespace.
+# Requiring the whitespace keeps "2.5 kg" or "Dr." + digit inside one sentence.
+_BOUNDARY = re.compile(r"(?<=[.!?।])\s+|\n+")
+
+MIN_SENTENCE_CHARS = 12
+
+
+def split_sentences(text: str, min_chars: int = MIN_SENTENCE_CHARS):
+    """
+    Split text into sentences. Fragments shorter than min_chars (list markers
+    like "1.", stray "Yes.") are merged into the following sentence.
+    """
+    out = []
+    pending = ""
+    for part in _BOUNDARY.split(text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        pending = f"{pending} {part}".strip() if pending else part
+        if len(pending) >= min_chars:
+            out.append(pending)
+            pending = ""
+    if pending:
+        if out and len(pending) < min_chars:
+            out[-1] = f"{out[-1]} {pending}"
+        else:
+            out.append(pending)
+    return out
+
+
+class SentenceBuffer:
+    """
+    Groups streamed LLM tokens into sentences.
+
+    feed() returns the sentences completed by the new token; a boundary only
+    counts once the whitespace after it has arrived, so a decimal point split
+    across tokens is not mistaken for the end of a sentence. flush() returns
+    whatever is left when the stream ends.
+    """
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buf = ""
+
+    def feed(self, token: str):
+        self._buf += token
+        done = []
+        start = 0
+        for m in _BOUNDARY.finditer(self._buf):
+            candidate = " ".join(self._buf[start:m.start()].split())
+            # short fragments stay in the buffer and join the next sentence
+            if len(candidate) >= self.min_chars:
+                done.append(candidate)
+                start = m.end()
+        self._buf = self._buf[start:]
+        return done
+
+    def flush(self):
+        rest = " ".join(self._buf.split())
+        self._buf = ""
+        return [rest] if rest else []
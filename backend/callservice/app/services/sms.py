@@ -0,0 +1,245 @@
+# backend/app/services/sms.py
+"""
+SMS encoding, segmentation and the Twilio Messages API client.
+
+Segments: a message that fits the GSM 03.38 alphabet is sent as GSM-7 (160
+characters in one SMS, 153 per part of a concatenated one; ^{}[]~|\\€ count
+twice). Anything else, Malayalam included, goes out as UCS-2: 70 UTF-16
+code units in one SMS, 67 per part. split_message() cuts long answers into
+SMS_MAX_SEGMENTS-segment messages at word boundaries, never inside a
+Malayalam conjunct, and numbers them "(1/3) ".
+
+Client: one keep-alive requests.Session per process posts to
+<TWILIO_API_BASE>/2010-04-01/Accounts/<sid>/Messages.json. The session is
+what twilio.rest.Client builds internally; sharing it saves the TLS
+handshake per message. TWILIO_API_BASE points it at a local fake
+(bench.fakes) for tests and benchmarks.
+"""
+import os
+import threading
+import unicodedata
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TW_SID = os.environ.get("TW_SID")
+TW_TOKEN = os.environ.get("TW_TOKEN")
+# one number, or a comma-separated pool: each recipient sticks to one of them
+TW_FROM = os.environ.get("TW_FROM")
+TWILIO_API_BASE = os.environ.get("TWILIO_API_BASE", "https://api.twilio.com").rstrip("/")
+TWILIO_STATUS_CALLBACK = os.environ.get("TWILIO_STATUS_CALLBACK")   # e.g. https://host/webhook/sms-status
+TWILIO_POOL_SIZE = int(os.environ.get("TWILIO_POOL_SIZE", "8"))
+TWILIO_CONNECT_TIMEOUT = float(os.environ.get("TWILIO_CONNECT_TIMEOUT", "3"))
+TWILIO_TIMEOUT = float(os.environ.get("TWILIO_TIMEOUT", "15"))
+# segments per outgoing message; 1 sends every part as a single SMS
+SMS_MAX_SEGMENTS = int(os.environ.get("SMS_MAX_SEGMENTS", "1"))
+
+GSM7_BASIC = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = "^{}\\[~]|€\f"
+_GSM7 = frozenset(GSM7_BASIC) | frozenset(GSM7_EXTENDED)
+
+# (single SMS, per part of a concatenated SMS), in the encoding's units
+SEGMENT_LIMITS = {"gsm7": (160, 153), "ucs2": (70, 67)}
+
+_ZW = ("\u200c", "\u200d")   # ZWNJ/ZWJ: chillu and conjunct forms in Malayalam
+
+
+class SmsError(RuntimeError):
+    def __init__(self, message: str, retryable: bool = False, status: int = None,
+                 code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+        self.code = code
+        self.retry_after = retry_after
+
+
+def encoding_of(text: str) -> str:
+    return "gsm7" if all(ch in _GSM7 for ch in text) else "ucs2"
+
+
+def encoded_length(text: str, encoding: str = None) -> int:
+    """
+    Length in septets (GSM-7) or UTF-16 code units (UCS-2).
+    """
+    encoding = encoding or encoding_of(text)
+    if encoding == "gsm7":
+        return sum(2 if ch in GSM7_EXTENDED else 1 for ch in text)
+    return sum(2 if ord(ch) > 0xFFFF else 1 for ch in text)
+
+
+def segment_count(text: str, encoding: str = None) -> int:
+    """
+    Number of SMS a carrier bills for text sent as one message.
+    """
+    encoding = encoding or encoding_of(text)
+    single, multi = SEGMENT_LIMITS[encoding]
+    n = encoded_length(text, encoding)
+    return 1 if n <= single else -(-n // multi)
+
+
+def _unit(ch: str, encoding: str) -> int:
+    if encoding == "gsm7":
+        return 2 if ch in GSM7_EXTENDED else 1
+    return 2 if ord(ch) > 0xFFFF else 1
+
+
+def _breakable(text: str, i: int) -> bool:
+    # a cut before text[i] must not separate a consonant from its signs
+    # (vowel signs, virama, anusvara are combining marks) or a virama/ZWJ
+    # from the consonant it joins
+    if i <= 0 or i >= len(text):
+        return True
+    prev, ch = text[i - 1], text[i]
+    if unicodedata.category(ch).startswith("M") or ch in _ZW or prev in _ZW:
+        return False
+    return "VIRAMA" not in unicodedata.name(prev, "")
+
+
+def _hard_split(word: str, limit: int, encoding: str):
+    # a single word longer than a part: cut at the last safe point that fits
+    parts, start = [], 0
+    while start < len(word):
+        used, end, cut = 0, start, None
+        while end < len(word) and used + _unit(word[end], encoding) <= limit:
+            used += _unit(word[end], encoding)
+            end += 1
+            if _breakable(word, end):
+                cut = end
+        if end == len(word):
+            cut = end
+        parts.append(word[start:cut or end])
+        start = cut or end
+    return parts
+
+
+def _pack(words, limit: int, encoding: str):
+    parts, current, used = [], "", 0
+    for word in words:
+        size = encoded_length(word, encoding)
+        if size > limit:
+            if current:
+                parts.append(current)
+            chunks = _hard_split(word, limit, encoding)
+            parts.extend(chunks[:-1])
+            current, used = chunks[-1], encoded_length(chunks[-1], encoding)
+            continue
+        if current and used + 1 + size <= limit:
+            current, used = f"{current} {word}", used + 1 + size
+        else:
+            if current:
+                parts.append(current)
+            current, used = word, size
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_message(text: str, max_segments: int = SMS_MAX_SEGMENTS):
+    """
+    Split text into messages of at most max_segments SMS each, at word
+    boundaries, prefixed "(i/n) " when there is more than one.
+    """
+    text = " ".join((text or "").split())
+    encoding = encoding_of(text)
+    single, multi = SEGMENT_LIMITS[encoding]
+    limit = single if max_segments <= 1 else multi * max_segments
+    if encoded_length(text, encoding) <= limit:
+        return [text] if text else []
+    words = text.split(" ")
+    n = 1
+    while True:
+        # the prefix grows with the part count; repack until it is stable
+        prefix = len(f"({n}/{n}) ")
+        parts = _pack(words, limit - prefix, encoding)
+        if len(str(len(parts))) <= len(str(n)):
+            break
+        n = len(parts)
+    return [f"({i}/{len(parts)}) {p}" for i, p in enumerate(parts, 1)]
+
+
+def from_numbers():
+    return [n.strip() for n in (TW_FROM or "").split(",") if n.strip()]
+
+
+def sender_for(to: str, numbers=None) -> str:
+    """
+    Sending number for a recipient: always the same one from the pool, so
+    the parts of a message arrive from one sender.
+    """
+    numbers = numbers or from_numbers()
+    if not numbers:
+        return None
+    digits = "".join(ch for ch in to or "" if ch.isdigit())
+    return numbers[int(digits or "0") % len(numbers)]
+
+
+class TwilioClient:
+    def __init__(self, sid: str = TW_SID, token: str = TW_TOKEN, base_url: str = TWILIO_API_BASE,
+                 status_callback: str = TWILIO_STATUS_CALLBACK, pool_size: int = TWILIO_POOL_SIZE,
+                 timeout: float = TWILIO_TIMEOUT, connect_timeout: float = TWILIO_CONNECT_TIMEOUT):
+        self.sid = sid
+        self.base_url = base_url.rstrip("/")
+        self.status_callback = status_callback
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._session = requests.Session()
+        self._session.auth = (sid, token)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    @property
+    def messages_url(self) -> str:
+        return f"{self.base_url}/2010-04-01/Accounts/{self.sid}/Messages.json"
+
+    def send(self, to: str, body: str, from_: str) -> dict:
+        """
+        Create one message; returns Twilio's message resource (sid, status).
+        Raises SmsError, with retryable=True for timeouts, connection errors,
+        429 and 5xx.
+        """
+        data = {"To": to, "From": from_, "Body": body}
+        if self.status_callback:
+            data["StatusCallback"] = self.status_callback
+        try:
+            r = self._session.post(self.messages_url, data=data, timeout=(self.connect_timeout, self.timeout))
+        except requests.RequestException as e:
+            raise SmsError(f"Twilio request failed: {e}", retryable=True) from e
+        if r.status_code >= 400:
+            try:
+                err = r.json()
+            except ValueError:
+                err = {}
+            retry_after = r.headers.get("Retry-After")
+            raise SmsError(
+                f"Twilio {r.status_code}: {err.get('message') or r.text[:200]}",
+                retryable=r.status_code == 429 or r.status_code >= 500,
+                status=r.status_code,
+                code=err.get("code"),
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        try:
+            return r.json()
+        except ValueError:
+            return {}
+
+
+def configured() -> bool:
+    return bool(TW_SID and TW_TOKEN and from_numbers())
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> TwilioClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TwilioClient()
+    return _client
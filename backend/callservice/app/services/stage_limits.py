@@ -0,0 +1,57 @@
+# backend/app/services/stage_limits.py
+"""
+Per-stage concurrency limits for the call pipeline.
+
+STAGE_CONCURRENCY is a comma-separated list of stage=limit pairs, e.g.
+"transcribe=1,llm=2,translate=4,tts=4". A call waits for a free slot before
+entering a limited stage; stages that are not listed are unlimited. Time spent
+waiting is published as callservice_stage_wait_seconds.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from . import tracing
+
+STAGE_CONCURRENCY = os.environ.get("STAGE_CONCURRENCY", "transcribe=1,llm=2,translate=4,tts=4")
+
+STAGE_WAIT_SECONDS = tracing.register(
+    tracing.Histogram("callservice_stage_wait_seconds", "Time spent waiting for a stage concurrency slot."), "stage"
+)
+
+
+def parse_limits(spec: str) -> dict:
+    limits = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        stage, _, value = part.partition("=")
+        try:
+            limits[stage.strip()] = max(1, int(value))
+        except ValueError:
+            print(f"[stage-limits] ignoring bad entry {part!r}")
+    return limits
+
+
+_limits = parse_limits(STAGE_CONCURRENCY)
+_slots = {stage: threading.BoundedSemaphore(n) for stage, n in _limits.items()}
+
+
+def limits() -> dict:
+    return dict(_limits)
+
+
+@contextmanager
+def stage_slot(stage: str):
+    sem = _slots.get(stage)
+    if sem is None:
+        yield
+        return
+    started = time.perf_counter()
+    sem.acquire()
+    STAGE_WAIT_SECONDS.observe(stage, time.perf_counter() - started)
+    try:
+        yield
+    finally:
+        sem.release()
@@ -0,0 +1,230 @@
+# backend/app/services/tracing.py
+"""
+Per-stage latency tracing for the call pipeline.
+
+`span(stage)` (context manager) and `traced(stage)` (decorator) record wall
+time, CPU time of the calling thread and exceptions for one pipeline stage.
+Observations go into Prometheus-style histograms rendered by
+render_metrics() for the /metrics route. With TRACE_LOG=1 each span is also
+logged with the current correlation id (the Twilio CallSid), so all stages of
+one call can be found together in the logs; it is off by default because
+spans sit on hot paths (every VAD pass, ASR window and TTS sentence).
+
+Metrics are per process; scrape the API and each worker separately.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_LOG = os.environ.get("TRACE_LOG", "0") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_correlation_id = contextvars.ContextVar("correlation_id", default="-")
+
+
+def get_correlation_id() -> str:
+    return _correlation_id.get()
+
+
+@contextmanager
+def correlation(cid: str):
+    """
+    Tag every span inside the block with cid (e.g. the CallSid).
+    """
+    token = _correlation_id.set(cid or "-")
+    try:
+        yield
+    finally:
+        _correlation_id.reset(token)
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """
+    executor.submit that carries the correlation id into the worker thread.
+    """
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}   # label value -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, label: str, value: float):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self, label_name: str):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for label in sorted(snapshot):
+            series = snapshot[label]
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="{bound}"}} {count}')
+            count = series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_name}="{label}"}} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{label_name}="{label}"}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, label: str, amount: float = 1):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def render(self, label_name: str):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for label in sorted(snapshot):
+            lines.append(f'{self.name}{{{label_name}="{label}"}} {snapshot[label]}')
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, label: str, value: float):
+        with self._lock:
+            self._values[label] = value
+
+    def render(self, label_name: str):
+        lines = super().render(label_name)
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+_registry = []   # (metric, label name) in render order
+
+
+def register(metric, label_name: str):
+    _registry.append((metric, label_name))
+    return metric
+
+
+STAGE_SECONDS = register(Histogram("callservice_stage_seconds", "Wall time per pipeline stage."), "stage")
+STAGE_CPU_SECONDS = register(
+    Histogram("callservice_stage_cpu_seconds", "CPU time of the calling thread per pipeline stage."), "stage"
+)
+STAGE_ERRORS = register(Counter("callservice_stage_errors_total", "Exceptions raised per pipeline stage."), "stage")
+
+
+def record(stage: str, wall: float, cpu: float = None, error: BaseException = None):
+    STAGE_SECONDS.observe(stage, wall)
+    if cpu is not None:
+        STAGE_CPU_SECONDS.observe(stage, cpu)
+    if error is not None:
+        STAGE_ERRORS.inc(stage)
+    if TRACE_LOG:
+        cpu_part = f" cpu={cpu * 1000:.1f}ms" if cpu is not None else ""
+        status = f" error={type(error).__name__}" if error is not None else ""
+        print(f"[TRACE] {get_correlation_id()} {stage} {wall * 1000:.1f}ms{cpu_part}{status}")
+
+
+@contextmanager
+def span(stage: str):
+    wall0, cpu0 = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    except BaseException as e:
+        record(stage, time.perf_counter() - wall0, time.thread_time() - cpu0, e)
+        raise
+    record(stage, time.perf_counter() - wall0, time.thread_time() - cpu0)
+
+
+def traced(stage: str):
+    """
+    Decorator form of span(). Generators are timed from the first call to
+    exhaustion, counting CPU only while the generator itself runs; coroutines
+    and async generators record wall time only, since their thread also runs
+    other tasks while they wait.
+    """
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen_wrapper(*args, **kwargs):
+                wall0, error = time.perf_counter(), None
+                try:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                except BaseException as e:
+                    if not isinstance(e, (GeneratorExit, asyncio.CancelledError)):
+                        error = e
+                    raise
+                finally:
+                    record(stage, time.perf_counter() - wall0, None, error)
+            return agen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def coro_wrapper(*args, **kwargs):
+                wall0 = time.perf_counter()
+                try:
+                    out = await fn(*args, **kwargs)
+                except BaseException as e:
+                    record(stage, time.perf_counter() - wall0, None, e)
+                    raise
+                record(stage, time.perf_counter() - wall0)
+                return out
+            return coro_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                wall0, cpu, error = time.perf_counter(), 0.0, None
+                gen = fn(*args, **kwargs)
+                try:
+                    while True:
+                        cpu0 = time.thread_time()
+                        try:
+                            item = next(gen)
+                        except StopIteration:
+                            return
+                        finally:
+                            cpu += time.thread_time() - cpu0
+                        yield item
+                except BaseException as e:
+                    if not isinstance(e, GeneratorExit):
+                        error = e
+                    raise
+                finally:
+                    gen.close()
+                    record(stage, time.perf_counter() - wall0, cpu, error)
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric, label_name in _registry:
+        lines += metric.render(label_name)
+    return "\n".join(lines) + "\n"
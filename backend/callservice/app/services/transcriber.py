@@ -1,75 +1,124 @@
 # backend/app/services/transcriber.py
 import os
-import requests
 import tempfile
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# prefer faster-whisper; fallback to openai-whisper if not available
-try:
-    from faster_whisper import WhisperModel
-    HAS_FAST = True
-except Exception:
-    HAS_FAST = False
+import numpy as np
 
-try:
-    import whisper
-    HAS_WHISPER = True
-except Exception:
-    HAS_WHISPER = False
+from . import lazy, tracing, vad, whisper_registry
+from .audio import SAMPLE_RATE, decode_audio
+from .media import get_fetcher
+from .tracing import submit_with_context, traced
+
+# silence trimming and windowing before Whisper
+ASR_VAD = os.environ.get("ASR_VAD", "1") == "1"
+ASR_WINDOW_SECONDS = float(os.environ.get("ASR_WINDOW_SECONDS", "30"))
+ASR_WINDOW_OVERLAP_SECONDS = float(os.environ.get("ASR_WINDOW_OVERLAP_SECONDS", "1.0"))
+# windows of one recording transcribed at once; each needs a model worker
+ASR_PARALLEL = int(os.environ.get("ASR_PARALLEL", str(whisper_registry.WHISPER_NUM_WORKERS)))
+WHISPER_BEAM_SIZE = int(os.environ.get("WHISPER_BEAM_SIZE", "5"))
+# upper bound for beam sizes requested per call (webhook beam_size)
+WHISPER_MAX_BEAM_SIZE = int(os.environ.get("WHISPER_MAX_BEAM_SIZE", "10"))
+
+_MERGE_MAX_WORDS = 12   # longest repeated phrase looked for where windows overlap
+
+ASR_AUDIO_SECONDS = tracing.register(
+    tracing.Counter("callservice_asr_audio_seconds_total", "Seconds of call audio received vs sent to Whisper."),
+    "kind",
+)
+
+_window_pool = None
+_window_pool_lock = threading.Lock()
+_openai_lock = threading.Lock()
+
+# prefer faster-whisper; fallback to openai-whisper if not available. Only
+# checked for here: whisper_registry imports the backend when it loads a model
+HAS_FAST = lazy.available("faster_whisper")
+HAS_WHISPER = lazy.available("whisper")
 
 def download_audio(url: str) -> str:
     """
     Download recording URL to a temp file and return filepath.
+    Kept for callers that need a path; fetch_audio() avoids the file.
     """
-    r = requests.get(url, stream=True, timeout=30)
-    r.raise_for_status()
-    # choose suffix based on content-type or url
-    content_type = r.headers.get("content-type", "")
-    if "wav" in content_type or url.lower().endswith(".wav"):
-        suffix = ".wav"
-    elif "mpeg" in content_type or url.lower().endswith(".mp3"):
-        suffix = ".mp3"
-    else:
-        suffix = ".wav"
-    fd, path = tempfile.mkstemp(suffix=suffix, prefix="rec_")
-    os.close(fd)
-    with open(path, "wb") as f:
-        for chunk in r.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-    return path
+    with get_fetcher().fetch(url) as media:
+        fd, path = tempfile.mkstemp(suffix=media.suffix, prefix="rec_")
+        os.close(fd)
+        return media.save(path)
+
+def fetch_audio(url: str) -> np.ndarray:
+    """
+    Download recording URL and decode it in memory to 16 kHz mono float32.
+    """
+    with get_fetcher().fetch(url) as media:
+        return decode_audio(media.file)
 
 def _init_faster_whisper_model(model_size: str, device: str = "cpu"):
     """
-    Try initializing faster-whisper with multiple compute types.
-    Returns model instance or raises last exception.
+    Return the shared faster-whisper model for model_size/device.
+    The registry tries the compute types once and remembers which one worked.
     """
-    compute_attempts = ["int8_float16", "int8", "float16", "float32"]
-    last_exc = None
-    for ct in compute_attempts:
-        try:
-            # If compute_type unsupported this will raise
-            model = WhisperModel(model_size, device=device, compute_type=ct)
-            print(f"[faster-whisper] loaded model {model_size} with compute_type={ct}")
-            return model
-        except Exception as e:
-            last_exc = e
-            print(f"[faster-whisper] compute_type {ct} failed: {e}")
-    # if we got here, no compute type worked
-    raise last_exc
+    return whisper_registry.get_model(whisper_registry.FASTER_WHISPER, model_size, device=device)
 
-def transcribe_file_to_english(file_path: str, model_size: str = "tiny") -> str:
+def prepare_windows(audio: np.ndarray):
     """
-    Transcribe audio and *translate* to English. Returns English text.
+    VAD-trim the recording and cut the remaining speech into overlapping
+    windows. Returns [] when there is no speech at all.
+    """
+    speech = vad.trim(audio) if ASR_VAD else audio
+    windows = vad.split_windows(speech, ASR_WINDOW_SECONDS, ASR_WINDOW_OVERLAP_SECONDS)
+    ASR_AUDIO_SECONDS.inc("received", audio.size / SAMPLE_RATE)
+    ASR_AUDIO_SECONDS.inc("transcribed", sum(w.size for w in windows) / SAMPLE_RATE)
+    return windows
+
+def _norm_words(words):
+    return [w.lower().strip(".,!?;:'\"") for w in words]
+
+def merge_texts(texts) -> str:
+    """
+    Join window transcripts in order, dropping words repeated because the
+    windows overlap (the longest suffix of the text so far that the next
+    window starts with).
+    """
+    words = []
+    for text in texts:
+        nxt = text.split()
+        tail, head = _norm_words(words[-_MERGE_MAX_WORDS:]), _norm_words(nxt[:_MERGE_MAX_WORDS])
+        overlap = 0
+        for k in range(min(len(tail), len(head)), 0, -1):
+            if tail[-k:] == head[:k]:
+                overlap = k
+                break
+        words.extend(nxt[overlap:])
+    return " ".join(words)
+
+def clean_beam_size(value, default: int = WHISPER_BEAM_SIZE) -> int:
+    """
+    Beam size requested for one call (it comes straight from the webhook
+    form) as an int in 1..WHISPER_MAX_BEAM_SIZE; default when missing or
+    not a number.
+    """
+    if value is None or value == "":
+        return max(1, min(int(default), WHISPER_MAX_BEAM_SIZE))
+    try:
+        beam_size = int(value)
+    except (TypeError, ValueError):
+        print(f"[transcriber] ignoring beam_size {value!r}")
+        beam_size = default
+    return max(1, min(int(beam_size), WHISPER_MAX_BEAM_SIZE))
+
+def _transcribe_window(audio: np.ndarray, model_size: str, beam_size: int) -> str:
+    """
+    Transcribe one window and *translate* to English.
     Uses faster-whisper if available (recommended). If faster-whisper is not usable,
     gracefully falls back to openai-whisper (if installed) or raises an error.
-    model_size: "tiny","small","medium" etc.
     """
     # Try faster-whisper first
     if HAS_FAST:
         try:
             model = _init_faster_whisper_model(model_size, device="cpu")
-            segments, info = model.transcribe(file_path, beam_size=5, task="translate", language=None)
+            segments, info = model.transcribe(audio, beam_size=beam_size, task="translate", language=None)
             text = "".join([seg.text for seg in segments]).strip()
             return text
         except Exception as e:
@@ -80,8 +129,12 @@ def transcribe_file_to_english(file_path: str, model_size: str = "tiny") -> str:
     if HAS_WHISPER:
         try:
             print("[transcriber] falling back to openai-whisper")
-            model = whisper.load_model(model_size)
-            result = model.transcribe(file_path, task="translate")  # translate -> English
+            model = whisper_registry.get_model(whisper_registry.OPENAI_WHISPER, model_size)
+            # torch models are not safe to call from several threads at once
+            with _openai_lock:
+                result = model.transcribe(
+                    audio, task="translate", beam_size=beam_size if beam_size > 1 else None
+                )  # translate -> English
             return result.get("text", "").strip()
         except Exception as e:
             print("[transcriber] openai-whisper also failed:", e)
@@ -90,17 +143,45 @@ def transcribe_file_to_english(file_path: str, model_size: str = "tiny") -> str:
     # Neither library is available
     raise RuntimeError("No whisper model available. Install faster-whisper or openai-whisper.")
 
-def transcribe_url_to_english(url: str, model_size: str = "tiny") -> str:
+def _get_window_pool() -> ThreadPoolExecutor:
+    global _window_pool
+    if _window_pool is None:
+        with _window_pool_lock:
+            if _window_pool is None:
+                _window_pool = ThreadPoolExecutor(max_workers=ASR_PARALLEL, thread_name_prefix="asr-window")
+    return _window_pool
+
+@traced("transcribe")
+def transcribe_audio_to_english(audio, model_size: str = "tiny", beam_size: int = None) -> str:
+    """
+    Transcribe audio and *translate* to English. Returns English text.
+    audio is a 16 kHz mono float32 array (see audio.decode_audio).
+    Silence is trimmed first; long speech is split into overlapping windows
+    that are transcribed in parallel (ASR_PARALLEL) and merged in order.
+    model_size: "tiny","small","medium" etc.
+    beam_size: per-request accuracy/latency trade-off; 1 is greedy decoding
+    and the fastest. Defaults to WHISPER_BEAM_SIZE.
+    """
+    beam_size = clean_beam_size(beam_size)
+    windows = prepare_windows(np.asarray(audio, dtype=np.float32))
+    if not windows:
+        return ""
+    if len(windows) == 1 or ASR_PARALLEL <= 1:
+        texts = [_transcribe_window(w, model_size, beam_size) for w in windows]
+    else:
+        pool = _get_window_pool()
+        futures = [submit_with_context(pool, _transcribe_window, w, model_size, beam_size) for w in windows]
+        texts = [f.result() for f in futures]
+    return merge_texts(texts)
+
+def transcribe_file_to_english(file_path: str, model_size: str = "tiny", beam_size: int = None) -> str:
+    """
+    Decode file_path in memory and transcribe (translate) it to English.
+    """
+    return transcribe_audio_to_english(decode_audio(file_path), model_size=model_size, beam_size=beam_size)
+
+def transcribe_url_to_english(url: str, model_size: str = "tiny", beam_size: int = None) -> str:
     """
     Download URL and transcribe (translate) to English.
     """
-    fpath = None
-    try:
-        fpath = download_audio(url)
-        return transcribe_file_to_english(fpath, model_size=model_size)
-    finally:
-        if fpath and os.path.exists(fpath):
-            try:
-                os.remove(fpath)
-            except Exception:
-                pass
+    return transcribe_audio_to_english(fetch_audio(url), model_size=model_size, beam_size=beam_size)
@@ -0,0 +1,193 @@
+# backend/app/services/translation_cache.py
+"""
+Two-tier memo cache for sentence translations.
+
+Tier 1 is an in-process LRU, tier 2 a SQLite file shared by all processes on
+the host. Entries are keyed by (direction, model id, normalized sentence); when
+the model configured for a direction changes, that direction's entries are
+dropped from both tiers.
+"""
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+TRANSLATION_CACHE_SIZE = int(os.environ.get("TRANSLATION_CACHE_SIZE", "4096"))
+# empty string disables the on-disk tier
+TRANSLATION_CACHE_PATH = os.environ.get("TRANSLATION_CACHE_PATH", "./translation_cache.sqlite3")
+TRANSLATION_CACHE_MAX_ROWS = int(os.environ.get("TRANSLATION_CACHE_MAX_ROWS", "100000"))
+
+
+def normalize(sentence: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", sentence).split())
+
+
+class TranslationCache:
+    def __init__(
+        self,
+        path: str = TRANSLATION_CACHE_PATH,
+        max_memory_entries: int = TRANSLATION_CACHE_SIZE,
+        max_disk_entries: int = TRANSLATION_CACHE_MAX_ROWS,
+    ):
+        self.max_memory_entries = max(0, max_memory_entries)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts_since_check = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        if path:
+            parent = os.path.dirname(os.path.abspath(path))
+            os.makedirs(parent, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " direction TEXT NOT NULL, model TEXT NOT NULL, source TEXT NOT NULL,"
+                " target TEXT NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (direction, model, source))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_translations_last_used ON translations (last_used)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS models (direction TEXT PRIMARY KEY, model TEXT NOT NULL)")
+
+    def sync_model(self, direction: str, model: str):
+        """
+        Record the model serving `direction`; drop its cached entries if it changed.
+        """
+        with self._lock:
+            stale = [k for k in self._lru if k[0] == direction and k[1] != model]
+            for k in stale:
+                del self._lru[k]
+            if self._db is None:
+                if stale:
+                    self.counters["invalidations"] += 1
+                return
+            row = self._db.execute("SELECT model FROM models WHERE direction = ?", (direction,)).fetchone()
+            if row and row[0] == model:
+                return
+            self._db.execute("DELETE FROM translations WHERE direction = ? AND model != ?", (direction, model))
+            self._db.execute(
+                "INSERT INTO models (direction, model) VALUES (?, ?)"
+                " ON CONFLICT(direction) DO UPDATE SET model = excluded.model",
+                (direction, model),
+            )
+            if row or stale:
+                self.counters["invalidations"] += 1
+
+    def _remember(self, key, target):
+        # caller holds _lock
+        if self.max_memory_entries == 0:
+            return
+        self._lru[key] = target
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_memory_entries:
+            self._lru.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get_many(self, direction: str, model: str, sentences):
+        """
+        Return a list with the cached translation (or None) for each sentence.
+        """
+        out = [None] * len(sentences)
+        disk_lookups = {}
+        with self._lock:
+            for i, s in enumerate(sentences):
+                key = (direction, model, normalize(s))
+                hit = self._lru.get(key)
+                if hit is not None:
+                    self._lru.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    out[i] = hit
+                else:
+                    disk_lookups.setdefault(key[2], []).append(i)
+            if disk_lookups and self._db is not None:
+                sources = list(disk_lookups)
+                marks = ",".join("?" * len(sources))
+                rows = self._db.execute(
+                    f"SELECT source, target FROM translations WHERE direction = ? AND model = ? AND source IN ({marks})",
+                    (direction, model, *sources),
+                ).fetchall()
+                now = time.time()
+                for source, target in rows:
+                    for i in disk_lookups.pop(source):
+                        out[i] = target
+                        self.counters["disk_hits"] += 1
+                    self._remember((direction, model, source), target)
+                if rows:
+                    self._db.executemany(
+                        "UPDATE translations SET last_used = ? WHERE direction = ? AND model = ? AND source = ?",
+                        [(now, direction, model, source) for source, _ in rows],
+                    )
+            self.counters["misses"] += sum(len(v) for v in disk_lookups.values())
+        return out
+
+    def put_many(self, direction: str, model: str, pairs):
+        """
+        Store (sentence, translation) pairs in both tiers.
+        """
+        now = time.time()
+        rows = []
+        with self._lock:
+            for source, target in pairs:
+                key = (direction, model, normalize(source))
+                self._remember(key, target)
+                rows.append((direction, model, key[2], target, now))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT INTO translations (direction, model, source, target, last_used) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT(direction, model, source) DO UPDATE SET target = excluded.target,"
+                    " last_used = excluded.last_used",
+                    rows,
+                )
+                self._puts_since_check += 1
+                if self._puts_since_check >= 64:
+                    self._puts_since_check = 0
+                    self._evict_disk()
+
+    def _evict_disk(self):
+        # caller holds _lock; checked every 64 writes and trims 10% below the
+        # bound, so the COUNT(*) stays off the per-call path
+        count = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        if count <= self.max_disk_entries:
+            return
+        excess = count - int(self.max_disk_entries * 0.9)
+        self._db.execute(
+            "DELETE FROM translations WHERE rowid IN"
+            " (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self.counters["evictions"] += excess
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM translations")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            total = hits + self.counters["misses"]
+            disk_rows = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0] if self._db else 0
+            return {
+                **self.counters,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "memory_entries": len(self._lru),
+                "disk_entries": disk_rows,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TranslationCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TranslationCache()
+    return _cache
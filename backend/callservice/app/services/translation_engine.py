@@ -0,0 +1,83 @@
+# backend/app/services/translation_engine.py
+import os
+
+from .batching import MicroBatcher
+from .sentences import split_sentences
+
+TRANSLATION_MAX_BATCH = int(os.environ.get("TRANSLATION_MAX_BATCH", "16"))
+TRANSLATION_MAX_WAIT_MS = float(os.environ.get("TRANSLATION_MAX_WAIT_MS", "10"))
+TRANSLATION_MAX_NEW_TOKENS = int(os.environ.get("TRANSLATION_MAX_NEW_TOKENS", "200"))
+# torch intra-op threads for generate(); 0 leaves torch's default
+TRANSLATION_THREADS = int(os.environ.get("TRANSLATION_THREADS", "0"))
+
+_threads_configured = False
+
+
+def configure_threads(num_threads: int = TRANSLATION_THREADS):
+    global _threads_configured
+    if _threads_configured or num_threads <= 0:
+        return
+    import torch
+    torch.set_num_threads(num_threads)
+    _threads_configured = True
+
+
+class TranslationEngine:
+    """
+    Sentence-level MarianMT translation with dynamic batching.
+
+    Answers are split into sentences and every sentence from every concurrent
+    caller goes through one MicroBatcher, so a single generate() call serves
+    a whole batch. Each sentence gets its own max_new_tokens budget instead of
+    one long answer being cut off at 200 tokens.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        model,
+        max_batch_size: int = TRANSLATION_MAX_BATCH,
+        max_wait_ms: float = TRANSLATION_MAX_WAIT_MS,
+        max_new_tokens: int = TRANSLATION_MAX_NEW_TOKENS,
+        name: str = "translation",
+    ):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_new_tokens = max_new_tokens
+        if hasattr(model, "eval"):
+            model.eval()
+        self._batcher = MicroBatcher(
+            self.translate_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name=name
+        )
+
+    def translate_batch(self, sentences):
+        """
+        One tokenizer + generate() call for a list of sentences (no queueing).
+        """
+        import torch
+
+        with torch.inference_mode():
+            batch = self.tokenizer(sentences, return_tensors="pt", padding=True, truncation=True)
+            gen = self.model.generate(**batch, max_new_tokens=self.max_new_tokens)
+        return [t.strip() for t in self.tokenizer.batch_decode(gen, skip_special_tokens=True)]
+
+    def translate_sentences(self, sentences):
+        futures = self._batcher.submit_many(sentences)
+        return [f.result() for f in futures]
+
+    def translate(self, text: str) -> str:
+        sentences = split_sentences(text)
+        if not sentences:
+            return ""
+        return " ".join(self.translate_sentences(sentences))
+
+    def stats(self) -> dict:
+        b = self._batcher
+        return {
+            "batches": b.batches,
+            "sentences": b.items,
+            "avg_batch_size": round(b.items / b.batches, 2) if b.batches else 0.0,
+        }
+
+    def close(self):
+        self._batcher.close()
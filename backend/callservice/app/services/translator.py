@@ -1,10 +1,30 @@
 # backend/app/services/translator.py
+import os
 import threading
-from transformers import MarianMTModel, MarianTokenizer
+
+from .lazy import lazy_import
+from .sentences import split_sentences
+from .translation_cache import get_cache
+from .translation_engine import TranslationEngine, configure_threads
+from .tracing import traced
+
+TRANSLATION_CACHE = os.environ.get("TRANSLATION_CACHE", "1") == "1"
+# pinned hub revision; part of the cache key so a model upgrade invalidates entries
+TRANSLATION_MODEL_REVISION = os.environ.get("TRANSLATION_MODEL_REVISION", "main")
+
+# transformers (and torch under it) is imported by the first model load
+transformers = lazy_import("transformers")
 
 # We'll lazy-load models to avoid startup delays
 _lock = threading.Lock()
 _models = {}
+_engines = {}
+_synced = set()
+
+MODEL_MAPPING = {
+    "en-ml": "Helsinki-NLP/opus-mt-en-ml",
+    "ml-en": "Helsinki-NLP/opus-mt-ml-en",
+}
 
 def _load_model_pair(src_tgt: str):
     """
@@ -12,32 +32,64 @@ def _load_model_pair(src_tgt: str):
     en->ml: Helsinki-NLP/opus-mt-en-ml
     ml->en: Helsinki-NLP/opus-mt-ml-en
     """
-    mapping = {
-        "en-ml": "Helsinki-NLP/opus-mt-en-ml",
-        "ml-en": "Helsinki-NLP/opus-mt-ml-en",
-    }
-    model_name = mapping[src_tgt]
+    model_name = MODEL_MAPPING[src_tgt]
     with _lock:
         if src_tgt not in _models:
-            tokenizer = MarianTokenizer.from_pretrained(model_name)
-            model = MarianMTModel.from_pretrained(model_name)
+            configure_threads()
+            tokenizer = transformers.MarianTokenizer.from_pretrained(model_name, revision=TRANSLATION_MODEL_REVISION)
+            model = transformers.MarianMTModel.from_pretrained(model_name, revision=TRANSLATION_MODEL_REVISION)
             _models[src_tgt] = (tokenizer, model)
     return _models[src_tgt]
 
+def get_engine(src_tgt: str) -> TranslationEngine:
+    """
+    Batching engine for a direction; concurrent callers share its batches.
+    """
+    engine = _engines.get(src_tgt)
+    if engine is None:
+        tok, model = _load_model_pair(src_tgt)
+        with _lock:
+            if src_tgt not in _engines:
+                _engines[src_tgt] = TranslationEngine(tok, model, name=f"translate-{src_tgt}")
+            engine = _engines[src_tgt]
+    return engine
+
+def model_id(src_tgt: str) -> str:
+    return f"{MODEL_MAPPING[src_tgt]}@{TRANSLATION_MODEL_REVISION}"
+
+def _translate(src_tgt: str, text: str) -> str:
+    """
+    Translate sentence by sentence; sentences seen before are served from the
+    translation cache and only the misses go to the model.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return ""
+    if not TRANSLATION_CACHE:
+        return " ".join(get_engine(src_tgt).translate_sentences(sentences))
+
+    cache = get_cache()
+    mid = model_id(src_tgt)
+    if src_tgt not in _synced:
+        cache.sync_model(src_tgt, mid)
+        _synced.add(src_tgt)
+    out = cache.get_many(src_tgt, mid, sentences)
+    missing = [i for i, t in enumerate(out) if t is None]
+    if missing:
+        translated = get_engine(src_tgt).translate_sentences([sentences[i] for i in missing])
+        for i, t in zip(missing, translated):
+            out[i] = t
+        cache.put_many(src_tgt, mid, [(sentences[i], out[i]) for i in missing])
+    return " ".join(out)
+
+@traced("translate")
 def en_to_ml(text: str) -> str:
     if not text:
         return ""
-    tok, model = _load_model_pair("en-ml")
-    batch = tok.prepare_seq2seq_batch([text], return_tensors="pt")
-    gen = model.generate(**batch, max_new_tokens=200)
-    out = tok.batch_decode(gen, skip_special_tokens=True)
-    return out[0].strip()
+    return _translate("en-ml", text)
 
+@traced("translate")
 def ml_to_en(text: str) -> str:
     if not text:
         return ""
-    tok, model = _load_model_pair("ml-en")
-    batch = tok.prepare_seq2seq_batch([text], return_tensors="pt")
-    gen = model.generate(**batch, max_new_tokens=200)
-    out = tok.batch_decode(gen, skip_special_tokens=True)
-    return out[0].strip()
+    return _translate("ml-en", text)
@@ -1,29 +1,161 @@
+# backend/app/services/tts.py
+"""
+Text-to-speech into the content-addressed audio store.
+
+synthesize_cached() tries the engines named in TTS_ENGINES (see
+tts_engines) in order until one succeeds. Multi-sentence text is split with
+sentences.split_sentences and up to TTS_PARALLEL sentences are synthesized
+at once, each on an instance borrowed from the engine's warm pool. The
+pieces are then stitched into one clip:
+
+- MP3 engines: the frames are concatenated, as gTTS does with its own
+  chunks, except that here the chunks are fetched concurrently
+- PCM: the pieces are joined with TTS_SENTENCE_GAP_MS of silence
+
+TTS_FORMAT picks what is stored and played:
+
+    native  the engine's own output: MP3 for gtts / google-cloud, 16-bit WAV
+            for the local engines
+    wav     16-bit PCM WAV at the engine's sample rate
+    ulaw    8 kHz G.711 mu-law WAV, the telephone codec, which Twilio plays
+            without transcoding
+"""
 import os
-from gtts import gTTS
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
+from .audio import resample, write_wav
+from .audio_store import get_store
+from .sentences import split_sentences
+from .tts_engines import ENGINES, get_pool
+
+_DEFAULT_ENGINES = "google-cloud,gtts" if os.environ.get("USE_GOOGLE_TTS", "0") == "1" else "gtts"
+TTS_ENGINES = [e.strip() for e in os.environ.get("TTS_ENGINES", _DEFAULT_ENGINES).split(",") if e.strip()]
+TTS_FORMAT = os.environ.get("TTS_FORMAT", "native")   # native | wav | ulaw
+TTS_PARALLEL = int(os.environ.get("TTS_PARALLEL", "8"))
+TTS_SENTENCE_GAP_MS = float(os.environ.get("TTS_SENTENCE_GAP_MS", "120"))
+TELEPHONY_SAMPLE_RATE = 8000
+
+if TTS_FORMAT not in ("native", "wav", "ulaw"):
+    print(f"[TTS] unknown TTS_FORMAT {TTS_FORMAT!r}; using native")
+    TTS_FORMAT = "native"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, TTS_PARALLEL), thread_name_prefix="tts")
+    return _executor
+
+
+def output_format(engine: str, fmt: str = None) -> str:
+    fmt = fmt or TTS_FORMAT
+    return ENGINES[engine].native_format if fmt == "native" else fmt
+
+
+def _each_sentence(engine: str, sentences, work):
+    """
+    work(instance, sentence) for every sentence, in parallel on instances from
+    the engine's pool. Results come back in sentence order.
+    """
+    pool = get_pool(engine)
+
+    def run(sentence):
+        with pool.acquire() as instance:
+            return work(instance, sentence)
+
+    if len(sentences) == 1 or TTS_PARALLEL <= 1:
+        return [run(s) for s in sentences]
+    return list(_get_executor().map(run, sentences))
+
+
+def render(engine: str, text: str, outpath: str, lang: str = "ml", fmt: str = None) -> str:
+    """
+    Synthesize text with `engine` into outpath as fmt (mp3 | wav | ulaw).
+    """
+    fmt = output_format(engine, fmt)
+    sentences = split_sentences(text) or [text]
+    if fmt == "mp3":
+        chunks = _each_sentence(engine, sentences, lambda e, s: e.mp3(s, lang))
+        with open(outpath, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return outpath
+
+    pieces = _each_sentence(engine, sentences, lambda e, s: e.synthesize(s, lang))
+    rate = TELEPHONY_SAMPLE_RATE if fmt == "ulaw" else pieces[0][1]
+    gap = np.zeros(int(rate * TTS_SENTENCE_GAP_MS / 1000.0), dtype=np.float32)
+    stitched = []
+    for i, (pcm, src_rate) in enumerate(pieces):
+        if i:
+            stitched.append(gap)
+        stitched.append(resample(pcm, src_rate, rate))
+    write_wav(outpath, np.concatenate(stitched), rate, encoding="ulaw" if fmt == "ulaw" else "pcm16")
+    return outpath
+
+
+def synthesize_cached(text, lang='ml'):
+    """
+    Return (path, fname) of a clip for text from the content-addressed audio
+    store, synthesizing it only if this exact (text, lang, voice, engine,
+    format) has not been produced before. Engines are tried in TTS_ENGINES
+    order; the last error is raised when all of them fail.
+    """
+    store = get_store()
+    error = None
+    for engine in TTS_ENGINES:
+        if engine not in ENGINES:
+            print(f"[TTS] skipping unknown engine {engine!r}")
+            continue
+        fmt = output_format(engine)
+        try:
+            return store.get_or_create(
+                text, lang, ENGINES[engine].voice, engine,
+                lambda p, engine=engine, fmt=fmt: render(engine, text, p, lang=lang, fmt=fmt),
+                fmt=fmt,
+            )
+        except Exception as e:
+            print(f"[TTS] {engine} failed: {e}")
+            error = e
+    raise error or RuntimeError("no TTS engine configured (TTS_ENGINES)")
+
 def synthesize_text_to_file(text, outpath, lang='ml'):
     """
-    Simple TTS using gTTS (uses Google TTS - requires internet) as a fallback.
-    If you set USE_GOOGLE_TTS=1 and provide Google credentials, you can implement
-    google-cloud-texttospeech synthesize instead.
+    Synthesize text with the configured engines (TTS_ENGINES; gTTS needs
+    internet, the local engines do not). Audio comes from the shared audio
+    store; outpath gets a copy in TTS_FORMAT.
     """
     os.makedirs(Path(outpath).parent, exist_ok=True)
-    if os.environ.get('USE_GOOGLE_TTS','0') == '1':
+    path, _ = synthesize_cached(text, lang=lang)
+    shutil.copyfile(path, outpath)
+    return outpath
+
+def warmup():
+    """
+    Create the synthesizer pools of the configured engines, loading their
+    models, so the first call does not pay for it.
+    """
+    for engine in TTS_ENGINES:
         try:
-            from google.cloud import texttospeech
-            client = texttospeech.TextToSpeechClient()
-            input_text = texttospeech.SynthesisInput(text=text)
-            voice = texttospeech.VoiceSelectionParams(language_code="ml-IN", ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL)
-            audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
-            response = client.synthesize_speech(request={"input": input_text, "voice": voice, "audio_config": audio_config})
-            with open(outpath, "wb") as f:
-                f.write(response.audio_content)
-            return outpath
+            get_pool(engine).warmup()
         except Exception as e:
-            # fallback to gTTS
-            pass
-    # gTTS fallback
-    tts = gTTS(text=text, lang=lang)
-    tts.save(outpath)
-    return outpath
+            print(f"[TTS] warmup of {engine} failed: {e}")
+
+def presynthesize(texts, lang='ml'):
+    """
+    Fill the audio store with fixed prompts so they never wait on synthesis.
+    """
+    for text in texts:
+        try:
+            synthesize_cached(text, lang=lang)
+        except Exception as e:
+            print("[TTS] presynthesize failed:", e)
@@ -0,0 +1,266 @@
+# backend/app/services/tts_engines.py
+"""
+Speech synthesis backends and the warm synthesizer pool.
+
+Every engine implements the same small interface:
+
+    synthesize(text, lang) -> (mono float32 PCM, sample rate)
+    mp3(text, lang)        -> MP3 bytes (engines whose native output is MP3)
+    warmup()               load models before the first request
+
+Engines (TTS_ENGINES picks them, in order of preference):
+
+- gtts          Google Translate TTS over HTTP. Native MP3.
+- google-cloud  Cloud Text-to-Speech. Native MP3.
+- mms           Meta MMS VITS models via transformers (facebook/mms-tts-mal
+                for Malayalam), fully offline once the weights are cached.
+                Native 16 kHz PCM.
+- espeak        espeak-ng subprocess. Offline and needs no model weights;
+                robotic, but always there as the last resort.
+
+Local engines hold a model per instance, so each engine gets a
+SynthesizerPool of TTS_POOL_SIZE instances; HTTP engines hold nothing and
+allow TTS_HTTP_CONCURRENCY requests in flight instead. Instances are created
+(models loaded) by warmup() or on first use, and reused afterwards. A
+request borrows one instance for one sentence, so sentences of the same
+answer can be synthesized in parallel on different instances.
+"""
+import io
+import os
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from . import lazy
+from .audio import decode_audio
+
+gtts = lazy.lazy_import("gtts")
+
+TTS_POOL_SIZE = int(os.environ.get("TTS_POOL_SIZE", "2"))
+TTS_HTTP_CONCURRENCY = int(os.environ.get("TTS_HTTP_CONCURRENCY", "8"))
+GOOGLE_TTS_VOICE = "ml-IN-neutral"
+# Cloud TTS language code per lang; other langs are read as "<lang>-IN"
+GOOGLE_TTS_LANGUAGES = {"ml": "ml-IN", "en": "en-IN"}
+# lang=model pairs for the mms engine
+TTS_MMS_MODELS = dict(
+    pair.split("=", 1)
+    for pair in os.environ.get("TTS_MMS_MODELS", "ml=facebook/mms-tts-mal,en=facebook/mms-tts-eng").split(",")
+    if "=" in pair
+)
+# torch threads per mms instance; 0 leaves torch's default
+TTS_TORCH_THREADS = int(os.environ.get("TTS_TORCH_THREADS", "0"))
+ESPEAK_BIN = os.environ.get("ESPEAK_BIN", "espeak-ng")
+ESPEAK_RATE = 22050
+# gTTS returns 24 kHz MP3; decoded at that rate for PCM output
+MP3_DECODE_RATE = 24000
+
+
+class TtsEngine:
+    name = "base"
+    voice = "default"
+    native_format = "wav"   # "mp3" engines also implement mp3()
+    sample_rate = 16000
+    pool_size = None        # instances per process; None: TTS_POOL_SIZE
+
+    def warmup(self):
+        pass
+
+    def synthesize(self, text: str, lang: str):
+        raise NotImplementedError
+
+    def mp3(self, text: str, lang: str) -> bytes:
+        raise NotImplementedError(f"{self.name} does not produce MP3")
+
+
+class _Mp3Engine(TtsEngine):
+    native_format = "mp3"
+    sample_rate = MP3_DECODE_RATE
+    pool_size = TTS_HTTP_CONCURRENCY
+
+    def synthesize(self, text: str, lang: str):
+        return decode_audio(self.mp3(text, lang), self.sample_rate), self.sample_rate
+
+
+def _gtts_mp3(text, lang) -> bytes:
+    buf = io.BytesIO()
+    gtts.gTTS(text=text, lang=lang).write_to_fp(buf)
+    return buf.getvalue()
+
+
+def google_language_code(lang: str) -> str:
+    if "-" in lang:
+        return lang   # already a BCP-47 code such as en-US
+    return GOOGLE_TTS_LANGUAGES.get(lang, f"{lang}-IN")
+
+
+def _google_cloud_mp3(text, lang) -> bytes:
+    from google.cloud import texttospeech
+    client = texttospeech.TextToSpeechClient()
+    input_text = texttospeech.SynthesisInput(text=text)
+    voice = texttospeech.VoiceSelectionParams(language_code=google_language_code(lang), ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL)
+    audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
+    response = client.synthesize_speech(request={"input": input_text, "voice": voice, "audio_config": audio_config})
+    return response.audio_content
+
+
+class GttsEngine(_Mp3Engine):
+    name = "gtts"
+
+    def mp3(self, text: str, lang: str) -> bytes:
+        return _gtts_mp3(text, lang)
+
+
+class GoogleCloudEngine(_Mp3Engine):
+    name = "google-cloud"
+    voice = GOOGLE_TTS_VOICE
+
+    def mp3(self, text: str, lang: str) -> bytes:
+        return _google_cloud_mp3(text, lang)
+
+
+class MmsEngine(TtsEngine):
+    """
+    One VITS model (and tokenizer) per language, loaded on first use.
+    """
+    name = "mms"
+    voice = "mms-vits"
+
+    def __init__(self, models: dict = None):
+        self.models = models or TTS_MMS_MODELS
+        self._loaded = {}
+
+    def _load(self, lang: str):
+        if lang not in self._loaded:
+            if lang not in self.models:
+                raise ValueError(f"no MMS model configured for {lang!r} (TTS_MMS_MODELS)")
+            torch = lazy.import_module("torch")
+            transformers = lazy.import_module("transformers")
+            if TTS_TORCH_THREADS:
+                torch.set_num_threads(TTS_TORCH_THREADS)
+            name = self.models[lang]
+            model = transformers.VitsModel.from_pretrained(name).eval()
+            tokenizer = transformers.AutoTokenizer.from_pretrained(name)
+            self._loaded[lang] = (model, tokenizer)
+        return self._loaded[lang]
+
+    def warmup(self):
+        for lang in self.models:
+            self._load(lang)
+
+    def synthesize(self, text: str, lang: str):
+        torch = lazy.import_module("torch")
+        model, tokenizer = self._load(lang)
+        inputs = tokenizer(text, return_tensors="pt")
+        with torch.inference_mode():
+            waveform = model(**inputs).waveform[0]
+        return waveform.numpy().astype(np.float32, copy=False), int(model.config.sampling_rate)
+
+
+class EspeakEngine(TtsEngine):
+    name = "espeak"
+    voice = "espeak-ng"
+    sample_rate = ESPEAK_RATE
+
+    def warmup(self):
+        if shutil.which(ESPEAK_BIN) is None:
+            raise RuntimeError(f"{ESPEAK_BIN} is not installed")
+
+    def synthesize(self, text: str, lang: str):
+        out = subprocess.run([ESPEAK_BIN, "-v", lang, "--stdout", text], capture_output=True, check=True, timeout=30)
+        return decode_audio(out.stdout, self.sample_rate), self.sample_rate
+
+
+ENGINES = {
+    "gtts": GttsEngine,
+    "google-cloud": GoogleCloudEngine,
+    "mms": MmsEngine,
+    "espeak": EspeakEngine,
+}
+
+
+class SynthesizerPool:
+    """
+    Up to `size` engine instances, created on demand and reused. acquire()
+    hands out an idle instance, creates one while below size, and otherwise
+    waits for one to be returned. A failed creation frees its slot and wakes
+    a waiter, which then tries to create the instance itself, so waiters
+    never outlive the instances they were waiting for.
+    """
+
+    def __init__(self, factory, size: int = TTS_POOL_SIZE):
+        self.factory = factory
+        self.size = max(1, size)
+        self._idle = []   # stack, most recently used last: its caches are warm
+        self._cond = threading.Condition()
+        self._created = 0   # instances alive or being created
+
+    def _create(self):
+        try:
+            engine = self.factory()
+            engine.warmup()
+            return engine
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, engine):
+        with self._cond:
+            self._idle.append(engine)
+            self._cond.notify()
+
+    @contextmanager
+    def acquire(self):
+        with self._cond:
+            while not self._idle and self._created >= self.size:
+                self._cond.wait()
+            engine = self._idle.pop() if self._idle else None
+            if engine is None:
+                self._created += 1
+        if engine is None:
+            engine = self._create()
+        try:
+            yield engine
+        finally:
+            self._release(engine)
+
+    def warmup(self):
+        """
+        Create every instance now so no request pays for a model load.
+        """
+        while True:
+            with self._cond:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            self._release(self._create())
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"size": self.size, "created": self._created, "idle": len(self._idle)}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> SynthesizerPool:
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                if name not in ENGINES:
+                    raise ValueError(f"unknown TTS engine {name!r}; known: {sorted(ENGINES)}")
+                engine = ENGINES[name]
+                pool = _pools[name] = SynthesizerPool(engine, engine.pool_size or TTS_POOL_SIZE)
+    return pool
+
+
+def stats() -> dict:
+    with _pools_lock:
+        return {name: pool.stats() for name, pool in _pools.items()}
@@ -0,0 +1,123 @@
+# backend/app/services/vad.py
+"""
+Energy-based voice activity detection for call recordings.
+
+Frames of VAD_FRAME_MS are classed as speech when their RMS level is
+VAD_MARGIN_DB above the recording's own noise floor (its quietest frames)
+and above the absolute VAD_FLOOR_DB. Short pauses inside speech are kept,
+blips shorter than VAD_MIN_SPEECH_MS are dropped, and every region is padded
+by VAD_PAD_MS so word onsets and tails survive. trim() keeps only the speech;
+split_windows() cuts long speech into overlapping windows for parallel ASR.
+"""
+import os
+
+import numpy as np
+
+from .audio import SAMPLE_RATE
+from .tracing import traced
+
+VAD_FRAME_MS = int(os.environ.get("VAD_FRAME_MS", "30"))
+VAD_MARGIN_DB = float(os.environ.get("VAD_MARGIN_DB", "12"))
+VAD_FLOOR_DB = float(os.environ.get("VAD_FLOOR_DB", "-55"))
+VAD_MIN_SPEECH_MS = int(os.environ.get("VAD_MIN_SPEECH_MS", "250"))
+VAD_MIN_SILENCE_MS = int(os.environ.get("VAD_MIN_SILENCE_MS", "600"))
+VAD_PAD_MS = int(os.environ.get("VAD_PAD_MS", "200"))
+# silence inserted between kept regions so Whisper still hears a pause
+VAD_GAP_MS = int(os.environ.get("VAD_GAP_MS", "200"))
+
+
+def frame_levels(audio: np.ndarray, frame: int) -> np.ndarray:
+    """
+    RMS level in dBFS of each complete frame.
+    """
+    n = audio.size // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[: n * frame].reshape(n, frame)
+    power = np.einsum("ij,ij->i", frames, frames) / frame
+    return 10.0 * np.log10(power + 1e-12)
+
+
+def _runs(mask: np.ndarray):
+    """
+    [start, end) index pairs of the True runs in mask.
+    """
+    edges = np.diff(np.concatenate([[0], mask.view(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+@traced("vad")
+def speech_regions(audio: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    """
+    [start, end) sample ranges that contain speech, in order.
+    """
+    frame = max(1, sample_rate * VAD_FRAME_MS // 1000)
+    levels = frame_levels(audio, frame)
+    if levels.size == 0:
+        return []
+    noise_floor, loud = np.percentile(levels, [5, 90])
+    if loud - noise_floor < VAD_MARGIN_DB:
+        # no quiet stretch to learn the noise from: all speech or all silence
+        return [(0, audio.size)] if noise_floor > VAD_FLOOR_DB else []
+    speech = levels > max(noise_floor + VAD_MARGIN_DB, VAD_FLOOR_DB)
+
+    to_frames = lambda ms: max(1, ms // VAD_FRAME_MS)
+    min_silence, min_speech, pad = to_frames(VAD_MIN_SILENCE_MS), to_frames(VAD_MIN_SPEECH_MS), to_frames(VAD_PAD_MS)
+
+    merged = []
+    for start, end in _runs(speech):
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end   # short pause inside an utterance
+        else:
+            merged.append([start, end])
+
+    regions = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start, end = max(0, start - pad), min(levels.size, end + pad)
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    # the last partial frame belongs to a region that reaches the final frame
+    return [(s * frame, audio.size if e == levels.size else e * frame) for s, e in regions]
+
+
+def trim(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Only the speech regions of audio, joined by VAD_GAP_MS of silence.
+    Returns an empty array when nothing sounds like speech.
+    """
+    regions = speech_regions(audio, sample_rate)
+    if len(regions) == 1 and regions[0] == (0, audio.size):
+        return audio
+    gap = np.zeros(sample_rate * VAD_GAP_MS // 1000, dtype=np.float32)
+    parts = []
+    for start, end in regions:
+        if parts:
+            parts.append(gap)
+        parts.append(audio[start:end])
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+
+def split_windows(audio: np.ndarray, window_s: float, overlap_s: float, sample_rate: int = SAMPLE_RATE):
+    """
+    Views of audio window_s long, each overlapping the previous one by
+    overlap_s; the last window runs to the end. A last window that would add
+    no more than overlap_s of new audio is merged into the one before it
+    (which then runs up to window_s + overlap_s), so Whisper is never run
+    on a fragment that is almost all repeated audio.
+    """
+    window = int(window_s * sample_rate)
+    if audio.size <= window:
+        return [audio] if audio.size else []
+    overlap = int(overlap_s * sample_rate)
+    step = max(1, window - overlap)
+    starts = list(range(0, audio.size - window, step))
+    windows = [audio[s:s + window] for s in starts]
+    if audio.size - (starts[-1] + window) <= overlap:
+        windows[-1] = audio[starts[-1]:]
+    else:
+        windows.append(audio[starts[-1] + step:])
+    return windows
@@ -0,0 +1,228 @@
+# backend/app/services/whisper_registry.py
+"""
+Process-wide registry of loaded Whisper models.
+
+Loading a Whisper checkpoint costs far more than transcribing a short call, so
+every module that needs one (transcriber, asr, offline_farmer_assistant) asks
+this registry instead of constructing its own model.
+
+Models are keyed by (backend, model_size, device, compute_type). The compute
+type that worked for a (model_size, device) pair is remembered so later lookups
+skip the failing attempts, and the least-recently-used models are evicted when
+the estimated resident size goes over WHISPER_MEMORY_BUDGET_MB.
+"""
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import lazy
+
+FASTER_WHISPER = "faster-whisper"
+OPENAI_WHISPER = "openai-whisper"
+
+WHISPER_DEVICE = os.environ.get("WHISPER_DEVICE", "cpu")
+WHISPER_MEMORY_BUDGET_MB = int(os.environ.get("WHISPER_MEMORY_BUDGET_MB", "2048"))
+# comma separated "backend:model_size[:compute_type]" entries loaded at startup
+WHISPER_PRELOAD = os.environ.get("WHISPER_PRELOAD", "faster-whisper:tiny")
+# faster-whisper: transcriptions one model can run at once (transcriber runs
+# windows of a long recording in parallel) and threads per transcription
+# (0 = CTranslate2 default)
+WHISPER_NUM_WORKERS = int(os.environ.get("WHISPER_NUM_WORKERS", "2"))
+WHISPER_CPU_THREADS = int(os.environ.get("WHISPER_CPU_THREADS", "0"))
+
+# faster-whisper compute types, tried in order until one loads on the device
+COMPUTE_ATTEMPTS = ["int8_float16", "int8", "float16", "float32"]
+
+# parameter counts (millions) used to estimate the resident size of a model
+_PARAMS_M = {
+    "tiny": 39, "tiny.en": 39,
+    "base": 74, "base.en": 74,
+    "small": 244, "small.en": 244,
+    "medium": 769, "medium.en": 769,
+    "large": 1550, "large-v1": 1550, "large-v2": 1550, "large-v3": 1550,
+}
+_BYTES_PER_PARAM = {
+    "int8": 1, "int8_float16": 1, "int8_float32": 1,
+    "float16": 2, "float32": 4, "default": 4,
+}
+
+_lock = threading.Lock()
+_models = OrderedDict()      # key -> {"model", "size_mb", "loaded_at", "load_seconds"}
+_load_locks = {}             # key -> Lock, so concurrent callers share one load
+_compute_types = {}          # (model_size, device) -> compute type that loaded
+_stats = {"hits": 0, "loads": 0, "evictions": 0}
+
+
+def _estimate_size_mb(model_size: str, compute_type: str) -> int:
+    params = _PARAMS_M.get(model_size, 250)
+    return int(params * _BYTES_PER_PARAM.get(compute_type, 4) * 1.2) + 50
+
+
+def _evict_if_needed(keep):
+    """
+    Drop least-recently-used models until the estimated total fits the budget.
+    The model identified by `keep` (just loaded or just used) is never evicted.
+    Caller must hold _lock.
+    """
+    total = sum(entry["size_mb"] for entry in _models.values())
+    for key in list(_models.keys()):
+        if total <= WHISPER_MEMORY_BUDGET_MB:
+            break
+        if key == keep:
+            continue
+        entry = _models.pop(key)
+        total -= entry["size_mb"]
+        _stats["evictions"] += 1
+        print(f"[whisper-registry] evicted {key} (~{entry['size_mb']} MB)")
+    gc.collect()
+
+
+def _lookup(key):
+    with _lock:
+        entry = _models.get(key)
+        if entry is not None:
+            _models.move_to_end(key)
+            _stats["hits"] += 1
+            return entry["model"]
+    return None
+
+
+def _load(key, loader, size_mb):
+    with _lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        # another thread may have finished loading while we waited
+        model = _lookup(key)
+        if model is not None:
+            return model
+        started = time.perf_counter()
+        model = loader()
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _models[key] = {
+                "model": model,
+                "size_mb": size_mb,
+                "loaded_at": time.time(),
+                "load_seconds": elapsed,
+            }
+            _stats["loads"] += 1
+            _evict_if_needed(keep=key)
+        print(f"[whisper-registry] loaded {key} in {elapsed:.2f}s")
+        return model
+
+
+def _get_faster_whisper(model_size: str, device: str, compute_type=None):
+    WhisperModel = lazy.import_module("faster_whisper").WhisperModel
+
+    if compute_type:
+        attempts = [compute_type]
+    else:
+        known = _compute_types.get((model_size, device))
+        attempts = [known] if known else COMPUTE_ATTEMPTS
+
+    last_exc = None
+    for ct in attempts:
+        key = (FASTER_WHISPER, model_size, device, ct)
+        model = _lookup(key)
+        if model is not None:
+            return model
+        try:
+            model = _load(
+                key,
+                lambda: WhisperModel(
+                    model_size,
+                    device=device,
+                    compute_type=ct,
+                    cpu_threads=WHISPER_CPU_THREADS,
+                    num_workers=WHISPER_NUM_WORKERS,
+                ),
+                _estimate_size_mb(model_size, ct),
+            )
+        except Exception as e:
+            last_exc = e
+            print(f"[faster-whisper] compute_type {ct} failed: {e}")
+            continue
+        if not compute_type:
+            _compute_types[(model_size, device)] = ct
+        return model
+    # if we got here, no compute type worked
+    raise last_exc
+
+
+def _get_openai_whisper(model_size: str, device: str):
+    whisper = lazy.import_module("whisper")
+
+    key = (OPENAI_WHISPER, model_size, device, "default")
+    model = _lookup(key)
+    if model is not None:
+        return model
+    return _load(
+        key,
+        lambda: whisper.load_model(model_size, device=device),
+        _estimate_size_mb(model_size, "default"),
+    )
+
+
+def get_model(backend: str, model_size: str, device: str = None, compute_type: str = None):
+    """
+    Return a loaded Whisper model, loading it on first use.
+    backend: "faster-whisper" or "openai-whisper".
+    compute_type: faster-whisper only; None walks COMPUTE_ATTEMPTS once and
+    remembers the first type that loads for this (model_size, device).
+    """
+    device = device or WHISPER_DEVICE
+    if backend == FASTER_WHISPER:
+        return _get_faster_whisper(model_size, device, compute_type)
+    if backend == OPENAI_WHISPER:
+        return _get_openai_whisper(model_size, device)
+    raise ValueError(f"Unknown whisper backend: {backend}")
+
+
+def warmup(spec: str = None):
+    """
+    Load the models listed in `spec` (defaults to WHISPER_PRELOAD), e.g.
+    "faster-whisper:tiny,openai-whisper:small:default". Failures are logged,
+    not raised, so a missing backend never blocks startup.
+    """
+    spec = WHISPER_PRELOAD if spec is None else spec
+    for item in [s.strip() for s in spec.split(",") if s.strip()]:
+        parts = item.split(":")
+        backend, model_size = parts[0], parts[1] if len(parts) > 1 else "tiny"
+        compute_type = parts[2] if len(parts) > 2 and backend == FASTER_WHISPER else None
+        try:
+            get_model(backend, model_size, compute_type=compute_type)
+        except Exception as e:
+            print(f"[whisper-registry] warmup of {item} failed: {e}")
+
+
+def warmup_in_background(spec: str = None) -> threading.Thread:
+    """
+    Start warmup() on a daemon thread. Requests that arrive before it finishes
+    wait on the same per-model load lock instead of loading a second copy.
+    """
+    t = threading.Thread(target=warmup, args=(spec,), name="whisper-warmup", daemon=True)
+    t.start()
+    return t
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "budget_mb": WHISPER_MEMORY_BUDGET_MB,
+            "resident_mb": sum(e["size_mb"] for e in _models.values()),
+            "models": [
+                {"key": list(k), "size_mb": e["size_mb"], "load_seconds": round(e["load_seconds"], 3)}
+                for k, e in _models.items()
+            ],
+            "compute_types": {f"{m}@{d}": ct for (m, d), ct in _compute_types.items()},
+        }
+
+
+def clear():
+    with _lock:
+        _models.clear()
+        _compute_types.clear()
+    gc.collect()
@@ -1,37 +1,110 @@
 # backend/app/telephony.py
 import traceback
-from .services.transcriber import transcribe_url_to_english
-from .services.qa_model import answer_query_english
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .services.transcriber import fetch_audio, transcribe_audio_to_english
+from .services.qa_model import answer_query_english, stream_answer_english
+from .services.sentences import SentenceBuffer
 from .services.translator import en_to_ml, ml_to_en
 from .services.notifier import save_tts, send_sms_stub, serialize_sources
+from .services.tracing import correlation, submit_with_context
+from .services.stage_limits import stage_slot
 from .models import save_query_record, SessionLocal, QueryRecord
+from . import prompts
 import datetime
 import os
 
+# stream the LLM answer and speak it sentence by sentence (0 = wait for the full answer)
+TELEPHONY_STREAMING = os.environ.get("TELEPHONY_STREAMING", "1") == "1"
+SPEECH_WORKERS = int(os.environ.get("SPEECH_WORKERS", "2"))
+
+# translation + TTS of finished sentences runs here while the LLM keeps generating
+_speech_executor = ThreadPoolExecutor(max_workers=SPEECH_WORKERS, thread_name_prefix="speech")
+
+def _speak_sentence(caller, sentence_en, part):
+    """
+    Translate one English sentence to Malayalam and synthesize it.
+    Returns (sentence_ml, play_url, finished_at).
+    """
+    try:
+        with stage_slot("translate"):
+            sentence_ml = en_to_ml(sentence_en)
+    except Exception as e:
+        print("[TRANSLATION ERROR]", e)
+        sentence_ml = sentence_en  # best effort
+    try:
+        with stage_slot("tts"):
+            _, play_url = save_tts(caller, sentence_ml, part=part)
+    except Exception as e:
+        print("[TTS SAVE ERROR]", e)
+        play_url = None
+    return sentence_ml, play_url, time.perf_counter()
+
+def _stream_answer_to_speech(caller, english_question):
+    """
+    Stream the LLM answer and hand each completed sentence to translation + TTS
+    while the model is still generating, so the first audio is ready after
+    about one sentence instead of after the whole answer.
+    Returns (answer_en, answer_ml, play_urls, result), result holding the
+    answer's confidence and sources.
+    """
+    started = time.perf_counter()
+    buffer = SentenceBuffer()
+    tokens, futures, result = [], [], {}
+
+    def submit(sentences):
+        for sentence in sentences:
+            futures.append(submit_with_context(_speech_executor, _speak_sentence, caller, sentence, len(futures)))
+
+    with stage_slot("llm"):
+        for token in stream_answer_english(english_question, result=result):
+            tokens.append(token)
+            submit(buffer.feed(token))
+    submit(buffer.flush())
+
+    parts_ml, play_urls = [], []
+    for i, fut in enumerate(futures):
+        sentence_ml, play_url, finished_at = fut.result()
+        if i == 0:
+            print(f"[FIRST AUDIO] {finished_at - started:.2f}s:", play_url)
+        parts_ml.append(sentence_ml)
+        play_urls.append(play_url)
+    return "".join(tokens).strip(), " ".join(parts_ml), play_urls, result
+
 def handle_incoming_call_webhook(payload: dict):
     """
     payload expected keys: From, RecordingUrl (or RecordingUrl in Twilio)
-    This function runs in background_tasks (synchronous context)
+    This function runs on a dispatcher worker (see app.dispatcher), synchronously.
+    Stage spans are tagged with the Twilio CallSid as correlation id.
     """
+    with correlation(payload.get("CallSid") or payload.get("call_sid")):
+        _handle_call(payload)
+
+def _handle_call(payload: dict):
     caller = payload.get("From") or payload.get("from") or "unknown"
     recording_url = payload.get("RecordingUrl") or payload.get("recording_url") or payload.get("RecordingUrl")
+    # optional per-call accuracy/latency trade-off for Whisper (1 = greedy, fastest)
+    beam_size = payload.get("beam_size")
     print("[CALL WEBHOOK] caller:", caller, "recording_url:", recording_url)
 
     try:
         if not recording_url:
-            answer_ml = "ക്ഷമിക്കണം, നിങ്ങളുടെ ശബ്ദം ലഭിച്ചില്ല. ദയവായി വീണ്ടും ശ്രമിക്കുക."
+            answer_ml = prompts.NO_RECORDING
             save_path, play_url = save_tts(caller, answer_ml)
             send_sms_stub(caller, answer_ml)
             save_query_record(caller, "", answer_ml, [], confidence=0.0)
             return
 
-        # 1) Transcribe (translate) farmer speech -> English
-        english_question = transcribe_url_to_english(recording_url, model_size="tiny")
+        # 1) Transcribe (translate) farmer speech -> English; the download does
+        # not need to hold an ASR slot
+        audio = fetch_audio(recording_url)
+        with stage_slot("transcribe"):
+            english_question = transcribe_audio_to_english(audio, model_size="tiny", beam_size=beam_size)
         print("[TRANSCRIBED -> ENGLISH]:", english_question)
 
         # If transcription empty
         if not english_question.strip():
-            answer_ml = "ക്ഷമിക്കണം, ശബ്ദം വ്യക്തമല്ല. ദയവായി ചെറിയ വാചകമായി വീണ്ടും പറയുക."
+            answer_ml = prompts.UNCLEAR_AUDIO
             save_path, play_url = save_tts(caller, answer_ml)
             send_sms_stub(caller, answer_ml)
             save_query_record(caller, english_question, answer_ml, [], confidence=0.0)
@@ -41,45 +114,56 @@ def handle_incoming_call_webhook(payload: dict):
         # english_question = ml_to_en(malayalam_text)  # not needed when whisper task=translate used
 
         # 3) Query offline LLM (TinyLLaMA via Ollama)
-        llm_resp = answer_query_english(english_question)
-        answer_en = llm_resp.get("answer", "")
-        sources = llm_resp.get("sources", [])
+        if TELEPHONY_STREAMING:
+            # 3-5) stream tokens; translate + synthesize each sentence as it completes
+            answer_en, answer_ml, play_urls, result = _stream_answer_to_speech(caller, english_question)
+            sources, confidence = result.get("sources", []), result.get("confidence", 0.0)
+            print("[LLM ANSWER EN]:", answer_en)
+        else:
+            with stage_slot("llm"):
+                llm_resp = answer_query_english(english_question)
+            answer_en = llm_resp.get("answer", "")
+            sources = llm_resp.get("sources", [])
+            confidence = llm_resp.get("confidence", 0.0)
 
-        print("[LLM ANSWER EN]:", answer_en)
+            print("[LLM ANSWER EN]:", answer_en)
 
-        # 4) Translate answer back to Malayalam
-        try:
-            answer_ml = en_to_ml(answer_en)
-        except Exception as e:
-            print("[TRANSLATION ERROR]", e)
-            # fallback: attempt simple wrapper to ask LLM to translate
-            answer_ml = answer_en  # best effort
+            # 4) Translate answer back to Malayalam
+            try:
+                with stage_slot("translate"):
+                    answer_ml = en_to_ml(answer_en)
+            except Exception as e:
+                print("[TRANSLATION ERROR]", e)
+                # fallback: attempt simple wrapper to ask LLM to translate
+                answer_ml = answer_en  # best effort
 
-        # 5) Generate TTS
-        try:
-            tts_path, play_url = save_tts(caller, answer_ml)
-        except Exception as e:
-            print("[TTS SAVE ERROR]", e)
-            play_url = None
+            # 5) Generate TTS
+            try:
+                with stage_slot("tts"):
+                    tts_path, play_url = save_tts(caller, answer_ml)
+            except Exception as e:
+                print("[TTS SAVE ERROR]", e)
+                play_url = None
+            play_urls = [play_url]
 
         # 6) Send SMS and (optionally) make call via Twilio - here stub
-        sms_text = f"നിങ്ങളുടെ ചോദ്യം: \n\n{answer_ml}\n"
+        sms_text = prompts.SMS_ANSWER.format(answer=answer_ml)
         send_sms_stub(caller, sms_text)
 
         # 7) Persist record in DB
         try:
             # depends on your models.save_query_record or SessionLocal usage
-            save_query_record(caller, english_question, answer_ml, sources, confidence=llm_resp.get("confidence", 0.0))
+            save_query_record(caller, english_question, answer_ml, sources, confidence=confidence)
         except Exception as e:
             print("[DB SAVE ERROR]", e)
 
-        print("[CALL HANDLED] play_url:", play_url)
+        print("[CALL HANDLED] play_urls:", play_urls)
     except Exception as e:
         print("[ERROR] handle_incoming_call_webhook failed:", e)
         traceback.print_exc()
         # final fallback to user
         try:
-            fallback = "ക്ഷമിക്കണം, പ്രവേശനം പരിഗണിക്കപ്പെട്ടില്ല. പിന്നീട് ശ്രമിക്കുക."
+            fallback = prompts.PROCESSING_FAILED
             save_tts(caller, fallback)
             send_sms_stub(caller, fallback)
             save_query_record(caller, "", fallback, [], confidence=0.0)
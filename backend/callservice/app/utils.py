@@ -1,29 +1,15 @@
-import requests
 import os
-from urllib.parse import urlparse
-from pathlib import Path
-import subprocess
+from .services.audio import SAMPLE_RATE, decode_audio, write_wav
+from .services.media import get_fetcher
 
 def download_url_to_file(url, dest):
-    # supports http(s) and file://
-    if url.startswith("file://"):
-        src = urlparse(url).path
-        os.makedirs(os.path.dirname(dest), exist_ok=True)
-        Path(dest).write_bytes(Path(src).read_bytes())
-        return dest
-    r = requests.get(url, stream=True, timeout=30)
-    r.raise_for_status()
-    os.makedirs(os.path.dirname(dest), exist_ok=True)
-    with open(dest, 'wb') as f:
-        for chunk in r.iter_content(1024):
-            f.write(chunk)
-    return dest
+    # supports http(s) and file://; pooled session, retries and size limit
+    return get_fetcher().fetch_to_file(url, dest)
 
 def ensure_wav_16khz(src_path, out_path):
     """
-    Convert audio to 16kHz mono WAV using ffmpeg (ffmpeg must be installed).
+    Convert audio to 16kHz mono 16-bit WAV. Decoded and resampled in-process
+    (services.audio); callers that can take an array should use decode_audio.
     """
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    cmd = ["ffmpeg", "-y", "-i", src_path, "-ac", "1", "-ar", "16000", out_path]
-    subprocess.run(cmd, check=True)
-    return out_path
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    return write_wav(out_path, decode_audio(src_path), SAMPLE_RATE)
@@ -0,0 +1,134 @@
+# backend/bench/audio_decode.py
+"""
+In-process decode/resample vs the old ffmpeg-subprocess conversion.
+
+    cd backend/callservice
+    python -m bench.audio_decode --repeat 20 --threads 1,4
+    python -m bench.audio_decode --input recording.mp3 --input call.wav
+
+For each input file and thread count, converts it to 16 kHz mono with:
+
+- ffmpeg:      one `ffmpeg -ac 1 -ar 16000` process per file into a temp WAV
+               (the previous ensure_wav_16khz), skipped when ffmpeg is not on PATH
+- ensure_wav:  utils.ensure_wav_16khz, now in-process, file to file
+- decode:      audio.decode_audio from bytes in memory, the path the ASR stage uses
+
+Reports latency per conversion, conversions/second and, when ffmpeg ran, the
+correlation between its output and decode_audio's.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.services.audio import decode_audio
+from app.utils import ensure_wav_16khz
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+DEFAULT_INPUT = os.path.join(REPO_ROOT, "examples", "sample_malayalam.wav")
+
+
+def ffmpeg_convert(src: str, out: str) -> str:
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", src, "-ac", "1", "-ar", "16000", out]
+    subprocess.run(cmd, check=True)
+    return out
+
+
+def _summary(seconds: list, wall: float) -> dict:
+    ms = sorted(s * 1000.0 for s in seconds)
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 2),
+        "p50_ms": round(ms[len(ms) // 2], 2),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 2),
+        "per_second": round(len(ms) / wall, 1),
+    }
+
+
+def run_method(fn, repeat: int, threads: int) -> dict:
+    fn(0)   # warm caches (filter design, imports) outside the measurement
+
+    def timed(i):
+        started = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        seconds = list(pool.map(timed, range(repeat)))
+    return _summary(seconds, time.perf_counter() - started)
+
+
+def bench_input(path: str, repeat: int, thread_counts, workdir: str) -> dict:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    def out_path(name, i):
+        return os.path.join(workdir, f"{name}_{i}.wav")
+
+    def via_ffmpeg(i):
+        out = ffmpeg_convert(path, out_path("ffmpeg", i))
+        os.remove(out)
+
+    def via_ensure_wav(i):
+        out = ensure_wav_16khz(path, out_path("ensure", i))
+        os.remove(out)
+
+    def via_decode(i):
+        decode_audio(data)
+
+    methods = {"ensure_wav": via_ensure_wav, "decode": via_decode}
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    if has_ffmpeg:
+        methods = {"ffmpeg": via_ffmpeg, **methods}
+
+    result = {"input": path, "bytes": len(data), "ffmpeg": has_ffmpeg, "levels": []}
+    for threads in thread_counts:
+        level = {"threads": threads}
+        for name, fn in methods.items():
+            level[name] = run_method(fn, repeat, threads)
+        if has_ffmpeg:
+            base = level["ffmpeg"]["mean_ms"]
+            level["speedup_vs_ffmpeg"] = {
+                name: round(base / level[name]["mean_ms"], 1) for name in methods if name != "ffmpeg"
+            }
+        result["levels"].append(level)
+
+    if has_ffmpeg:
+        reference = decode_audio(ffmpeg_convert(path, out_path("reference", 0)))
+        ours = decode_audio(data)
+        n = min(reference.size, ours.size)
+        # ffmpeg clips to int16 and treats the edges differently, so compare shape, not samples
+        result["correlation_vs_ffmpeg"] = round(float(np.corrcoef(reference[:n], ours[:n])[0, 1]), 6) if n > 1 else None
+        result["length_samples"] = {"ffmpeg": int(reference.size), "decode": int(ours.size)}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", action="append", help="audio file (repeatable); default: the sample recording")
+    parser.add_argument("--repeat", type=int, default=20, help="conversions per method and thread count")
+    parser.add_argument("--threads", default="1,4", help="comma-separated concurrent conversions")
+    parser.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    thread_counts = [int(t) for t in args.threads.split(",") if t.strip()]
+    with tempfile.TemporaryDirectory(prefix="bench-audio-") as workdir:
+        results = [bench_input(p, args.repeat, thread_counts, workdir) for p in args.input or [DEFAULT_INPUT]]
+
+    text = json.dumps({"results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+# backend/bench/call_pipeline.py
+"""
+End-to-end benchmark of the phone-call pipeline with examples/sample_malayalam.wav.
+
+    cd backend/callservice
+    python -m bench.call_pipeline --calls 16 --concurrency 1,4,8 --out bench-telephony.json
+    python -m bench.call_pipeline --pipeline celery --calls 8 --concurrency 1,4
+    python -m bench.call_pipeline --baseline bench-telephony.json   # flag regressions
+
+Drives telephony.handle_incoming_call_webhook (or the Celery stage chain
+from worker.tasks, executed eagerly in-process) against the stand-ins in
+bench.fakes: Ollama, Twilio, gTTS and the recording host are local fake
+servers (SMS goes through the real outbox and Twilio client, pointed at the
+fake with TWILIO_API_BASE), the database is a fresh SQLite file. Whisper and MarianMT run for
+real unless --stub-asr / --stub-mt replace them with fixed-latency stand-ins.
+
+Reports per-stage timings (download, transcribe, llm, translate, tts, sms,
+db), throughput and latency at each concurrency level, and peak RSS, as JSON.
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .fakes import FakeServices, default_recordings
+
+STAGES = ["download", "transcribe", "llm", "translate", "tts", "sms", "db"]
+STUB_QUESTION = "My banana leaves have brown spots, what should I do?"
+
+
+def _pct(values, q: float) -> float:
+    # nearest-rank percentile of a sorted list
+    if not values:
+        return 0.0
+    k = max(0, min(len(values) - 1, int(round(q / 100.0 * len(values) + 0.5)) - 1))
+    return values[k]
+
+
+def _ms_summary(seconds) -> dict:
+    vals = sorted(s * 1000.0 for s in seconds)
+    if not vals:
+        return {"count": 0}
+    return {
+        "count": len(vals),
+        "mean_ms": round(sum(vals) / len(vals), 2),
+        "p50_ms": round(_pct(vals, 50), 2),
+        "p95_ms": round(_pct(vals, 95), 2),
+        "max_ms": round(vals[-1], 2),
+        "total_ms": round(sum(vals), 2),
+    }
+
+
+class StageTimer:
+    """
+    Wraps pipeline functions in place and collects their wall times per stage.
+    Generators (the streamed LLM answer) are timed until exhausted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.errors.clear()
+
+    def _record(self, stage, seconds, failed):
+        with self._lock:
+            self.samples[stage].append(seconds)
+            if failed:
+                self.errors[stage] += 1
+
+    def wrap(self, stage: str, fn):
+        timer = self
+
+        def timed_gen(gen, started):
+            failed = True
+            try:
+                yield from gen
+                failed = False
+            finally:
+                timer._record(stage, time.perf_counter() - started, failed)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                out = fn(*args, **kwargs)
+            except Exception:
+                timer._record(stage, time.perf_counter() - started, True)
+                raise
+            if inspect.isgenerator(out):
+                return timed_gen(out, started)
+            timer._record(stage, time.perf_counter() - started, False)
+            return out
+
+        timed.__wrapped__ = fn
+        return timed
+
+    def instrument(self, stage: str, module, name: str) -> bool:
+        fn = getattr(module, name, None)
+        if fn is None:
+            return False
+        setattr(module, name, self.wrap(stage, fn))
+        return True
+
+    def instrument_tasks(self, stages: dict):
+        """
+        Time Celery tasks through the task_prerun/task_postrun signals.
+        stages: task name -> stage. Unlike instrument(), this does not depend
+        on which helpers the task bodies call.
+        """
+        from celery.signals import task_postrun, task_prerun
+
+        timer, started = self, {}
+
+        def prerun(task_id=None, task=None, **kwargs):
+            if task.name in stages:
+                started[task_id] = time.perf_counter()
+
+        def postrun(task_id=None, task=None, state=None, **kwargs):
+            t0 = started.pop(task_id, None)
+            if t0 is not None:
+                timer._record(stages[task.name], time.perf_counter() - t0, state != "SUCCESS")
+
+        # weak=False: the handlers are closures that would otherwise be collected
+        task_prerun.connect(prerun, weak=False)
+        task_postrun.connect(postrun, weak=False)
+
+    def summary(self) -> dict:
+        with self._lock:
+            out = {}
+            for stage in STAGES + sorted(set(self.samples) - set(STAGES)):
+                if stage in self.samples:
+                    out[stage] = {**_ms_summary(self.samples[stage]), "errors": self.errors.get(stage, 0)}
+            return out
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def configure_env(fakes: FakeServices, workdir: str, args):
+    """
+    Point the app at the fakes and at scratch storage. Must run before any
+    app module is imported, since they read their config at import time.
+    """
+    caches = "1" if args.warm_caches else "0"
+    os.environ["OLLAMA_HOST"] = fakes.base_url
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["TTS_DIR"] = os.path.join(workdir, "tts")
+    os.environ["TTS_HOST"] = f"{fakes.base_url}/static/tts"
+    os.environ["TRANSLATION_CACHE_PATH"] = os.path.join(workdir, "translation_cache.sqlite3")
+    # the Celery answer stage retrieves from the repo's KB into a scratch index
+    os.environ["KB_DIR"] = os.path.join(os.path.dirname(default_recordings()["sample_malayalam.wav"]), "..", "data", "kb")
+    os.environ["KB_INDEX_DIR"] = os.path.join(workdir, "kb_index")
+    if args.embedder:
+        os.environ["EMBEDDER"] = args.embedder
+    os.environ["ANSWER_CACHE"] = caches
+    os.environ["TRANSLATION_CACHE"] = caches
+    os.environ["TELEPHONY_STREAMING"] = "0" if args.no_streaming else "1"
+    os.environ["USE_GOOGLE_TTS"] = "0"
+    os.environ["USE_OPENAI"] = "0"
+    # Celery tasks run inline; no Redis needed
+    os.environ["CELERY_BROKER_URL"] = "memory://"
+    os.environ["CELERY_RESULT_BACKEND"] = "cache+memory://"
+    os.environ["CELERY_TASK_ALWAYS_EAGER"] = "1"
+    # the outbox and pooled Twilio client send to the fake Messages endpoint
+    os.environ["TW_SID"] = "ACbench"
+    os.environ["TW_TOKEN"] = "token"
+    os.environ["TW_FROM"] = "+10000000000"
+    os.environ["TWILIO_API_BASE"] = fakes.base_url
+    os.environ["SMS_RATE_PER_NUMBER"] = str(args.sms_rate)
+    os.environ["SMS_BACKOFF_S"] = "0.05"
+    os.environ.pop("TWILIO_STATUS_CALLBACK", None)
+
+
+def install_fakes(fakes: FakeServices, args):
+    """
+    Route gTTS to the fake server. gTTS hard-codes its public endpoint, so
+    the call site is swapped for an HTTP client that sends the same request
+    to the stand-in. SMS needs no swap: configure_env sets TWILIO_API_BASE.
+    """
+    from app.services import tts_engines
+
+    session = requests.Session()
+
+    def gtts_via_fake(text, lang):
+        r = session.post(f"{fakes.base_url}/tts", data={"q": text, "tl": lang}, timeout=30)
+        r.raise_for_status()
+        return r.content
+
+    tts_engines._gtts_mp3 = gtts_via_fake
+
+
+def stub_models(args):
+    """
+    Fixed-latency stand-ins for Whisper and MarianMT, for machines without the
+    model weights. Audio is still fetched and decoded; only inference is skipped.
+    """
+    from app.services import transcriber, translator
+    from app.services.audio import SAMPLE_RATE
+
+    if args.stub_asr:
+        def transcribe_stub(window, model_size, beam_size):
+            # cost scales with the audio Whisper would see after VAD trimming
+            time.sleep(args.stub_asr_ms / 1000.0 * window.size / (10 * SAMPLE_RATE))
+            return STUB_QUESTION
+        transcriber._transcribe_window = transcribe_stub
+
+    if args.stub_mt:
+        def translate_stub(text):
+            time.sleep(args.stub_mt_ms / 1000.0)
+            return text
+        translator.en_to_ml = translate_stub
+
+
+def call_payload(i: int, url: str, args) -> dict:
+    return {"CallSid": f"CAbench{i:05d}", "From": f"+9190000{i:05d}", "RecordingUrl": url, "beam_size": args.beam_size}
+
+
+def telephony_runner(fakes: FakeServices, timer: StageTimer, args):
+    from app import models, telephony
+    from app.services import transcriber, translator
+
+    models.init_db()
+    install_fakes(fakes, args)
+    stub_models(args)
+    telephony.transcribe_audio_to_english = transcriber.transcribe_audio_to_english
+    telephony.en_to_ml = translator.en_to_ml
+
+    timer.instrument("download", telephony, "fetch_audio")
+    timer.instrument("transcribe", telephony, "transcribe_audio_to_english")
+    timer.instrument("llm", telephony, "stream_answer_english")
+    timer.instrument("llm", telephony, "answer_query_english")
+    timer.instrument("translate", telephony, "en_to_ml")
+    timer.instrument("tts", telephony, "save_tts")
+    timer.instrument("sms", telephony, "send_sms_stub")
+    timer.instrument("db", telephony, "save_query_record")
+
+    url = fakes.recording_url("sample_malayalam.wav")
+
+    def one_call(i):
+        telephony.handle_incoming_call_webhook(call_payload(i, url, args))
+        return "handled"
+
+    return one_call
+
+
+def celery_runner(fakes: FakeServices, timer: StageTimer, args):
+    from app import models
+    try:
+        from worker import tasks
+        from worker.celery_app import CALL_STAGE_TASKS
+    except ImportError as e:
+        raise SystemExit(f"[bench] worker.tasks cannot be imported: {e}")
+
+    models.init_db()
+    install_fakes(fakes, args)
+    stub_models(args)
+    from app.services import translator
+    tasks.en_to_ml = translator.en_to_ml
+    if args.stub_asr:
+        from app.services.audio import SAMPLE_RATE, decode_audio
+
+        def asr_stub(path, language="ml", beam_size=None):
+            # asr.transcribe_audio gives Whisper the whole recording (no VAD)
+            samples = decode_audio(path)
+            time.sleep(args.stub_asr_ms / 1000.0 * samples.size / (10 * SAMPLE_RATE))
+            return STUB_QUESTION, 0.0
+        tasks.transcribe_audio = asr_stub
+
+    # one stage task per reported stage; timed as whole tasks
+    task_stages = dict(zip(("fetch", "transcribe", "answer", "translate", "synthesize", "notify", "persist"), STAGES))
+    timer.instrument_tasks({CALL_STAGE_TASKS[task]: stage for task, stage in task_stages.items()})
+
+    url = fakes.recording_url("sample_malayalam.wav")
+
+    def one_call(i):
+        # eager mode: the whole stage chain runs in this thread
+        res = tasks.start_call_pipeline(call_payload(i, url, args)).get()
+        return (res or {}).get("status", "unknown")
+
+    return one_call
+
+
+def run_level(one_call, timer: StageTimer, calls: int, concurrency: int) -> dict:
+    timer.reset()
+    latencies, outcomes = [], defaultdict(int)
+    lock = threading.Lock()
+
+    def timed_call(i):
+        started = time.perf_counter()
+        try:
+            outcome = one_call(i)
+        except Exception as e:
+            outcome = f"exception:{type(e).__name__}"
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed_call, range(calls)))
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "calls": calls,
+        "wall_seconds": round(wall, 3),
+        "calls_per_second": round(calls / wall, 3),
+        "latency": _ms_summary(latencies),
+        "outcomes": dict(outcomes),
+        "stages": timer.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(result: dict, baseline: dict, threshold_pct: float) -> list:
+    """
+    Stage p50s and throughputs that got worse than baseline by more than threshold_pct.
+    """
+    slower = []
+    limit = 1.0 + threshold_pct / 100.0
+    old_levels = {lvl["concurrency"]: lvl for lvl in baseline.get("levels", [])}
+    for lvl in result["levels"]:
+        old = old_levels.get(lvl["concurrency"])
+        if not old:
+            continue
+        if lvl["calls_per_second"] * limit < old["calls_per_second"]:
+            slower.append({"concurrency": lvl["concurrency"], "metric": "calls_per_second",
+                           "baseline": old["calls_per_second"], "current": lvl["calls_per_second"]})
+        for stage, cur in lvl["stages"].items():
+            prev = old.get("stages", {}).get(stage)
+            if prev and prev.get("p50_ms") and cur.get("p50_ms", 0) > prev["p50_ms"] * limit:
+                slower.append({"concurrency": lvl["concurrency"], "metric": f"{stage}.p50_ms",
+                               "baseline": prev["p50_ms"], "current": cur["p50_ms"]})
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pipeline", default="telephony", choices=["telephony", "celery"])
+    parser.add_argument("--calls", type=int, default=8, help="calls per concurrency level")
+    parser.add_argument("--concurrency", default="1,4", help="comma-separated levels")
+    parser.add_argument("--no-streaming", action="store_true", help="TELEPHONY_STREAMING=0")
+    parser.add_argument("--warm-caches", action="store_true", help="leave answer/translation caches on")
+    parser.add_argument("--stub-asr", action="store_true")
+    parser.add_argument("--stub-asr-ms", type=float, default=800.0, help="per 10 s of audio after VAD")
+    parser.add_argument("--beam-size", type=int, default=None, help="Whisper beam size per call (default WHISPER_BEAM_SIZE)")
+    parser.add_argument("--embedder", default=None, choices=["sentence-transformers", "hashing"],
+                        help="KB retrieval embedder (default EMBEDDER)")
+    parser.add_argument("--stub-mt", action="store_true")
+    parser.add_argument("--stub-mt-ms", type=float, default=150.0)
+    parser.add_argument("--llm-ttft-ms", type=float, default=150.0)
+    parser.add_argument("--llm-token-ms", type=float, default=15.0)
+    parser.add_argument("--tts-ms", type=float, default=120.0)
+    parser.add_argument("--sms-ms", type=float, default=80.0)
+    parser.add_argument("--sms-error-rate", type=float, default=0.0, help="share of fake Twilio requests that fail")
+    parser.add_argument("--sms-rate", type=float, default=0.0, help="SMS_RATE_PER_NUMBER (0 = unlimited)")
+    parser.add_argument("--recording-ms", type=float, default=40.0)
+    parser.add_argument("--database-url", default=None, help="defaults to a scratch SQLite file")
+    parser.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    parser.add_argument("--baseline", default=None, help="earlier JSON result to compare against")
+    parser.add_argument("--regression-pct", type=float, default=10.0)
+    args = parser.parse_args(argv)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="callbench_")
+    fakes = FakeServices(
+        default_recordings(), ttft_ms=args.llm_ttft_ms, token_ms=args.llm_token_ms,
+        tts_ms=args.tts_ms, sms_ms=args.sms_ms, recording_ms=args.recording_ms,
+        sms_error_rate=args.sms_error_rate,
+    )
+    with fakes:
+        configure_env(fakes, workdir, args)
+        timer = StageTimer()
+        make_runner = telephony_runner if args.pipeline == "telephony" else celery_runner
+        rss_before = peak_rss_mb()
+        one_call = make_runner(fakes, timer, args)
+
+        # first call loads the models; not part of any level
+        started = time.perf_counter()
+        one_call(0)
+        warmup_s = time.perf_counter() - started
+        rss_warm = peak_rss_mb()
+
+        results = [run_level(one_call, timer, args.calls, c) for c in levels]
+        # SMS leave the call on the outbox queue; wait for them before counting
+        from app import outbox
+        started = time.perf_counter()
+        drained = outbox.get_outbox().flush(timeout=120)
+        sms_outbox = {**outbox.get_outbox().stats(), "drained": drained,
+                      "drain_seconds": round(time.perf_counter() - started, 3)}
+        fake_requests = dict(fakes.counters)
+
+    result = {
+        "benchmark": "call_pipeline",
+        "pipeline": args.pipeline,
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": vars(args),
+        "warmup_seconds": round(warmup_s, 3),
+        "rss_mb": {"before_models": rss_before, "after_warmup": rss_warm, "peak": peak_rss_mb()},
+        "levels": results,
+        "fake_requests": fake_requests,
+        "sms_outbox": sms_outbox,
+    }
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf8") as f:
+            result["regressions"] = compare(result, json.load(f), args.regression_pct)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf8") as f:
+            f.write(text + "\n")
+        print(f"[bench] wrote {args.out}")
+    else:
+        print(text)
+    if result.get("regressions"):
+        print(f"[bench] {len(result['regressions'])} regression(s) over {args.regression_pct}%", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# backend/bench/fakes.py
+"""
+Local stand-ins for the external services a call touches, served by one
+threaded HTTP server on 127.0.0.1:
+
+    GET  /recordings/<name>                       recording host (Twilio RecordingUrl)
+    POST /api/generate                            Ollama (streaming and non-streaming)
+    POST /2010-04-01/Accounts/<sid>/Messages.json Twilio SMS (TWILIO_API_BASE)
+    POST /tts                                     gTTS-like synthesis, returns mp3 bytes
+                                                  (tts_ms per 100 characters, as
+                                                  gTTS requests them one by one)
+
+Each route sleeps for a configurable latency so the benchmark sees realistic
+network waits without depending on the real services. Request counts are kept
+in FakeServices.counters; SMS bodies received are kept in FakeServices.sms,
+and sms_error_rate makes that share of SMS requests fail with a 503 or a
+429 so the outbox's retries are exercised.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+FAKE_ANSWER = (
+    "Banana leaf spot is caused by a fungus. "
+    "Remove and burn the infected leaves. "
+    "Spray mancozeb at 2.5 grams per litre of water every ten days. "
+    "Please contact your local Krishi Bhavan if it spreads."
+)
+
+_TWILIO_MESSAGES = re.compile(r"^/2010-04-01/Accounts/([^/]+)/Messages\.json$")
+
+
+class FakeServices:
+    def __init__(self, recordings: dict, answer: str = FAKE_ANSWER, ttft_ms: float = 150.0,
+                 token_ms: float = 15.0, tts_ms: float = 120.0, tts_bytes: int = 24000,
+                 sms_ms: float = 80.0, recording_ms: float = 40.0, sms_error_rate: float = 0.0):
+        """
+        recordings: name -> local file path served under /recordings/.
+        """
+        self.recordings = recordings
+        self.answer = answer
+        self.ttft = ttft_ms / 1000.0
+        self.token_delay = token_ms / 1000.0
+        self.tts_delay = tts_ms / 1000.0
+        self.tts_bytes = tts_bytes
+        self.sms_delay = sms_ms / 1000.0
+        self.sms_error_rate = sms_error_rate
+        self.recording_delay = recording_ms / 1000.0
+        self.counters = {"recordings": 0, "generate": 0, "sms": 0, "sms_errors": 0, "tts": 0}
+        self.sms = []   # (to, from, body) accepted, in arrival order
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # -- lifecycle ---------------------------------------------------------
+    def start(self):
+        services = self
+
+        class Handler(_Handler):
+            fakes = services
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-services")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def recording_url(self, name: str) -> str:
+        return f"{self.base_url}/recordings/{name}"
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            self.counters[key] += 1
+            return self.counters[key]
+
+    def answer_for(self, n: int) -> str:
+        # vary the first sentence per request so TTS and translation caches
+        # do not turn every call after the first into a hit
+        return f"Answer number {n}. {self.answer}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fakes = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status: int, obj):
+        self._send(status, json.dumps(obj).encode("utf8"), "application/json")
+
+    def do_GET(self):
+        fakes = self.fakes
+        if self.path.startswith("/recordings/"):
+            path = fakes.recordings.get(self.path[len("/recordings/"):])
+            if path is None:
+                return self._json(404, {"error": "no such recording"})
+            fakes.count("recordings")
+            time.sleep(fakes.recording_delay)
+            with open(path, "rb") as f:
+                data = f.read()
+            ctype = "audio/x-wav" if path.endswith(".wav") else "audio/mpeg"
+            return self._send(200, data, ctype)
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        fakes = self.fakes
+        body = self._body()
+        if self.path == "/api/generate":
+            return self._generate(json.loads(body or b"{}"))
+        m = _TWILIO_MESSAGES.match(self.path)
+        if m:
+            form = {k: v[0] for k, v in parse_qs(body.decode("utf8")).items()}
+            time.sleep(fakes.sms_delay)
+            if random.random() < fakes.sms_error_rate:
+                fakes.count("sms_errors")
+                status = random.choice((429, 503))
+                return self._json(status, {"code": 20429 if status == 429 else 20500, "status": status,
+                                           "message": "fake Twilio error"})
+            if len(form.get("Body") or "") > 1600:
+                return self._json(400, {"code": 21617, "status": 400, "message": "body exceeds 1600 characters"})
+            n = fakes.count("sms")
+            with fakes._lock:
+                fakes.sms.append((form.get("To"), form.get("From"), form.get("Body")))
+            return self._json(201, {
+                "sid": f"SM{n:032d}", "account_sid": m.group(1), "to": form.get("To"),
+                "from": form.get("From"), "body": form.get("Body"), "status": "queued",
+            })
+        if self.path == "/tts":
+            fakes.count("tts")
+            text = parse_qs(body.decode("utf8")).get("q", [""])[0]
+            time.sleep(fakes.tts_delay * max(1, -(-len(text) // 100)))
+            # ID3 header followed by silence-sized padding; players are not involved
+            return self._send(200, b"ID3" + b"\0" * max(0, fakes.tts_bytes - 3), "audio/mpeg")
+        self._json(404, {"error": "not found"})
+
+    def _generate(self, payload):
+        fakes = self.fakes
+        n = fakes.count("generate")
+        answer = fakes.answer_for(n)
+        model = payload.get("model", "fake")
+        if not payload.get("stream"):
+            time.sleep(fakes.ttft + fakes.token_delay * len(answer.split()))
+            return self._json(200, {"model": model, "response": answer, "done": True})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(obj):
+            line = (json.dumps(obj) + "\n").encode("utf8")
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+        time.sleep(fakes.ttft)
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            chunk({"model": model, "response": word if i == 0 else " " + word, "done": False})
+            time.sleep(fakes.token_delay)
+        chunk({"model": model, "response": "", "done": True})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def default_recordings() -> dict:
+    """
+    {"sample_malayalam.wav": <repo>/examples/sample_malayalam.wav}
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    repo_root = os.path.abspath(os.path.join(here, "..", "..", ".."))
+    path = os.path.join(repo_root, "examples", "sample_malayalam.wav")
+    return {"sample_malayalam.wav": path}
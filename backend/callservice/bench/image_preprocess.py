@@ -0,0 +1,117 @@
+# backend/bench/image_preprocess.py
+"""
+Crop-photo preprocessing: draft-mode decode into reused buffers vs the old
+full decode + resize + astype/255 + expand_dims path.
+
+    cd backend/callservice
+    python -m bench.image_preprocess --megapixels 12 --images 8 --repeat 3
+    python -m bench.image_preprocess --input photo1.jpg --input photo2.jpg
+
+Inputs are synthetic phone-sized JPEGs unless --input is given. Each image
+is opened from its encoded bytes for every run, as it would arrive from the
+WhatsApp side. Reports ms per image for the legacy path, the new path to a
+float32 NHWC/NCHW tensor and the uint8 path, plus the mean absolute
+difference between the legacy and new float tensors.
+"""
+import argparse
+import io
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.services import image_model
+
+
+def legacy_preprocess(img: Image.Image, target_size=image_model.DEFAULT_TARGET_SIZE) -> np.ndarray:
+    # the pre-batching image_model._preprocess_image
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img = img.resize(target_size, Image.BILINEAR)
+    arr = np.asarray(img).astype("float32") / 255.0
+    return np.expand_dims(arr, axis=0)
+
+
+def synthetic_jpeg(megapixels: float, seed: int) -> bytes:
+    """
+    A smooth gradient with texture, so it compresses like a photo rather
+    than like noise.
+    """
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    base = np.stack([x / w, y / h, (x + y) / (w + h)], axis=-1) * 200
+    texture = rng.normal(0, 12, size=(h // 8 + 1, w // 8 + 1, 3)).repeat(8, 0).repeat(8, 1)[:h, :w]
+    pixels = np.clip(base + texture, 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _timed(fn, blobs, repeat: int) -> float:
+    fn(blobs[:1])   # warm up buffers outside the measurement
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(blobs)
+    return (time.perf_counter() - started) * 1000.0 / (repeat * len(blobs))
+
+
+def run(blobs, repeat: int, target_size) -> dict:
+    open_all = lambda bs: [Image.open(io.BytesIO(b)) for b in bs]
+
+    def legacy(bs):
+        return [legacy_preprocess(img, target_size) for img in open_all(bs)]
+
+    def fast(layout, dtype):
+        return lambda bs: image_model.preprocess_batch(open_all(bs), target_size=target_size, layout=layout, dtype=dtype)
+
+    result = {
+        "images": len(blobs),
+        "mean_jpeg_kb": round(sum(len(b) for b in blobs) / len(blobs) / 1024, 1),
+        "size": Image.open(io.BytesIO(blobs[0])).size,
+        "ms_per_image": {
+            "legacy": round(_timed(legacy, blobs, repeat), 2),
+            "fast_float32_nhwc": round(_timed(fast("NHWC", np.float32), blobs, repeat), 2),
+            "fast_float32_nchw": round(_timed(fast("NCHW", np.float32), blobs, repeat), 2),
+            "fast_uint8_nhwc": round(_timed(fast("NHWC", np.uint8), blobs, repeat), 2),
+        },
+    }
+    result["speedup"] = round(result["ms_per_image"]["legacy"] / result["ms_per_image"]["fast_float32_nhwc"], 1)
+
+    old = np.concatenate(legacy(blobs))
+    new = fast("NHWC", np.float32)(blobs)
+    # draft decode averages pixels in the DCT domain, so values differ slightly
+    result["mean_abs_diff_vs_legacy"] = round(float(np.mean(np.abs(old - new))), 4)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", action="append", help="JPEG file (repeatable); default: synthetic photos")
+    parser.add_argument("--megapixels", type=float, default=12.0)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--size", type=int, default=224, help="square model input size")
+    parser.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        blobs = []
+        for path in args.input:
+            with open(path, "rb") as f:
+                blobs.append(f.read())
+    else:
+        blobs = [synthetic_jpeg(args.megapixels, seed) for seed in range(args.images)]
+
+    text = json.dumps(run(blobs, args.repeat, (args.size, args.size)), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# backend/bench/image_quantization.py
+"""
+Accuracy and latency of ONNX crop-model variants against the float model.
+
+    cd backend/callservice
+    python -m bench.image_quantization --model-dir ../../ml/image/exported_model
+    python -m bench.image_quantization --model-dir ... --images-dir crops/ --threads 1,4
+
+Compares model.onnx with each --variant present in --model-dir (default
+model.opt.onnx and model.int8.onnx, as written by ml/image/export.py). Every
+variant sees the same preprocessed batches, built with image_model's
+preprocessing for that model's input layout. Reports:
+
+- agreement:    share of images whose top-1 class matches the float model's
+- prob_diff:    mean / max absolute difference of softmax probabilities
+- accuracy:     top-1 accuracy when --images-dir has one subfolder per label
+                (matched against labels.txt / labels.json in --model-dir)
+- ms_per_image: per batch size and intra-op thread count
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from app.services import image_model
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def load_images(images_dir: str, limit: int):
+    """
+    [(PIL image, label or None)] from images_dir, labelled by subfolder name.
+    """
+    root = Path(images_dir)
+    paths = sorted(p for p in root.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)[:limit]
+    return [(Image.open(p), p.parent.name if p.parent != root else None) for p in paths]
+
+
+def synthetic_images(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [(Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)), None) for _ in range(count)]
+
+
+def _inputs_for(sess, images, batch_size: int):
+    inp = sess.get_inputs()[0]
+    layout, (h, w) = image_model._input_spec(inp.shape)
+    dtype = np.uint8 if inp.type == "tensor(uint8)" else np.float32
+    if inp.shape and inp.shape[0] == 1:
+        batch_size = 1
+    return [
+        image_model.preprocess_batch(images[i:i + batch_size], target_size=(w, h), layout=layout, dtype=dtype).copy()
+        for i in range(0, len(images), batch_size)
+    ]
+
+
+def _probs(sess, batches) -> np.ndarray:
+    name, out = sess.get_inputs()[0].name, sess.get_outputs()[0].name
+    return np.concatenate([image_model._softmax(sess.run([out], {name: b})[0].reshape(len(b), -1)) for b in batches])
+
+
+def _latency(sess, batches, repeat: int) -> float:
+    name, out = sess.get_inputs()[0].name, sess.get_outputs()[0].name
+    sess.run([out], {name: batches[0]})   # warm up
+    images = sum(len(b) for b in batches) * repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for b in batches:
+            sess.run([out], {name: b})
+    return round((time.perf_counter() - started) * 1000.0 / images, 3)
+
+
+def run(model_dir: Path, variants, samples, batch_sizes, thread_counts, repeat: int) -> dict:
+    images = [img for img, _ in samples]
+    truth = [label for _, label in samples]
+    labels = image_model._load_labels(str(model_dir))
+    models = {"model.onnx": model_dir / "model.onnx"}
+    models.update({v: model_dir / v for v in variants if (model_dir / v).exists()})
+
+    result = {"images": len(images), "models": {}}
+    reference = None
+    for name, path in models.items():
+        sess = image_model.create_onnx_session(str(path), image_model.session_options(optimized_model_path=""))
+        probs = _probs(sess, _inputs_for(sess, images, max(batch_sizes)))
+        top1 = probs.argmax(axis=1)
+        entry = {"mb": round(path.stat().st_size / 1e6, 2)}
+        if reference is None:
+            reference = (probs, top1)
+        else:
+            diff = np.abs(probs - reference[0])
+            entry["agreement"] = round(float(np.mean(top1 == reference[1])), 4)
+            entry["prob_diff"] = {"mean": round(float(diff.mean()), 5), "max": round(float(diff.max()), 5)}
+        if any(truth):
+            known = [(i, t) for i, t in enumerate(truth) if t is not None]
+            entry["accuracy"] = round(sum(labels[top1[i]] == t for i, t in known) / len(known), 4)
+
+        entry["ms_per_image"] = {}
+        for threads in thread_counts:
+            timed = image_model.create_onnx_session(
+                str(path), image_model.session_options(intra_op_threads=threads, optimized_model_path="")
+            )
+            for batch_size in batch_sizes:
+                key = f"threads={threads or 'default'},batch={batch_size}"
+                entry["ms_per_image"][key] = _latency(timed, _inputs_for(timed, images, batch_size), repeat)
+        result["models"][name] = entry
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", default=image_model.MODEL_DIR)
+    parser.add_argument("--variant", action="append", help="ONNX file in --model-dir to compare (repeatable)")
+    parser.add_argument("--images-dir", default=None, help="images, optionally in one subfolder per label")
+    parser.add_argument("--limit", type=int, default=500, help="max images read from --images-dir")
+    parser.add_argument("--synthetic", type=int, default=64, help="random images when --images-dir is not given")
+    parser.add_argument("--batch-sizes", default="1,16")
+    parser.add_argument("--threads", default="0", help="comma-separated intra-op thread counts; 0 = ORT default")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    samples = load_images(args.images_dir, args.limit) if args.images_dir else synthetic_images(args.synthetic)
+    result = run(
+        Path(args.model_dir),
+        args.variant or ["model.opt.onnx", "model.int8.onnx"],
+        samples,
+        [int(b) for b in args.batch_sizes.split(",") if b.strip()],
+        [int(t) for t in args.threads.split(",") if t.strip()],
+        args.repeat,
+    )
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# backend/bench/startup_profile.py
+"""
+Import-time profile of each process entry point.
+
+    cd backend/callservice
+    python -m bench.startup_profile
+    python -m bench.startup_profile --target app.main --top 15
+
+Imports each --target in a fresh interpreter under `python -X importtime`
+and reports the total import time, the slowest top-level packages (their
+modules' own import time, summed) and which heavy backends were imported eagerly. A backend that
+shows up here is paid for by every process that imports the target, whether
+or not it serves that backend; app.services.lazy defers them to first use.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+DEFAULT_TARGETS = ["app.main", "worker.tasks"]
+HEAVY = ["tensorflow", "torch", "transformers", "faster_whisper", "whisper", "onnxruntime",
+         "gtts", "matplotlib", "sentence_transformers", "faiss"]
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)")
+
+
+def profile(target: str) -> dict:
+    env = dict(os.environ, TRACE_LOG="0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True, env=env,
+    )
+    packages, modules, total_us = {}, set(), 0
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        self_us, name = int(m.group(1)), m.group(2)
+        modules.add(name)
+        total_us += self_us
+        # self time summed per top-level package: where the import time goes
+        top = name.split(".")[0]
+        packages[top] = packages.get(top, 0) + self_us
+    result = {
+        "target": target,
+        "ok": proc.returncode == 0,
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(modules),
+        "packages_ms": {k: round(v / 1000, 1) for k, v in sorted(packages.items(), key=lambda kv: -kv[1])},
+        "heavy_imported": [h for h in HEAVY if h in modules],
+    }
+    if proc.returncode != 0:
+        result["error"] = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", action="append", help="module to import (repeatable); default: api and worker")
+    parser.add_argument("--top", type=int, default=10, help="slowest packages to list per target")
+    parser.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    for target in args.target or DEFAULT_TARGETS:
+        result = profile(target)
+        result["packages_ms"] = dict(list(result["packages_ms"].items())[: args.top])
+        results.append(result)
+
+    text = json.dumps({"results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# backend/bench/translation_throughput.py
+"""
+Throughput of the batched translation engine vs one generate() per sentence.
+
+    cd backend/callservice
+    python -m bench.translation_throughput --callers 8 --max-batch 16 --max-wait-ms 10
+
+Downloads the Helsinki MarianMT model on first run. Reports sentences/second
+for both paths and checks that the batched output matches the unbatched one.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.translation_engine import TranslationEngine, configure_threads
+from app.services.translator import _load_model_pair
+
+ADVISORY_EN = [
+    "Banana leaf spot is caused by a fungus.",
+    "Spray mancozeb at 2.5 grams per litre of water every ten days.",
+    "Remove and burn the infected leaves.",
+    "Do not use the same fungicide again and again.",
+    "Test your soil before applying fertilizer.",
+    "Apply the first dose of fertilizer one month after planting.",
+    "Keep the field well drained during the monsoon.",
+    "Please contact your local Krishi Bhavan for seeds and advice.",
+    "Water the plants early in the morning or in the evening.",
+    "Send us a photo of the leaf so we can identify the disease.",
+]
+
+
+def run(direction: str, callers: int, rounds: int, max_batch: int, max_wait_ms: float, threads: int):
+    configure_threads(threads)
+    tok, model = _load_model_pair(direction)
+    sentences = ADVISORY_EN * rounds
+    engine = TranslationEngine(tok, model, max_batch_size=max_batch, max_wait_ms=max_wait_ms)
+
+    # warm both paths so model init is not measured
+    engine.translate_batch(sentences[:2])
+
+    started = time.perf_counter()
+    unbatched = [engine.translate_batch([s])[0] for s in sentences]
+    unbatched_s = time.perf_counter() - started
+
+    # every sentence comes from its own caller thread, like concurrent phone
+    # calls each translating their own answer
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        batched = list(pool.map(lambda s: engine.translate_sentences([s])[0], sentences))
+    batched_s = time.perf_counter() - started
+
+    mismatches = [s for s, a, b in zip(sentences, unbatched, batched) if a != b]
+    engine.close()
+    return {
+        "direction": direction,
+        "sentences": len(sentences),
+        "callers": callers,
+        "max_batch": max_batch,
+        "max_wait_ms": max_wait_ms,
+        "threads": threads,
+        "unbatched_seconds": round(unbatched_s, 3),
+        "batched_seconds": round(batched_s, 3),
+        "unbatched_sentences_per_s": round(len(sentences) / unbatched_s, 2),
+        "batched_sentences_per_s": round(len(sentences) / batched_s, 2),
+        "speedup": round(unbatched_s / batched_s, 2),
+        "engine": engine.stats(),
+        "mismatched_sentences": mismatches,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--direction", default="en-ml", choices=["en-ml"])
+    parser.add_argument("--callers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--threads", type=int, default=0)
+    args = parser.parse_args()
+    res = run(args.direction, args.callers, args.rounds, args.max_batch, args.max_wait_ms, args.threads)
+    print(json.dumps(res, indent=2, ensure_ascii=False))
@@ -1,9 +1,46 @@
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 import os
 
 broker = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 backend = os.environ.get('CELERY_RESULT_BACKEND', broker)
-celery = Celery('krishi_worker', broker=broker, backend=backend)
+celery = Celery('krishi_worker', broker=broker, backend=backend, include=['worker.tasks'])
+# one queue per call pipeline stage, so CPU-bound ASR and I/O-bound
+# notify/synthesize workers can be scaled independently
+CALL_STAGE_TASKS = {
+    'fetch': 'worker.tasks.fetch_recording',
+    'transcribe': 'worker.tasks.transcribe_recording',
+    'answer': 'worker.tasks.answer_question',
+    'translate': 'worker.tasks.translate_answer',
+    'synthesize': 'worker.tasks.synthesize_answer',
+    'notify': 'worker.tasks.notify_caller',
+    'persist': 'worker.tasks.persist_record',
+}
+CALL_STAGE_QUEUES = [f'calls.{stage}' for stage in CALL_STAGE_TASKS]
 celery.conf.task_routes = {
-    'worker.tasks.process_incoming_call': {'queue': 'calls'}
+    'worker.tasks.process_incoming_call': {'queue': 'calls.fetch'},
+    'worker.tasks.call_failed': {'queue': 'calls.notify'},
+    **{name: {'queue': f'calls.{stage}'} for stage, name in CALL_STAGE_TASKS.items()},
 }
+# STARTED lets /calls/{sid} tell queued from running jobs
+celery.conf.task_track_started = True
+# CELERY_TASK_ALWAYS_EAGER=1 runs tasks inline (tests, no broker needed)
+celery.conf.task_always_eager = os.environ.get('CELERY_TASK_ALWAYS_EAGER', '0') == '1'
+celery.conf.task_store_eager_result = celery.conf.task_always_eager
+
+
+@worker_process_init.connect
+def warm_models(**kwargs):
+    # each prefork child keeps its own models for the life of the process;
+    # set PRELOAD_WORKER per deployment to match the queues it consumes
+    from app.services import preload
+    preload.preload("worker", background=False)
+
+
+@worker_process_shutdown.connect
+def flush_records(**kwargs):
+    # prefork children exit without running atexit; flush queued call records
+    # and outbound SMS here
+    from app import outbox, recorder
+    recorder.shutdown()
+    outbox.shutdown()
@@ -1,33 +1,202 @@
-from .celery_app import celery
-import tempfile
+from .celery_app import celery, CALL_STAGE_TASKS
 import os
-from ..app.services.asr import transcribe_audio
-from ..app.services.llm_rag import generate_answer
-from ..app.services.notifier import send_sms, make_call_with_tts
-from ..app.models import save_query_record
-from ..app.utils import download_url_to_file
+import re
+import tempfile
+import uuid
+import requests
+from celery import chain
+from app.services.asr import transcribe_audio
+from app.services.llm_rag import generate_answer
+from app.services.translator import en_to_ml
+from app.services.notifier import save_tts, send_sms_stub as send_sms
+from app.services.tracing import correlation
+from app.models import save_query_record
+from app.utils import download_url_to_file
+from app import prompts
 
-@celery.task(bind=True)
-def process_incoming_call(self, recording_url, caller):
+# Recordings are downloaded here and handed between stages by path, so every
+# worker host must see the same directory (shared volume).
+CALL_SPOOL_DIR = os.environ.get("CALL_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "callservice-spool"))
+
+# Every stage task takes and returns the call state dict below. It only holds
+# small JSON values: audio travels as a spool path or an audio-store URL.
+#   call_sid, caller, recording_url, beam_size, audio_path, question, confidence,
+#   answer, sources, answer_ml, play_urls, fallback, record_id, status
+# The question is the Malayalam transcript (asr.transcribe_audio) and the
+# answer comes from the RAG pipeline (llm_rag.generate_answer).
+
+_MALAYALAM = re.compile(r"[\u0D00-\u0D7F]")
+_LETTER = re.compile(r"[^\W\d_]")
+
+
+def _is_malayalam(text: str) -> bool:
+    # the RAG prompt asks for Malayalam, but small models often answer in English
+    letters = len(_LETTER.findall(text or ""))
+    return bool(letters) and len(_MALAYALAM.findall(text)) >= letters / 2
+
+
+def _enter(task, state, stage):
+    # progress under the CallSid (the id of the chain's last task) for /calls/{sid}
     try:
-        tmpf = tempfile.NamedTemporaryFile(suffix=".wav", delete=False).name
-        download_url_to_file(recording_url, tmpf)
-        # Transcribe
-        text, conf = transcribe_audio(tmpf, language='ml')
-        if not text:
-            answer = "ക്ഷമിക്കണം, നിങ്ങളുടെ ശബ്ദം തിരിച്ചറിയാനായില്ല. ദയവായി വീണ്ടും വിളിക്കൂ അല്ലെങ്കിൽ SMS വഴി അറിയിക്കുക."
-            send_sms(caller, answer)
-            make_call_with_tts(caller, answer)
-            save_query_record(caller, text, answer, [], confidence=conf)
-            return {"status": "failed_transcribe"}
-        # Generate answer
-        answer, sources = generate_answer(text, caller)
-        # Store in DB
-        rec = save_query_record(caller, text, answer, sources, confidence=conf)
-        # Notify
-        send_sms(caller, answer)
-        make_call_with_tts(caller, answer)
-        return {"status": "ok", "id": rec.id}
+        task.update_state(task_id=state["call_sid"], state="STARTED", meta={"stage": stage})
     except Exception as e:
-        print("Error processing call:", e)
-        return {"status":"error","error":str(e)}
+        print("[worker] could not record stage:", e)
+
+
+def _remove(path):
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@celery.task(bind=True, autoretry_for=(requests.RequestException,), retry_backoff=True, max_retries=3)
+def fetch_recording(self, state):
+    _enter(self, state, "fetch")
+    with correlation(state["call_sid"]):
+        if not state.get("recording_url"):
+            return {**state, "fallback": True, "answer_ml": prompts.NO_RECORDING}
+        dest = os.path.join(CALL_SPOOL_DIR, f"{state['call_sid']}.audio")
+        download_url_to_file(state["recording_url"], dest)
+        return {**state, "audio_path": dest}
+
+
+@celery.task(bind=True)
+def transcribe_recording(self, state):
+    _enter(self, state, "transcribe")
+    if state.get("fallback"):
+        return state
+    with correlation(state["call_sid"]):
+        try:
+            question, confidence = transcribe_audio(
+                state["audio_path"], language="ml", beam_size=state.get("beam_size")
+            )
+        finally:
+            _remove(state["audio_path"])
+    print("[TRANSCRIBED]:", question)
+    state = {**state, "audio_path": None, "question": question, "confidence": confidence}
+    if not question.strip():
+        return {**state, "fallback": True, "answer_ml": prompts.UNCLEAR_AUDIO}
+    return state
+
+
+@celery.task(bind=True)
+def answer_question(self, state):
+    _enter(self, state, "answer")
+    if state.get("fallback"):
+        return state
+    with correlation(state["call_sid"]):
+        answer, sources = generate_answer(state["question"], state["caller"])
+    print("[RAG ANSWER]:", answer)
+    return {**state, "answer": answer, "sources": sources}
+
+
+@celery.task(bind=True)
+def translate_answer(self, state):
+    _enter(self, state, "translate")
+    if state.get("fallback"):
+        return state
+    answer = state["answer"]
+    if _is_malayalam(answer):
+        return {**state, "answer_ml": answer}
+    with correlation(state["call_sid"]):
+        try:
+            answer_ml = en_to_ml(answer)
+        except Exception as e:
+            print("[TRANSLATION ERROR]", e)
+            answer_ml = answer  # best effort
+    return {**state, "answer_ml": answer_ml}
+
+
+@celery.task(bind=True)
+def synthesize_answer(self, state):
+    _enter(self, state, "synthesize")
+    with correlation(state["call_sid"]):
+        try:
+            _, play_url = save_tts(state["caller"], state["answer_ml"])
+        except Exception as e:
+            print("[TTS SAVE ERROR]", e)
+            play_url = None
+    return {**state, "play_urls": [play_url]}
+
+
+@celery.task(bind=True, autoretry_for=(requests.RequestException,), retry_backoff=True, max_retries=3)
+def notify_caller(self, state):
+    _enter(self, state, "notify")
+    answer_ml = state["answer_ml"]
+    with correlation(state["call_sid"]):
+        send_sms(state["caller"], answer_ml if state.get("fallback") else prompts.SMS_ANSWER.format(answer=answer_ml))
+    return state
+
+
+@celery.task(bind=True)
+def persist_record(self, state):
+    _enter(self, state, "persist")
+    with correlation(state["call_sid"]):
+        rec = save_query_record(
+            state["caller"],
+            state.get("question", ""),
+            state["answer_ml"],
+            state.get("sources", []),
+            confidence=state.get("confidence", 0.0),
+        )
+    print("[CALL HANDLED] play_urls:", state.get("play_urls"))
+    status = "fallback" if state.get("fallback") else "ok"
+    return {**state, "record_id": rec.id, "status": status}
+
+
+@celery.task
+def call_failed(request, exc, traceback):
+    """
+    Error callback of the call chain: tell the caller we could not process it.
+    """
+    state = request.args[0] if request.args else {}
+    call_sid, caller = state.get("call_sid"), state.get("caller", "unknown")
+    print(f"[ERROR] call {call_sid} failed in {request.task}:", exc)
+    _remove(state.get("audio_path"))
+    try:
+        with correlation(call_sid):
+            fallback = prompts.PROCESSING_FAILED
+            save_tts(caller, fallback)
+            send_sms(caller, fallback)
+            save_query_record(caller, state.get("question", ""), fallback, [], confidence=0.0)
+    except Exception:
+        pass
+    if call_sid:
+        celery.backend.mark_as_failure(call_sid, exc)
+
+
+def build_call_chain(state: dict):
+    """
+    fetch -> transcribe -> answer -> translate -> synthesize -> notify -> persist,
+    each on its own queue. The last task's id is the CallSid, so the chain's
+    result (and /calls/{sid}) can be looked up by CallSid.
+    """
+    sigs = [celery.signature(name) for name in CALL_STAGE_TASKS.values()]
+    sigs[0] = sigs[0].clone(args=(state,))
+    sigs[-1] = sigs[-1].set(task_id=state["call_sid"])
+    return chain(*sigs).on_error(call_failed.s())
+
+
+def start_call_pipeline(payload: dict, priority: int = 0):
+    """
+    Queue the stage chain for one call webhook payload (From, RecordingUrl, CallSid).
+    """
+    state = {
+        "call_sid": payload.get("CallSid") or payload.get("call_sid") or f"local-{uuid.uuid4().hex}",
+        "caller": payload.get("From") or payload.get("from") or "unknown",
+        "recording_url": payload.get("RecordingUrl") or payload.get("recording_url"),
+        "beam_size": payload.get("beam_size"),
+    }
+    print("[CALL WEBHOOK] caller:", state["caller"], "recording_url:", state["recording_url"])
+    return build_call_chain(state).apply_async(priority=priority)
+
+
+@celery.task
+def process_incoming_call(recording_url, caller):
+    """
+    Kept for existing callers: starts the stage chain for one recording.
+    """
+    res = start_call_pipeline({"RecordingUrl": recording_url, "From": caller})
+    return {"status": "queued", "id": res.id}
@@ -0,0 +1,74 @@
+-- infra/postgres/init.sql
+-- Schema for the call service. Mirrors backend/callservice/app/models.py;
+-- init_db() creates the same objects on SQLite and on an existing database.
+
+CREATE TABLE IF NOT EXISTS query_records (
+    id          SERIAL PRIMARY KEY,
+    caller      VARCHAR(64),
+    question    TEXT,
+    answer      TEXT,
+    sources     TEXT,
+    created_at  TIMESTAMP WITHOUT TIME ZONE DEFAULT (now() AT TIME ZONE 'utc'),
+    confidence  DOUBLE PRECISION DEFAULT 0.0
+);
+
+CREATE INDEX IF NOT EXISTS ix_query_records_id ON query_records (id);
+CREATE INDEX IF NOT EXISTS ix_query_records_caller ON query_records (caller);
+
+-- keyset pagination of /queries: ORDER BY created_at DESC, id DESC with a
+-- (created_at, id) < (:created_at, :id) seek, optionally per caller
+CREATE INDEX IF NOT EXISTS ix_query_records_created_at_id ON query_records (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_query_records_caller_created_at_id ON query_records (caller, created_at, id);
+
+-- hi/lo id allocation: writers reserve blocks of query_records ids here and
+-- insert rows with explicit ids (app/recorder.py). The SERIAL sequence above
+-- does not hand out the service's ids; models.allocate_id_block setval()s it
+-- past each reserved block so rows inserted without an id still get a free one
+CREATE TABLE IF NOT EXISTS id_blocks (
+    name     VARCHAR(64) PRIMARY KEY,
+    next_id  INTEGER NOT NULL
+);
+
+-- analytics rollups for /stats, upserted with each batch of query_records
+-- (app/rollups.py); rebuild with `python -m app.rollups rebuild`
+CREATE TABLE IF NOT EXISTS query_rollups (
+    granularity     VARCHAR(8)  NOT NULL,
+    bucket          TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    region          VARCHAR(16) NOT NULL,
+    topic           VARCHAR(32) NOT NULL,
+    queries         INTEGER NOT NULL DEFAULT 0,
+    confidence_sum  DOUBLE PRECISION NOT NULL DEFAULT 0.0,
+    PRIMARY KEY (granularity, bucket, region, topic)
+);
+
+CREATE TABLE IF NOT EXISTS question_clusters (
+    day      TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    cluster  VARCHAR(128) NOT NULL,
+    topic    VARCHAR(32),
+    example  TEXT,
+    queries  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, cluster)
+);
+CREATE INDEX IF NOT EXISTS ix_question_clusters_day_queries ON question_clusters (day, queries);
+
+-- outbound SMS parts and their delivery state (app/outbox.py); Twilio's
+-- status callback updates rows by sid
+CREATE TABLE IF NOT EXISTS sms_deliveries (
+    id           SERIAL PRIMARY KEY,
+    message_id   VARCHAR(32),
+    part         INTEGER NOT NULL DEFAULT 1,
+    parts        INTEGER NOT NULL DEFAULT 1,
+    to_number    VARCHAR(64) NOT NULL,
+    from_number  VARCHAR(64),
+    body         TEXT,
+    encoding     VARCHAR(8),
+    segments     INTEGER NOT NULL DEFAULT 1,
+    status       VARCHAR(16) NOT NULL DEFAULT 'sending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    sid          VARCHAR(64) UNIQUE,
+    error        TEXT,
+    created_at   TIMESTAMP WITHOUT TIME ZONE,
+    updated_at   TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_sms_deliveries_message_id ON sms_deliveries (message_id);
+CREATE INDEX IF NOT EXISTS ix_sms_deliveries_to_created_at ON sms_deliveries (to_number, created_at);
@@ -0,0 +1,143 @@
+# ml/image/export.py
+"""
+Export the crop classifier for CPU serving with ONNX Runtime.
+
+    python ml/image/export.py --model-dir ml/image/exported_model
+    python ml/image/export.py --model-dir ml/image/exported_model --skip-int8
+
+Writes next to the model (or into --out-dir):
+
+- model.onnx       float32 graph, converted from the Keras SavedModel with
+                   tf2onnx unless it already exists (--force reconverts)
+- model.opt.onnx   the same graph after ORT's offline graph optimizations
+                   (--opt-level, default "extended": portable across CPUs)
+- model.int8.onnx  dynamically quantized INT8 weights (activations are
+                   quantized at run time, so no calibration set is needed).
+                   ORT's integer convolutions can be slower than float ones on
+                   some CPUs; --op-types MatMul,Gemm quantizes only the dense
+                   layers
+- export.json      sizes and settings of what was written
+
+Serve a variant with IMAGE_BACKENDS=onnx IMAGE_ONNX_FILE=model.int8.onnx and
+compare it with the float model first:
+
+    cd backend/callservice
+    python -m bench.image_quantization --model-dir ../../ml/image/exported_model --images-dir crops/
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+OPT_LEVELS = {
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",   # adds layout transforms specific to this machine's CPU
+}
+
+
+def convert_keras(model_dir: Path, out_path: Path, opset: int) -> Path:
+    """
+    Keras SavedModel -> ONNX with a dynamic batch dimension.
+    """
+    try:
+        import tensorflow as tf
+        import tf2onnx
+    except ImportError as e:
+        raise SystemExit(f"converting from Keras needs tensorflow and tf2onnx ({e}); "
+                         f"or place an existing model.onnx in {model_dir}")
+    model = tf.keras.models.load_model(str(model_dir))
+    spec = [tf.TensorSpec((None,) + tuple(model.input_shape[1:]), model.inputs[0].dtype, name="input")]
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=str(out_path))
+    return out_path
+
+
+def optimize(src: Path, out_path: Path, level: str) -> Path:
+    """
+    Run ORT's graph optimizations once and save the result, so serving
+    processes can load it with optimizations disabled.
+    """
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = getattr(ort.GraphOptimizationLevel, OPT_LEVELS[level])
+    opts.optimized_model_filepath = str(out_path)
+    ort.InferenceSession(str(src), sess_options=opts, providers=["CPUExecutionProvider"])
+    return out_path
+
+
+def quantize_int8(src: Path, out_path: Path, per_channel: bool, op_types=None) -> Path:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    source = src
+    try:
+        # shape inference + constant folding first gives the quantizer more to work with
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        prepped = out_path.with_name(out_path.stem + ".pre.onnx")
+        quant_pre_process(str(src), str(prepped), skip_symbolic_shape=True)
+        source = prepped
+    except Exception as e:
+        print(f"[export] quantization pre-processing skipped: {e}")
+    try:
+        quantize_dynamic(str(source), str(out_path), weight_type=QuantType.QInt8, per_channel=per_channel,
+                         op_types_to_quantize=op_types or None)
+    finally:
+        if source != src:
+            os.remove(source)
+    return out_path
+
+
+def _mb(path: Path) -> float:
+    return round(path.stat().st_size / 1e6, 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", default="ml/image/exported_model", help="Keras SavedModel and/or model.onnx")
+    parser.add_argument("--out-dir", default=None, help="default: --model-dir")
+    parser.add_argument("--opset", type=int, default=13)
+    parser.add_argument("--opt-level", choices=sorted(OPT_LEVELS), default="extended")
+    parser.add_argument("--per-channel", action="store_true", help="per-channel INT8 weight scales")
+    parser.add_argument("--op-types", default="", help="comma-separated op types to quantize; default: all supported")
+    parser.add_argument("--skip-opt", action="store_true")
+    parser.add_argument("--skip-int8", action="store_true")
+    parser.add_argument("--force", action="store_true", help="reconvert model.onnx even if it exists")
+    args = parser.parse_args(argv)
+
+    model_dir = Path(args.model_dir)
+    out_dir = Path(args.out_dir or model_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    fp32 = out_dir / "model.onnx"
+    if args.force or not fp32.exists():
+        existing = model_dir / "model.onnx"
+        if existing.exists() and not args.force and existing != fp32:
+            shutil.copyfile(existing, fp32)
+        else:
+            print(f"[export] converting {model_dir} -> {fp32}")
+            convert_keras(model_dir, fp32, args.opset)
+    for labels in ("labels.txt", "labels.json"):
+        if (model_dir / labels).exists() and model_dir != out_dir:
+            shutil.copyfile(model_dir / labels, out_dir / labels)
+
+    written = {"model.onnx": {"mb": _mb(fp32)}}
+    if not args.skip_opt:
+        path = optimize(fp32, out_dir / "model.opt.onnx", args.opt_level)
+        written[path.name] = {"mb": _mb(path), "opt_level": args.opt_level}
+        print(f"[export] optimized graph -> {path}")
+    if not args.skip_int8:
+        op_types = [t.strip() for t in args.op_types.split(",") if t.strip()]
+        path = quantize_int8(fp32, out_dir / "model.int8.onnx", args.per_channel, op_types)
+        written[path.name] = {"mb": _mb(path), "per_channel": args.per_channel, "op_types": op_types or "all"}
+        print(f"[export] int8 model -> {path}")
+
+    with open(out_dir / "export.json", "w") as f:
+        json.dump(written, f, indent=2)
+    json.dump(written, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
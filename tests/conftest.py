@@ -0,0 +1,153 @@
+# tests/conftest.py
+"""
+Shared setup for the callservice tests.
+
+The app reads its configuration from the environment at import time, so the
+scratch database, audio and cache paths are set here before any test module
+imports it. LocalServer is a threaded HTTP server on 127.0.0.1 whose routes
+each test scripts, standing in for Ollama, Twilio or a recording host.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CALLSERVICE = os.path.join(REPO_ROOT, "backend", "callservice")
+SAMPLE_WAV = os.path.join(REPO_ROOT, "examples", "sample_malayalam.wav")
+
+_scratch = tempfile.mkdtemp(prefix="callservice-tests-")
+for key, value in {
+    "DATABASE_URL": f"sqlite:///{os.path.join(_scratch, 'test.db')}",
+    "TTS_DIR": os.path.join(_scratch, "tts"),
+    "TRANSLATION_CACHE_PATH": os.path.join(_scratch, "translation_cache.sqlite3"),
+    "KB_DIR": os.path.join(_scratch, "kb"),
+    "KB_INDEX_DIR": os.path.join(_scratch, "kb_index"),
+    "EMBEDDER": "hashing",
+    "CALL_SPOOL_DIR": os.path.join(_scratch, "spool"),
+    "CELERY_BROKER_URL": "memory://",
+    "CELERY_RESULT_BACKEND": "cache+memory://",
+    "CELERY_TASK_ALWAYS_EAGER": "1",
+    "TRACE_LOG": "0",
+}.items():
+    os.environ.setdefault(key, value)
+
+if CALLSERVICE not in sys.path:
+    sys.path.insert(0, CALLSERVICE)
+
+
+class _QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # clients that hang up early (size limits, timeouts) are expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class LocalServer:
+    """
+    routes: (method, path) -> fn(request) returning (status, headers, body),
+    where body is bytes, a str, or a JSON-serialisable object. A route may
+    instead write the response itself through request.handler and return
+    None (streaming). Every request is appended to .requests.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.connections = set()
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                path = self.path.split("?", 1)[0]
+                request = Request(self, self.command, path, body)
+                with server._lock:
+                    server.requests.append(request)
+                    server.connections.add(self.client_address)
+                route = server.routes.get((self.command, path))
+                if route is None:
+                    return self._reply(404, {}, {"error": "not found"})
+                out = route(request)
+                if out is not None:
+                    self._reply(*out)
+
+            def _reply(self, status, headers, body):
+                if isinstance(body, str):
+                    body = body.encode("utf8")
+                elif not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf8")
+                    headers = {"Content-Type": "application/json", **headers}
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _handle
+
+        self._server = _QuietServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def route(self, method: str, path: str, fn):
+        self.routes[(method, path)] = fn
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class Request:
+    def __init__(self, handler, method, path, body):
+        self.handler = handler
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = dict(handler.headers)
+
+    def json(self):
+        return json.loads(self.body or b"{}")
+
+    def stream(self, lines, status: int = 200, content_type: str = "application/x-ndjson"):
+        # chunked response, one chunk per line, flushed as it goes
+        h = self.handler
+        h.send_response(status)
+        h.send_header("Content-Type", content_type)
+        h.send_header("Transfer-Encoding", "chunked")
+        h.end_headers()
+        for line in lines:
+            data = line.encode("utf8") if isinstance(line, str) else line
+            h.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            h.wfile.flush()
+        h.wfile.write(b"0\r\n\r\n")
+
+
+@pytest.fixture
+def http_server():
+    server = LocalServer().start()
+    try:
+        yield server
+    finally:
+        server.stop()
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from app.services.batching import MicroBatcher
+
+
+class Fatal(BaseException):
+    pass
+
+
+def test_items_are_batched_and_answered_in_order():
+    sizes = []
+
+    def double(items):
+        sizes.append(len(items))
+        return [2 * i for i in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait_ms=50)
+    try:
+        futures = batcher.submit_many(range(10))
+        assert [f.result(timeout=5) for f in futures] == [2 * i for i in range(10)]
+        assert max(sizes) <= 4 and sum(sizes) == 10 and len(sizes) < 10
+    finally:
+        batcher.close()
+
+
+@pytest.mark.parametrize("error", [ValueError("bad input"), Fatal("interpreter shutting down")])
+def test_a_raising_batch_does_not_stall_later_calls(error):
+    calls = []
+
+    def process(items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise error
+        return [f"ok:{i}" for i in items]
+
+    batcher = MicroBatcher(process, max_batch_size=8, max_wait_ms=1)
+    try:
+        with pytest.raises(type(error)):
+            batcher("first", timeout=5)
+        assert batcher("second", timeout=5) == "ok:second"
+    finally:
+        batcher.close()
+
+
+def test_wrong_result_count_fails_the_batch():
+    batcher = MicroBatcher(lambda items: [], max_wait_ms=1)
+    try:
+        with pytest.raises(RuntimeError, match="0 results for 1 items"):
+            batcher("x", timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_cancelled_items_are_skipped():
+    gate, seen = threading.Event(), []
+
+    def process(items):
+        gate.wait(5)
+        seen.extend(items)
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=1, max_wait_ms=0)
+    try:
+        first = batcher.submit("first")
+        cancelled = batcher.submit("cancelled")
+        assert cancelled.cancel()
+        gate.set()
+        assert first.result(timeout=5) == "first"
+        assert batcher("third", timeout=5) == "third"
+        assert seen == ["first", "third"]
+    finally:
+        batcher.close()
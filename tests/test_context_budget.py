@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from app.services import context_budget
+from app.services.context_budget import ApproxTokenCounter, assemble_context, get_token_counter
+
+COUNTER = ApproxTokenCounter()
+
+LEAF_SPOT = ("Banana leaf spot is caused by a fungus that spreads in wet weather. "
+             "Remove and burn the infected leaves before spraying. "
+             "Spray mancozeb at 2.5 grams per litre of water every ten days. "
+             "Keep the plantation well drained.")
+ROOT_WILT = ("Coconut root wilt spreads slowly through the soil of the garden. "
+             "Apply lime before the monsoon. "
+             "Grow green manure crops in the basins.")
+RICE_BLAST = ("Rice blast shows as spindle shaped spots on the leaves. "
+              "Avoid excess nitrogen. "
+              "Spray tricyclazole when the spots first appear.")
+
+
+def _chunk(text, score, source="kb.txt"):
+    return {"text": text, "score": score, "source": source}
+
+
+def test_context_stays_within_the_budget():
+    chunks = [_chunk(LEAF_SPOT, 0.9), _chunk(ROOT_WILT, 0.7), _chunk(RICE_BLAST, 0.5)]
+    for budget in (20, 60, 100, 150, 1000):
+        out = assemble_context(chunks, "test-model", budget=budget, counter=COUNTER)
+        assert out["tokens"] <= budget
+        assert COUNTER.count(out["context"]) <= out["tokens"]
+        assert out["tokenizer"] == "approx"
+
+    whole = assemble_context(chunks, "test-model", budget=1000, counter=COUNTER)
+    # best score first, nothing cut or dropped
+    assert [c["text"] for c in whole["chunks"]] == [LEAF_SPOT, ROOT_WILT, RICE_BLAST]
+    assert whole["dropped"] == whole["truncated_tokens"] == 0
+
+
+def test_near_duplicate_chunks_are_dropped():
+    reworded = LEAF_SPOT.replace("Keep the plantation well drained.", "Keep the field well drained.")
+    chunks = [_chunk(LEAF_SPOT, 0.9, "a.txt"), _chunk(reworded, 0.8, "b.txt"), _chunk(ROOT_WILT, 0.7)]
+    out = assemble_context(chunks, "test-model", budget=1000, counter=COUNTER)
+    assert out["deduplicated"] == 1
+    assert [c["source"] for c in out["chunks"]] == ["a.txt", "kb.txt"]
+
+    # the threshold decides what counts as a near-duplicate
+    loose = assemble_context(chunks, "test-model", budget=1000, dedup_threshold=1.01, counter=COUNTER)
+    assert loose["deduplicated"] == 0 and len(loose["chunks"]) == 3
+
+
+def test_last_chunk_is_cut_on_a_sentence_boundary():
+    first = COUNTER.count(LEAF_SPOT)
+    sep = COUNTER.count(context_budget.CONTEXT_SEPARATOR)
+    two_sentences = "Coconut root wilt spreads slowly through the soil of the garden. Apply lime before the monsoon."
+    budget = first + sep + COUNTER.count(two_sentences) + 2   # not enough for the third sentence
+    out = assemble_context([_chunk(LEAF_SPOT, 0.9), _chunk(ROOT_WILT, 0.7)], "test-model",
+                           budget=budget, counter=COUNTER)
+
+    kept = out["chunks"][1]
+    assert kept["truncated"] is True
+    assert kept["text"] == two_sentences
+    assert out["tokens"] <= budget
+    assert out["truncated_tokens"] == COUNTER.count(ROOT_WILT) - COUNTER.count(two_sentences)
+
+
+def test_chunk_without_a_fitting_sentence_is_dropped():
+    budget = COUNTER.count(LEAF_SPOT) + 5
+    out = assemble_context([_chunk(LEAF_SPOT, 0.9), _chunk(ROOT_WILT, 0.7)], "test-model",
+                           budget=budget, counter=COUNTER)
+    assert [c["text"] for c in out["chunks"]] == [LEAF_SPOT]
+    assert out["dropped"] == 1 and out["truncated_tokens"] == COUNTER.count(ROOT_WILT)
+
+
+def test_token_counter_is_loaded_once_per_model(monkeypatch):
+    monkeypatch.setattr(context_budget, "_counters", {})
+    loads, release = [], threading.Event()
+
+    def slow_load(model):
+        loads.append(model)
+        if model == "slow-model":
+            assert release.wait(5)
+        return ApproxTokenCounter()
+
+    monkeypatch.setattr(context_budget, "_load_counter", slow_load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_token_counter("slow-model"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    # another model is not held up by the slow load
+    assert isinstance(get_token_counter("fast-model"), ApproxTokenCounter)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert loads.count("slow-model") == 1
+    assert len(results) == 4 and all(r is results[0] for r in results)
+    assert get_token_counter("slow-model") is results[0]
+
+
+def test_unavailable_tokenizer_falls_back_to_the_estimate(monkeypatch):
+    def broken(name):
+        raise OSError("no network")
+
+    monkeypatch.setattr(context_budget, "HFTokenCounter", broken)
+    assert isinstance(context_budget._load_counter("tinyllama"), ApproxTokenCounter)
+    assert isinstance(context_budget._load_counter("unknown-model"), ApproxTokenCounter)
+    # Malayalam: 3 UTF-8 bytes per code point, about one token each
+    assert COUNTER.count("വളം") == 3
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import dispatcher, main, prompts
+from app.dispatcher import CallDispatcher, LocalPool
+
+
+@pytest.fixture
+def blocked_calls(monkeypatch):
+    """
+    handle_incoming_call_webhook stand-in that holds every call until released.
+    """
+    release = threading.Event()
+    started = []
+
+    def handle(payload):
+        started.append(payload["CallSid"])
+        assert release.wait(5)
+
+    monkeypatch.setattr(dispatcher, "handle_incoming_call_webhook", handle)
+    yield started, release
+    release.set()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_local_pool_runs_lower_priority_numbers_first():
+    pool = LocalPool(workers=1, max_queued=10)
+    gate, order = threading.Event(), []
+    assert pool.submit(gate.wait, 5)
+    assert _wait_for(lambda: pool.depth()["running"] == 1)
+    for priority in (5, 0, 3, 0):
+        assert pool.submit(order.append, priority, priority=priority)
+    gate.set()
+    assert _wait_for(lambda: len(order) == 4)
+    assert order == [0, 0, 3, 5]
+
+
+def test_local_pool_refuses_work_beyond_max_queued():
+    pool = LocalPool(workers=1, max_queued=2)
+    gate = threading.Event()
+    assert pool.submit(gate.wait, 5)
+    assert _wait_for(lambda: pool.depth()["running"] == 1)
+    assert pool.submit(lambda: None) and pool.submit(lambda: None)
+    assert not pool.submit(lambda: None)
+    gate.set()
+
+
+def test_dispatch_sheds_when_the_queue_is_full(blocked_calls):
+    started, release = blocked_calls
+    d = CallDispatcher(mode="local", max_queued=1, workers=1)
+    assert d.dispatch({"CallSid": "CA1"})["state"] == "queued"
+    assert _wait_for(lambda: started == ["CA1"])
+    assert d.dispatch({"CallSid": "CA2"})["state"] == "queued"
+    assert d.dispatch({"CallSid": "CA3"})["state"] == "shed"
+
+    assert d.status("CA1")["state"] == "running"
+    assert d.status("CA3")["state"] == "shed"
+    release.set()
+    assert _wait_for(lambda: d.status("CA2")["state"] == "done")
+    assert d.status("CA1")["backend"] == "local"
+
+
+def test_call_webhook_answers_shed_calls_with_the_fallback_prompt(blocked_calls, monkeypatch):
+    started, release = blocked_calls
+    d = CallDispatcher(mode="local", max_queued=1, workers=1)
+    monkeypatch.setattr(main, "get_dispatcher", lambda: d)
+    spoken = []
+
+    def save_tts(caller, text):
+        spoken.append((caller, text))
+        return "/tmp/fallback.mp3", "http://host/static/tts/fallback&1.mp3"
+
+    monkeypatch.setattr(dispatcher, "save_tts", save_tts)
+    client = TestClient(main.app)
+
+    replies = [client.post("/webhook/call", data={"CallSid": f"CA{i}", "From": "+91900"}) for i in range(3)]
+    assert [r.status_code for r in replies] == [200, 200, 200]
+    assert replies[0].text == "<Response></Response>"
+    assert replies[2].text == "<Response><Play>http://host/static/tts/fallback&amp;1.mp3</Play></Response>"
+    assert spoken == [("+91900", prompts.PROCESSING_FAILED)]
+
+    assert client.get("/calls/CA2").json()["state"] == "shed"
+    assert client.get("/calls/CA0").json()["state"] == "running"
+    assert client.get("/calls/unknown").status_code == 404
+    release.set()
+    assert _wait_for(lambda: client.get("/calls/CA0").json()["state"] == "done")
+
+
+def test_shed_twiml_hangs_up_without_a_prompt(monkeypatch):
+    def broken(caller, text):
+        raise RuntimeError("no TTS")
+
+    monkeypatch.setattr(dispatcher, "save_tts", broken)
+    assert dispatcher.shed_twiml({"From": "+91900"}) == "<Response><Hangup/></Response>"
+
+
+# -- Celery stage chain, run eagerly (CELERY_TASK_ALWAYS_EAGER=1) -------------
+
+SOURCES = [{"source": "banana.txt", "chunk": 0, "score": 0.8}]
+
+@pytest.fixture
+def call_stages(monkeypatch, tmp_path):
+    """
+    Replace the models and external services behind the stage tasks;
+    returns what each stage was handed.
+    """
+    from worker import tasks
+
+    seen = types.SimpleNamespace(sms=[], records=[], spooled=[], tts=[])
+
+    def download(url, dest):
+        seen.spooled.append(dest)
+        with open(dest, "wb") as f:
+            f.write(b"RIFF")
+
+    def save_record(caller, question, answer, sources, confidence=0.0):
+        seen.records.append((caller, question, answer, sources, confidence))
+        return types.SimpleNamespace(id=len(seen.records))
+
+    def save_tts(caller, text):
+        seen.tts.append(text)
+        return "/tmp/x.mp3", "http://host/static/tts/x.mp3"
+
+    monkeypatch.setattr(tasks, "CALL_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(tasks, "download_url_to_file", download)
+    monkeypatch.setattr(tasks, "transcribe_audio", lambda path, **kw: ("വാഴയില", -0.25))
+    monkeypatch.setattr(tasks, "generate_answer", lambda q, caller: ("Spray mancozeb.", SOURCES))
+    monkeypatch.setattr(tasks, "en_to_ml", lambda text: f"ml:{text}")
+    monkeypatch.setattr(tasks, "save_tts", save_tts)
+    monkeypatch.setattr(tasks, "send_sms", lambda to, body: seen.sms.append((to, body)))
+    monkeypatch.setattr(tasks, "save_query_record", save_record)
+    return tasks, seen
+
+
+def test_call_chain_runs_every_stage(call_stages):
+    tasks, seen = call_stages
+    res = tasks.start_call_pipeline({"CallSid": "CAchain1", "From": "+91900", "RecordingUrl": "http://rec/1"})
+    state = res.get()
+    assert res.id == "CAchain1"
+    assert state["status"] == "ok"
+    assert state["answer_ml"] == "ml:Spray mancozeb."
+    assert state["play_urls"] == ["http://host/static/tts/x.mp3"]
+    assert seen.sms == [("+91900", prompts.SMS_ANSWER.format(answer="ml:Spray mancozeb."))]
+    assert seen.records == [("+91900", "വാഴയില", "ml:Spray mancozeb.", SOURCES, -0.25)]
+    # the recording is passed by path and removed after transcription
+    assert len(seen.spooled) == 1 and not os.path.exists(seen.spooled[0])
+
+
+def test_malayalam_answers_are_not_translated_again(call_stages, monkeypatch):
+    tasks, seen = call_stages
+    answer = "മാങ്കോസെബ് തളിക്കുക (2.5 g/L)."
+    monkeypatch.setattr(tasks, "generate_answer", lambda q, caller: (answer, SOURCES))
+    state = tasks.start_call_pipeline({"CallSid": "CAchain5", "From": "+91900", "RecordingUrl": "http://rec/5"}).get()
+    assert state["answer_ml"] == answer
+
+
+def test_call_chain_without_recording_plays_the_fallback(call_stages):
+    tasks, seen = call_stages
+    state = tasks.start_call_pipeline({"CallSid": "CAchain2", "From": "+91900"}).get()
+    assert state["status"] == "fallback"
+    assert seen.tts == [prompts.NO_RECORDING]
+    assert seen.sms == [("+91900", prompts.NO_RECORDING)]
+    assert seen.spooled == []
+
+
+def test_failed_stage_runs_the_call_failed_errback(call_stages, monkeypatch):
+    tasks, seen = call_stages
+
+    def broken(q, caller):
+        raise RuntimeError("LLM down")
+
+    monkeypatch.setattr(tasks, "generate_answer", broken)
+    d = CallDispatcher(mode="celery")
+    job = d.dispatch({"CallSid": "CAchain3", "From": "+91900", "RecordingUrl": "http://rec/3"})
+    assert job["backend"] == "celery" and job["state"] == "queued"
+
+    assert seen.tts == [prompts.PROCESSING_FAILED]
+    assert seen.sms == [("+91900", prompts.PROCESSING_FAILED)]
+    assert seen.records == [("+91900", "വാഴയില", prompts.PROCESSING_FAILED, [], 0.0)]
+    assert d.status("CAchain3")["state"] == "failed"
+
+
+def test_status_of_a_celery_call_follows_the_chain(call_stages):
+    tasks, seen = call_stages
+    d = CallDispatcher(mode="celery")
+    d.dispatch({"CallSid": "CAchain4", "From": "+91900", "RecordingUrl": "http://rec/4"})
+    assert d.status("CAchain4")["state"] == "done"
+    assert d.status("CAchain4")["backend"] == "celery"
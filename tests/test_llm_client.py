@@ -0,0 +1,161 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.llm_client import OllamaClient, OllamaError
+
+
+def _client(server, **kwargs):
+    return OllamaClient(host=server.base_url, model="test-model", **kwargs)
+
+
+def _ndjson(*chunks):
+    return [json.dumps(c) + "\n" for c in chunks]
+
+
+def test_generate_reuses_one_keep_alive_connection(http_server):
+    http_server.route("POST", "/api/generate", lambda req: (200, {}, {"response": " hello ", "done": True}))
+    client = _client(http_server)
+    try:
+        assert [client.generate("q") for _ in range(5)] == ["hello"] * 5
+    finally:
+        client.close()
+    assert len(http_server.requests) == 5
+    assert len(http_server.connections) == 1
+    payload = http_server.requests[0].json()
+    assert payload["model"] == "test-model"
+    assert payload["stream"] is False
+    assert payload["keep_alive"] == client.keep_alive
+
+
+def test_concurrency_is_bounded_by_the_semaphore(http_server):
+    lock = threading.Lock()
+    state = {"in_flight": 0, "peak": 0}
+
+    def slow(req):
+        with lock:
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+        time.sleep(0.1)
+        with lock:
+            state["in_flight"] -= 1
+        return 200, {}, {"response": "ok", "done": True}
+
+    http_server.route("POST", "/api/generate", slow)
+    client = _client(http_server, max_concurrency=2)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: client.generate("q"), range(8)))
+    finally:
+        client.close()
+    assert results == ["ok"] * 8
+    assert state["peak"] == 2
+
+
+def test_timeout_raises_ollama_error(http_server):
+    def stuck(req):
+        time.sleep(1.0)
+        return 200, {}, {"response": "late", "done": True}
+
+    http_server.route("POST", "/api/generate", stuck)
+    client = _client(http_server, timeout=0.2)
+    try:
+        with pytest.raises(OllamaError, match="request failed"):
+            client.generate("q")
+    finally:
+        client.close()
+
+
+@pytest.mark.parametrize("status, body, match", [
+    (500, {"error": "boom"}, "request failed"),
+    (200, {"error": "model not found"}, "model not found"),
+    (200, "not json", "invalid JSON"),
+])
+def test_server_errors_map_to_ollama_error(http_server, status, body, match):
+    http_server.route("POST", "/api/generate", lambda req: (status, {}, body))
+    client = _client(http_server)
+    try:
+        with pytest.raises(OllamaError, match=match):
+            client.generate("q")
+    finally:
+        client.close()
+
+
+def test_unreachable_server_raises_ollama_error():
+    client = OllamaClient(host="http://127.0.0.1:9", connect_timeout=0.5)
+    try:
+        with pytest.raises(OllamaError):
+            client.generate("q")
+    finally:
+        client.close()
+
+
+def test_stream_parses_ndjson_until_done(http_server):
+    lines = _ndjson(
+        {"response": "Spray", "done": False},
+        {"response": " neem", "done": False},
+        {"response": "", "done": False},
+        {"response": " oil.", "done": False},
+        {"response": "", "done": True},
+        {"response": " after done", "done": False},
+    )
+    lines.insert(2, "\n")   # blank keep-alive line
+    http_server.route("POST", "/api/generate", lambda req: req.stream(lines))
+    client = _client(http_server)
+    try:
+        assert list(client.stream("q")) == ["Spray", " neem", " oil."]
+    finally:
+        client.close()
+    assert http_server.requests[0].json()["stream"] is True
+
+
+def test_stream_error_chunk_raises(http_server):
+    lines = _ndjson({"response": "Spray", "done": False}, {"error": "out of memory"})
+    http_server.route("POST", "/api/generate", lambda req: req.stream(lines))
+    client = _client(http_server)
+    try:
+        tokens = []
+        with pytest.raises(OllamaError, match="out of memory"):
+            for token in client.stream("q"):
+                tokens.append(token)
+        assert tokens == ["Spray"]
+    finally:
+        client.close()
+
+
+def test_stream_releases_its_slot_when_closed_early(http_server):
+    lines = _ndjson(*({"response": f" t{i}", "done": False} for i in range(5)), {"done": True})
+    http_server.route("POST", "/api/generate", lambda req: req.stream(lines))
+    client = _client(http_server, max_concurrency=1)
+    try:
+        gen = client.stream("q")
+        assert next(gen) == " t0"
+        gen.close()
+        # the only slot is free again
+        assert "".join(client.stream("q")) == " t0 t1 t2 t3 t4"
+    finally:
+        client.close()
+
+
+def test_async_variants(http_server):
+    good = _ndjson({"response": "a", "done": False}, {"response": "b", "done": False}, {"done": True})
+    bad = _ndjson({"response": "a", "done": False}) + ["not json\n"]
+
+    async def collect(client):
+        return [token async for token in client.astream("q")]
+
+    http_server.route("POST", "/api/generate", lambda req: req.stream(good))
+    client = _client(http_server)
+    try:
+        assert asyncio.run(collect(client)) == ["a", "b"]
+        http_server.route("POST", "/api/generate", lambda req: req.stream(bad))
+        with pytest.raises(OllamaError, match="invalid JSON"):
+            asyncio.run(collect(client))
+        http_server.route("POST", "/api/generate", lambda req: (200, {}, {"response": "c", "done": True}))
+        assert asyncio.run(client.agenerate("q")) == "c"
+    finally:
+        client.close()
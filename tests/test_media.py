@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+import requests
+
+from app.services.audio import SAMPLE_RATE, decode_audio
+from app.services.media import MediaFetcher, MediaTooLarge
+from conftest import SAMPLE_WAV
+
+with open(SAMPLE_WAV, "rb") as f:
+    WAV = f.read()
+
+
+def _serve_wav(server, path="/rec.wav", chunked=False):
+    def handler(req):
+        if chunked:
+            return req.stream([WAV[i:i + 4096] for i in range(0, len(WAV), 4096)], content_type="audio/x-wav")
+        return 200, {"Content-Type": "audio/x-wav"}, WAV
+
+    server.route("GET", path, handler)
+    return server.base_url + path
+
+
+@pytest.fixture
+def fetcher():
+    f = MediaFetcher(retries=3)
+    yield f
+    f.close()
+
+
+def test_small_recording_stays_in_memory(http_server, fetcher):
+    url = _serve_wav(http_server)
+    with fetcher.fetch(url) as media:
+        assert media.in_memory
+        assert media.size == len(WAV)
+        assert media.suffix == ".wav"
+        assert media.read() == WAV
+        samples = decode_audio(media.file)
+    assert samples.dtype.name == "float32" and samples.size > SAMPLE_RATE
+
+
+def test_large_recording_spills_to_disk(http_server):
+    url = _serve_wav(http_server, chunked=True)
+    fetcher = MediaFetcher(spool_bytes=10_000)
+    try:
+        with fetcher.fetch(url) as media:
+            assert not media.in_memory
+            assert media.size == len(WAV)
+            assert media.read() == WAV
+    finally:
+        fetcher.close()
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_recording_over_max_bytes_is_refused(http_server, chunked):
+    # declared Content-Length is checked up front; chunked bodies while streaming
+    url = _serve_wav(http_server, chunked=chunked)
+    fetcher = MediaFetcher(max_bytes=len(WAV) - 1)
+    try:
+        with pytest.raises(MediaTooLarge):
+            fetcher.fetch(url)
+    finally:
+        fetcher.close()
+
+
+def test_retries_server_errors(http_server, fetcher):
+    attempts = []
+
+    def flaky(req):
+        attempts.append(1)
+        if len(attempts) < 3:
+            return 503, {}, {"error": "busy"}
+        return 200, {"Content-Type": "audio/x-wav"}, WAV
+
+    http_server.route("GET", "/flaky.wav", flaky)
+    with fetcher.fetch(http_server.base_url + "/flaky.wav") as media:
+        assert media.read() == WAV
+    assert len(attempts) == 3
+
+
+def test_client_errors_are_not_retried(http_server, fetcher):
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetch(http_server.base_url + "/missing.wav")
+    assert len(http_server.requests) == 1
+
+
+def test_connections_are_reused(http_server, fetcher):
+    url = _serve_wav(http_server)
+    for _ in range(3):
+        fetcher.fetch(url).close()
+    assert len(http_server.connections) == 1
+
+
+def test_file_urls_and_async_fetch(http_server, fetcher, tmp_path):
+    with fetcher.fetch(f"file://{SAMPLE_WAV}") as media:
+        assert media.read() == WAV
+    url = _serve_wav(http_server)
+    media = asyncio.run(fetcher.afetch(url))
+    dest = media.save(str(tmp_path / "copy.wav"))
+    media.close()
+    with open(dest, "rb") as f:
+        assert f.read() == WAV
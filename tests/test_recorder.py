@@ -0,0 +1,53 @@
+import threading
+
+from sqlalchemy import func, select
+
+from app import models
+from app.recorder import QueryRecorder
+
+models.init_db()
+
+
+def _stored(ids):
+    with models.engine.connect() as conn:
+        return conn.execute(select(func.count()).where(models.QueryRecord.id.in_(ids))).scalar()
+
+
+def _record(recorder, n, caller="+91900"):
+    return [recorder.record(models.new_query_record(caller, f"q{i}", "a", [], 0.5)).id for i in range(n)]
+
+
+def test_flush_writes_queued_records_in_batches():
+    recorder = QueryRecorder(flush_rows=10, flush_ms=50)
+    try:
+        ids = _record(recorder, 25)
+        assert recorder.flush(timeout=5)
+        assert _stored(ids) == 25
+        stats = recorder.stats()
+        assert stats["pending"] == 0 and stats["written"] == 25 and stats["failed"] == 0
+        assert stats["batches"] < 25
+    finally:
+        recorder.close()
+
+
+def test_records_racing_close_are_all_written():
+    recorder = QueryRecorder(flush_rows=5, flush_ms=1)
+    ids, lock = [], threading.Lock()
+    start = threading.Barrier(9)
+
+    def caller(n):
+        start.wait()
+        got = _record(recorder, 50, caller=f"+9190{n}")
+        with lock:
+            ids.extend(got)
+
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    start.wait()
+    recorder.close()
+    for t in threads:
+        t.join()
+    assert len(ids) == 400
+    assert _stored(ids) == 400
+    assert recorder.stats()["pending"] == 0
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.services import llm_rag
+from app.services.retrieval import HashingEmbedder, KnowledgeIndex
+
+DOCS = {
+    "banana.txt": "Banana leaf spot is caused by a fungus. Spray mancozeb every ten days. Burn the infected leaves.",
+    "coconut.txt": "Coconut root wilt spreads through the soil. Apply lime before the monsoon.",
+    "rice.txt": "Rice blast shows as spindle shaped spots on the leaves. Avoid excess nitrogen.",
+}
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.encoded = []
+
+    def encode(self, texts):
+        texts = list(texts)
+        self.encoded.extend(texts)
+        return super().encode(texts)
+
+
+@pytest.fixture
+def kb(tmp_path):
+    kb_dir = tmp_path / "kb"
+    kb_dir.mkdir()
+    for name, text in DOCS.items():
+        (kb_dir / name).write_text(text, encoding="utf8")
+    return kb_dir, tmp_path / "index"
+
+
+def _index(kb, embedder=None):
+    kb_dir, index_dir = kb
+    return KnowledgeIndex(str(kb_dir), str(index_dir), embedder=embedder or CountingEmbedder(),
+                          chunk_chars=60, refresh_seconds=3600)
+
+
+def _bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+
+def test_refresh_embeds_only_changed_files(kb):
+    kb_dir, _ = kb
+    index = _index(kb)
+    first = index.refresh()
+    assert first["changed"] == 3 and first["removed"] == 0
+    assert len(index.embedder.encoded) == first["chunks"]
+
+    index.embedder.encoded.clear()
+    assert index.refresh() == {"changed": 0, "removed": 0, "chunks": first["chunks"]}
+    assert index.embedder.encoded == []
+
+    # newer mtime, same bytes: the sha256 matches, nothing is re-embedded
+    _bump_mtime(kb_dir / "rice.txt")
+    assert index.refresh()["changed"] == 0
+    assert index.embedder.encoded == []
+    assert index._meta["files"]["rice.txt"]["mtime"] == os.path.getmtime(kb_dir / "rice.txt")
+
+    (kb_dir / "banana.txt").write_text("Banana bunchy top is spread by aphids.", encoding="utf8")
+    _bump_mtime(kb_dir / "banana.txt")
+    (kb_dir / "coconut.txt").unlink()
+    out = index.refresh()
+    assert out["changed"] == 1 and out["removed"] == 1
+    assert index.embedder.encoded == ["Banana bunchy top is spread by aphids."]
+    sources = {c["source"] for c in index._meta["chunks"].values()}
+    assert sources == {"banana.txt", "rice.txt"}
+    assert index._index.ntotal == len(index._meta["chunks"])
+    assert all(hit["source"] != "coconut.txt" for hit in index.search("coconut root wilt", top_k=5))
+
+
+def test_persisted_index_is_memory_mapped_on_load(kb):
+    index = _index(kb)
+    index.refresh()
+    before = index.search("rice blast spots", top_k=2)
+
+    reloaded = _index(kb)
+    assert reloaded._index.ntotal == index._index.ntotal
+    assert reloaded.search("rice blast spots", top_k=2) == before
+    # loaded from disk: only the query was embedded, no KB chunk
+    assert reloaded.embedder.encoded == ["rice blast spots"]
+    assert reloaded.refresh()["changed"] == 0
+
+
+def test_index_is_rebuilt_for_another_embedder(kb):
+    _index(kb).refresh()
+    other = _index(kb, embedder=HashingEmbedder(dim=64))
+    assert other._index.ntotal == 0
+    assert other.refresh()["changed"] == 3
+
+
+def test_retrieve_docs_returns_source_metadata(kb, monkeypatch):
+    index = _index(kb)
+    index.refresh()
+    monkeypatch.setattr(llm_rag, "get_index", lambda: index)
+    hits = llm_rag.retrieve_docs("banana leaf spot fungus", top_k=2)
+    assert len(hits) == 2
+    assert set(hits[0]) == {"source", "chunk", "text", "score"}
+    assert hits[0]["source"] == "banana.txt"
+    assert hits[0]["score"] >= hits[1]["score"]
+    assert "Banana" in hits[0]["text"]
+
+
+def test_retrieve_docs_falls_back_without_an_index(monkeypatch):
+    def broken():
+        raise RuntimeError("no faiss")
+
+    monkeypatch.setattr(llm_rag, "get_index", broken)
+    hits = llm_rag.retrieve_docs("anything", top_k=2)
+    assert hits and all(h["source"] is None and h["score"] == 0.0 for h in hits)
@@ -0,0 +1,78 @@
+import datetime
+
+from sqlalchemy import func, select
+
+from app import models, rollups
+
+models.init_db()
+
+
+def _rows(caller, n):
+    start = models.allocate_id_block(models.QueryRecord, n)
+    created = datetime.datetime(2026, 3, 1, 9, 30)
+    return [
+        {"id": start + i, "caller": caller, "question": "banana leaf spot fungus", "answer": "a",
+         "sources": "[]", "confidence": 0.5, "created_at": created}
+        for i in range(n)
+    ]
+
+
+def _count(stmt):
+    with models.engine.connect() as conn:
+        return conn.execute(stmt).scalar()
+
+
+def _rollup_queries(region):
+    return _count(select(func.coalesce(func.sum(models.QueryRollup.queries), 0)).where(
+        models.QueryRollup.region == region, models.QueryRollup.granularity == "day"))
+
+
+def test_records_are_added_to_the_rollups():
+    rows = _rows("+911111100001", 3)
+    models.insert_query_records(rows)
+    assert _rollup_queries(rollups.caller_region("+911111100001")) == 3
+
+
+def test_failed_rollups_do_not_lose_the_records(monkeypatch):
+    region = rollups.caller_region("+912222200001")
+    real_apply = rollups.apply
+
+    def broken(conn, records):
+        real_apply(conn, records)   # upserts land, then the savepoint is rolled back
+        raise RuntimeError("rollup upsert failed")
+
+    monkeypatch.setattr(rollups, "apply", broken)
+    before = rollups.ROLLUP_FAILURES._values.get("query_rollups", 0)
+    rows = _rows("+912222200001", 4)
+    models.insert_query_records(rows)
+
+    ids = [r["id"] for r in rows]
+    assert _count(select(func.count()).where(models.QueryRecord.id.in_(ids))) == 4
+    assert _rollup_queries(region) == 0
+    assert rollups.ROLLUP_FAILURES._values["query_rollups"] == before + 4
+
+    monkeypatch.setattr(rollups, "apply", real_apply)
+    rollups.rebuild(since=datetime.datetime(2026, 3, 1))
+    assert _rollup_queries(region) == 4
+
+
+def test_malayalam_questions_get_a_topic_and_a_cluster():
+    # the Celery chain stores the Malayalam transcript as the question
+    question = "നെല്ലിന് ഏത് വളം ഉപയോഗിക്കണം?"
+    assert rollups.question_topic(question) == "fertilizer"
+    assert rollups.question_topic("വളത്തിന്റെ അളവ് എത്ര?") == "fertilizer"
+    assert rollups.question_topic("വെള്ളപ്പൊക്കം വന്നാൽ എന്ത് ചെയ്യണം") == "weather"
+    assert rollups.question_cluster(question) == "ഉപയോഗിക്കണം നെല്ലിന് വളം"
+
+    rows = _rows("+913333300001", 2)
+    for row in rows:
+        row["question"] = question
+    models.insert_query_records(rows)
+    with models.engine.connect() as conn:
+        topics = conn.execute(select(models.QueryRollup.topic, models.QueryRollup.queries).where(
+            models.QueryRollup.region == rollups.caller_region("+913333300001"),
+            models.QueryRollup.granularity == "day")).all()
+        cluster = conn.execute(select(models.QuestionCluster.queries).where(
+            models.QuestionCluster.cluster == "ഉപയോഗിക്കണം നെല്ലിന് വളം")).scalar()
+    assert topics == [("fertilizer", 2)]
+    assert cluster == 2
@@ -0,0 +1,207 @@
+import threading
+import types
+import unicodedata
+from urllib.parse import parse_qs
+
+import pytest
+from sqlalchemy import select
+
+from app import models, outbox
+from app.outbox import RateLimiter, SmsOutbox, record_status
+from app.services import sms
+from app.services.sms import TwilioClient, encoded_length, split_message
+
+models.init_db()
+
+MESSAGES = "/2010-04-01/Accounts/ACtest/Messages.json"
+# Malayalam with conjuncts (ക്ക, ന്ന), chillu (ൽ) and ZWJ/ZWNJ forms
+MALAYALAM = "വാഴയിലയിൽ പുള്ളിക്കുത്ത് രോഗം കണ്ടാൽ മാങ്കോസെബ് പത്ത് ദിവസം കൂടുമ്പോൾ തളിക്കുക"
+
+
+@pytest.fixture
+def twilio(http_server):
+    """
+    Messages API stand-in: replies with the scripted (status, headers, body)
+    responses in turn, then with 201 and a new sid.
+    """
+    script, sent = [], []
+
+    def create(req):
+        form = {k: v[0] for k, v in parse_qs(req.body.decode()).items()}
+        sent.append(form)
+        if script:
+            return script.pop(0)
+        return 201, {}, {"sid": f"SM{len(sent)}", "status": "queued"}
+
+    http_server.route("POST", MESSAGES, create)
+    client = TwilioClient(sid="ACtest", token="secret", base_url=http_server.base_url, status_callback=None)
+    return types.SimpleNamespace(client=client, script=script, sent=sent, server=http_server)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # record the outbox's backoff sleeps instead of waiting them out
+    slept = []
+    monkeypatch.setattr(outbox, "time", types.SimpleNamespace(sleep=slept.append, monotonic=outbox.time.monotonic))
+    return slept
+
+
+def _outbox(twilio, **kwargs):
+    return SmsOutbox(client=twilio.client, async_send=False, retries=3, backoff_s=0.5,
+                     limiter=RateLimiter(rate=0), **kwargs)
+
+
+def _deliveries(message_id):
+    with models.engine.connect() as conn:
+        return conn.execute(
+            select(models.SmsDelivery).where(models.SmsDelivery.message_id == message_id)
+            .order_by(models.SmsDelivery.part)
+        ).all()
+
+
+def test_retries_429_and_5xx_honouring_retry_after(twilio, sleeps):
+    twilio.script.extend([
+        (429, {"Retry-After": "7"}, {"code": 20429, "message": "Too Many Requests"}),
+        (503, {}, "busy"),
+    ])
+    box = _outbox(twilio)
+    message_id = box.send("+919000000001", "Spray mancozeb every ten days.")
+
+    assert len(twilio.sent) == 3
+    assert sleeps[0] == 7.0
+    assert 0.5 <= sleeps[1] <= 1.0   # backoff_s doubled by the first retry, with jitter
+    assert box.counts["retried"] == 2 and box.counts["sent"] == 1
+    (row,) = _deliveries(message_id)
+    assert (row.status, row.attempts, row.sid, row.error) == ("sent", 3, "SM3", None)
+    assert len(twilio.server.connections) == 1
+
+
+def test_client_errors_are_not_retried_and_later_parts_are_skipped(twilio, sleeps):
+    body = " ".join(["word"] * 100)   # 499 GSM-7 characters: four parts
+    parts = split_message(body, max_segments=1)
+    assert len(parts) == 4
+    twilio.script.extend([
+        (201, {}, {"sid": "SMfirst", "status": "queued"}),
+        (400, {}, {"code": 21211, "message": "Invalid 'To' Phone Number"}),
+    ])
+    box = _outbox(twilio)
+    message_id = box.send("+919000000002", body)
+
+    assert len(twilio.sent) == 2 and sleeps == []
+    assert [form["Body"] for form in twilio.sent] == parts[:2]
+    assert box.counts == {"sent": 1, "failed": 1, "retried": 0, "skipped": 2, "overflow": 0}
+    rows = _deliveries(message_id)
+    assert [r.status for r in rows] == ["sent", "failed", "failed", "failed"]
+    assert "Invalid 'To' Phone Number" in rows[1].error
+    assert rows[2].error == "not sent: part 2 failed"
+
+
+def test_messages_racing_close_are_all_sent(twilio):
+    box = SmsOutbox(client=twilio.client, async_send=True, workers=2, limiter=RateLimiter(rate=0),
+                    record_deliveries=False)
+    ids, lock = [], threading.Lock()
+    start = threading.Barrier(9)
+
+    def caller(n):
+        start.wait()
+        got = [box.send(f"+91900000{n:04d}", f"Message {i} for caller {n}") for i in range(10)]
+        with lock:
+            ids.extend(got)
+
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    start.wait()
+    box.close()
+    for t in threads:
+        t.join()
+    assert len(ids) == 80
+    assert len(twilio.sent) == 80
+    assert box.flush(timeout=1)
+    assert box.stats()["pending"] == 0 and box.counts["sent"] == 80
+
+
+def test_twilio_errors_carry_status_code_and_retry_after(twilio):
+    twilio.script.append((429, {"Retry-After": "3"}, {"code": 20429, "message": "slow down"}))
+    with pytest.raises(sms.SmsError) as err:
+        twilio.client.send("+919000000003", "hi", "+15550000000")
+    e = err.value
+    assert (e.retryable, e.status, e.code, e.retry_after) == (True, 429, 20429, 3.0)
+    assert twilio.sent[0] == {"To": "+919000000003", "From": "+15550000000", "Body": "hi"}
+
+
+def test_split_message_respects_gsm7_limits():
+    assert split_message("a" * 160, max_segments=1) == ["a" * 160]
+    # extended characters take two septets each
+    assert encoded_length("{}" * 40) == 160
+    assert len(split_message("{}" * 40 + "a", max_segments=1)) == 2
+
+    body = " ".join(f"w{i:03d}" for i in range(100))
+    parts = split_message(body, max_segments=1)
+    assert [p.split(" ", 1)[0] for p in parts] == [f"({i}/{len(parts)})" for i in range(1, len(parts) + 1)]
+    assert all(encoded_length(p) <= 160 for p in parts)
+    assert " ".join(p.split(" ", 1)[1] for p in parts) == body
+
+    # concatenated SMS: 153 septets per segment
+    parts = split_message(body, max_segments=2)
+    assert all(sms.segment_count(p) <= 2 and encoded_length(p) <= 306 for p in parts)
+
+
+def _safe_cut(left: str, right: str) -> bool:
+    # no part may end inside a conjunct or start with a combining sign
+    if not left or not right:
+        return True
+    return (not unicodedata.category(right[0]).startswith("M") and right[0] not in sms._ZW
+            and left[-1] not in sms._ZW and "VIRAMA" not in unicodedata.name(left[-1], ""))
+
+
+def test_split_message_keeps_malayalam_within_ucs2_limits_and_conjuncts_whole():
+    assert sms.encoding_of(MALAYALAM) == "ucs2"
+    body = " ".join([MALAYALAM] * 3)
+    parts = split_message(body, max_segments=1)
+    assert len(parts) > 1
+    assert all(encoded_length(p, "ucs2") <= 70 for p in parts)
+    assert " ".join(p.split(" ", 1)[1] for p in parts) == body
+
+    # one word longer than a part is cut only between syllables
+    word = "ക്കാ" * 30 + "ൽ\u200dന്ന"
+    parts = [p.split(" ", 1)[1] for p in split_message(word, max_segments=1)]
+    assert "".join(parts) == word
+    assert all(encoded_length(p, "ucs2") <= 70 for p in parts)
+    assert all(_safe_cut(a, b) for a, b in zip(parts, parts[1:]))
+
+
+def test_status_callbacks_never_move_a_final_status_back():
+    (delivery_id,) = models.insert_sms_deliveries([{"message_id": "m-status", "to_number": "+919000000004",
+                                                    "body": "hi", "status": "sending"}])
+    models.update_sms_delivery(delivery_id, status="sent", sid="SMstatus")
+
+    assert record_status("SMstatus", "queued") is False
+    assert record_status("SMstatus", "delivered") is True
+    # a late "sent" callback arrives after "delivered"
+    assert record_status("SMstatus", "sent") is False
+    assert _deliveries("m-status")[0].status == "delivered"
+
+    assert record_status("SMstatus", "undelivered", error_code="30003") is True
+    row = _deliveries("m-status")[0]
+    assert (row.status, row.error) == ("undelivered", "Twilio error 30003")
+    assert record_status("SMunknown", "delivered") is False
+    assert record_status(None, "delivered") is False
+
+
+def test_token_bucket_spaces_segments_per_number(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(outbox, "time", types.SimpleNamespace(monotonic=lambda: now[0], sleep=None))
+    limiter = RateLimiter(rate=2, burst=1)
+
+    # concurrent reservations queue up behind each other, half a second apart
+    assert [limiter.reserve("+15550000001") for _ in range(3)] == [0.0, 0.5, 1.0]
+    # another number has its own bucket
+    assert limiter.reserve("+15550000002") == 0.0
+    # a two-segment part takes two tokens
+    assert limiter.reserve("+15550000002", 2) == 1.0
+
+    now[0] += 10   # idle refills the bucket, but never past the burst
+    assert limiter.reserve("+15550000001") == 0.0
+    assert limiter.reserve("+15550000001") == 0.5
+    assert RateLimiter(rate=0).reserve("+15550000001", 5) == 0.0
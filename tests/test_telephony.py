@@ -0,0 +1,51 @@
+import types
+
+import pytest
+
+from app import telephony
+from app.services import qa_model
+
+SOURCES = [{"source": "banana.txt", "chunk": 0, "score": 0.8}]
+
+
+@pytest.fixture
+def call(monkeypatch):
+    """
+    Run the local call path with the models and services replaced; returns
+    what was recorded.
+    """
+    seen = types.SimpleNamespace(records=[], sms=[])
+    monkeypatch.setattr(telephony, "TELEPHONY_STREAMING", True)
+    monkeypatch.setattr(telephony, "fetch_audio", lambda url: b"audio")
+    monkeypatch.setattr(telephony, "transcribe_audio_to_english", lambda audio, **kw: "How do I treat banana leaf spot?")
+    monkeypatch.setattr(telephony, "en_to_ml", lambda text: f"ml:{text}")
+    monkeypatch.setattr(telephony, "save_tts", lambda caller, text, part=None: ("/tmp/x.mp3", "http://host/x.mp3"))
+    monkeypatch.setattr(telephony, "send_sms_stub", lambda to, body: seen.sms.append(body))
+    monkeypatch.setattr(telephony, "save_query_record",
+                        lambda caller, q, a, sources, confidence=0.0: seen.records.append((q, a, sources, confidence)))
+
+    def run():
+        telephony.handle_incoming_call_webhook({"CallSid": "CAtel", "From": "+91900", "RecordingUrl": "http://rec/1"})
+        return seen
+
+    return run
+
+
+def test_streamed_cache_hit_keeps_its_confidence_and_sources(call, monkeypatch):
+    hit = {"answer": "Spray mancozeb every ten days.", "confidence": 0.97, "sources": SOURCES,
+           "cache_hit": True, "matched_question": "How to treat banana leaf spot?"}
+    monkeypatch.setattr(qa_model, "_cached", lambda q: hit)
+    seen = call()
+    assert seen.records == [("How do I treat banana leaf spot?", "ml:Spray mancozeb every ten days.", SOURCES, 0.97)]
+
+
+def test_streamed_model_answer_is_recorded_without_confidence(call, monkeypatch):
+    class Client:
+        def stream(self, question, model=None, timeout=None):
+            yield from ["Spray mancozeb", " every ten days."]
+
+    monkeypatch.setattr(qa_model, "_cached", lambda q: None)
+    monkeypatch.setattr(qa_model, "_remember", lambda q, a: None)
+    monkeypatch.setattr(qa_model, "get_client", lambda: Client())
+    seen = call()
+    assert seen.records == [("How do I treat banana leaf spot?", "ml:Spray mancozeb every ten days.", [], 0.0)]
@@ -0,0 +1,193 @@
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+from app.services import tts, tts_engines
+from app.services.audio import decode_audio
+from app.services.tts_engines import SynthesizerPool, TtsEngine
+
+RATE = 16000
+TEXT = "Sentence 1 is about leaves. Sentence 2 is about roots. Sentence 3 is about soil."
+
+
+class FailingEngine(TtsEngine):
+    name = "failing"
+
+    def warmup(self):
+        time.sleep(0.02)
+        raise RuntimeError("model weights missing")
+
+
+class SlowEngine(TtsEngine):
+    """
+    Slow to load; sentence n comes back as n/10 s of constant n/10 amplitude,
+    the first sentences last, so stitching cannot rely on completion order.
+    """
+    name = "slow"
+    sample_rate = RATE
+    pool_size = 2
+
+    def warmup(self):
+        time.sleep(0.05)
+
+    def synthesize(self, text, lang):
+        n = int(text.split()[1])
+        time.sleep(0.03 * (4 - n))
+        return np.full(RATE * n // 10, n / 10, dtype=np.float32), self.sample_rate
+
+
+class ChunkEngine(TtsEngine):
+    name = "chunks"
+    native_format = "mp3"
+
+    def mp3(self, text, lang):
+        time.sleep(0.03 * (4 - int(text.split()[1])))
+        return f"<{text}>".encode()
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    for engine in (FailingEngine, SlowEngine, ChunkEngine):
+        monkeypatch.setitem(tts_engines.ENGINES, engine.name, engine)
+    monkeypatch.setattr(tts_engines, "_pools", {})
+
+
+def _acquire_all(pool, n=8, hold=0.0):
+    """
+    n threads each borrow an instance; returns (instances, errors, threads still stuck).
+    """
+    got, errors, lock = [], [], threading.Lock()
+
+    def borrow():
+        try:
+            with pool.acquire() as engine:
+                time.sleep(hold)
+                with lock:
+                    got.append(engine)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+
+    threads = [threading.Thread(target=borrow, daemon=True) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return got, errors, [t for t in threads if t.is_alive()]
+
+
+def test_failed_creation_does_not_strand_waiters():
+    pool = SynthesizerPool(FailingEngine, size=2)
+    got, errors, stuck = _acquire_all(pool)
+    assert stuck == []
+    assert got == [] and len(errors) == 8
+    assert all("model weights missing" in str(e) for e in errors)
+    assert pool.stats() == {"size": 2, "created": 0, "idle": 0}
+
+
+def test_waiters_create_the_instance_a_failed_creation_left_out():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        return FailingEngine() if len(calls) == 1 else SlowEngine()
+
+    pool = SynthesizerPool(flaky, size=2)
+    got, errors, stuck = _acquire_all(pool, hold=0.02)
+    assert stuck == []
+    assert len(errors) == 1 and len(got) == 7
+    assert len({id(e) for e in got}) <= 2
+    assert pool.stats() == {"size": 2, "created": 2, "idle": 2}
+
+
+def test_slow_instances_are_created_once_and_reused():
+    pool = SynthesizerPool(SlowEngine, size=2)
+    got, errors, stuck = _acquire_all(pool, hold=0.02)
+    assert stuck == [] and errors == []
+    assert len(got) == 8 and len({id(e) for e in got}) == 2
+    pool.warmup()
+    assert pool.stats() == {"size": 2, "created": 2, "idle": 2}
+
+
+def test_warmup_failure_frees_the_slot():
+    pool = SynthesizerPool(FailingEngine, size=2)
+    with pytest.raises(RuntimeError):
+        pool.warmup()
+    assert pool.stats()["created"] == 0
+
+
+@pytest.mark.parametrize("fmt, rate", [("wav", RATE), ("ulaw", tts.TELEPHONY_SAMPLE_RATE)])
+def test_render_stitches_sentences_in_order_with_gaps(engines, tmp_path, fmt, rate):
+    out = tts.render("slow", TEXT, str(tmp_path / f"answer.{fmt}"), fmt=fmt)
+    audio = decode_audio(out, rate)
+    gap = int(rate * tts.TTS_SENTENCE_GAP_MS / 1000.0)
+    piece = [rate * n // 10 for n in (1, 2, 3)]
+    assert audio.size == sum(piece) + 2 * gap
+
+    pos = 0
+    for n, size in zip((1, 2, 3), piece):
+        middle = audio[pos + size // 4: pos + 3 * size // 4]
+        assert np.allclose(middle, n / 10, atol=0.02)
+        pos += size
+        if n < 3:
+            assert np.allclose(audio[pos + gap // 4: pos + 3 * gap // 4], 0.0, atol=0.02)
+            pos += gap
+
+
+def test_render_concatenates_mp3_chunks_in_order(engines, tmp_path):
+    out = tts.render("chunks", TEXT, str(tmp_path / "answer.mp3"))
+    with open(out, "rb") as f:
+        assert f.read() == b"".join(f"<{s}>".encode() for s in tts.split_sentences(TEXT))
+
+
+def test_synthesize_cached_falls_back_to_the_next_engine(engines, monkeypatch):
+    monkeypatch.setattr(tts, "TTS_ENGINES", ["failing", "unknown", "slow"])
+    path, fname = tts.synthesize_cached(TEXT + " Fallback.")
+    assert fname.endswith(".wav")
+    assert decode_audio(path, RATE).size > 0
+
+    monkeypatch.setattr(tts, "TTS_ENGINES", ["failing"])
+    with pytest.raises(RuntimeError, match="model weights missing"):
+        tts.synthesize_cached(TEXT + " Nothing works.")
+
+
+@pytest.fixture
+def cloud_tts(monkeypatch):
+    """
+    Minimal google.cloud.texttospeech recording the voice of each request.
+    """
+    voices = []
+
+    class Client:
+        def synthesize_speech(self, request):
+            voices.append(request["voice"]["language_code"])
+            return types.SimpleNamespace(audio_content=b"ID3")
+
+    module = types.SimpleNamespace(
+        TextToSpeechClient=Client,
+        SynthesisInput=lambda text: {"text": text},
+        VoiceSelectionParams=lambda **kw: kw,
+        AudioConfig=lambda **kw: kw,
+        SsmlVoiceGender=types.SimpleNamespace(NEUTRAL="NEUTRAL"),
+        AudioEncoding=types.SimpleNamespace(MP3="MP3"),
+    )
+    google = types.ModuleType("google")
+    cloud = types.ModuleType("google.cloud")
+    cloud.texttospeech = module
+    google.cloud = cloud
+    monkeypatch.setitem(sys.modules, "google", google)
+    monkeypatch.setitem(sys.modules, "google.cloud", cloud)
+    monkeypatch.setitem(sys.modules, "google.cloud.texttospeech", module)
+    return voices
+
+
+def test_google_cloud_engine_speaks_the_requested_language(cloud_tts):
+    engine = tts_engines.GoogleCloudEngine()
+    assert engine.mp3("നമസ്കാരം", "ml") == b"ID3"
+    engine.mp3("Please call again.", "en")
+    engine.mp3("Please call again.", "en-US")
+    assert cloud_tts == ["ml-IN", "en-IN", "en-US"]
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from app.services import asr, transcriber, whisper_registry
+from app.services.audio import SAMPLE_RATE, write_wav
+from app.services.transcriber import clean_beam_size
+from app.services.vad import split_windows
+
+RATE = 100   # samples per second, so window and overlap sizes stay readable
+
+
+def _covered(audio, windows):
+    # every window is a view onto audio; together they cover it in order
+    ends = []
+    for w in windows:
+        start = int(w[0])
+        assert np.array_equal(w, audio[start:start + w.size])
+        ends.append(start + w.size)
+    assert windows[0][0] == 0 and ends[-1] == audio.size
+    return [int(w[0]) for w in windows]
+
+
+def test_short_audio_is_one_window():
+    assert split_windows(np.arange(0), 10, 2, RATE) == []
+    audio = np.arange(1000)
+    windows = split_windows(audio, 10, 2, RATE)
+    assert len(windows) == 1 and windows[0].size == 1000
+
+
+@pytest.mark.parametrize("size", [1001, 1100, 1200])
+def test_tail_of_at_most_the_overlap_is_merged(size):
+    # window 1000 samples, overlap 200: a tail adding <= 200 new samples joins window 0
+    audio = np.arange(size)
+    windows = split_windows(audio, 10, 2, RATE)
+    assert _covered(audio, windows) == [0]
+    assert windows[0].size == size
+
+
+def test_long_audio_is_split_with_overlap():
+    audio = np.arange(2500)
+    windows = split_windows(audio, 10, 2, RATE)
+    assert _covered(audio, windows) == [0, 800, 1600]
+    assert [w.size for w in windows] == [1000, 1000, 900]
+
+    # 1201 samples: the tail brings 201 new samples, more than the overlap
+    audio = np.arange(1201)
+    assert [w.size for w in split_windows(audio, 10, 2, RATE)] == [1000, 401]
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, transcriber.WHISPER_BEAM_SIZE),
+    ("", transcriber.WHISPER_BEAM_SIZE),
+    ("3", 3),
+    (2.0, 2),
+    ("abc", transcriber.WHISPER_BEAM_SIZE),
+    ([5], transcriber.WHISPER_BEAM_SIZE),
+    ("0", 1),
+    ("-4", 1),
+    ("100000", transcriber.WHISPER_MAX_BEAM_SIZE),
+])
+def test_clean_beam_size(value, expected):
+    assert clean_beam_size(value) == expected
+
+
+def test_clean_beam_size_default_for_greedy_callers():
+    assert clean_beam_size(None, default=1) == 1
+    assert clean_beam_size("x", default=1) == 1
+
+
+class FakeWhisper:
+    def __init__(self):
+        self.windows = []
+
+    def transcribe(self, audio, language=None, **options):
+        self.windows.append((audio.size, options))
+        n = len(self.windows)
+        return {"text": f" part {n} ", "segments": [{"avg_logprob": -0.1 * n}]}
+
+
+def _recording(path, speech_s, silence_s=2.0):
+    # silence, a loud tone standing in for speech, silence
+    t = np.arange(int(speech_s * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = 0.5 * np.sin(2 * np.pi * 220 * t).astype(np.float32)
+    quiet = np.zeros(int(silence_s * SAMPLE_RATE), dtype=np.float32)
+    return write_wav(str(path), np.concatenate([quiet, tone, quiet]))
+
+
+def test_celery_asr_trims_silence_and_windows_long_speech(monkeypatch, tmp_path):
+    model = FakeWhisper()
+    monkeypatch.setattr(whisper_registry, "get_model", lambda backend, size: model)
+    monkeypatch.setattr(transcriber, "ASR_WINDOW_SECONDS", 4.0)
+    monkeypatch.setattr(transcriber, "ASR_WINDOW_OVERLAP_SECONDS", 1.0)
+
+    text, confidence = asr.transcribe_audio(_recording(tmp_path / "call.wav", 9.0), beam_size="3")
+    assert text == "part 1 part 2 part 3"
+    sizes = [size for size, _ in model.windows]
+    # 9 s of speech (plus VAD padding) in 4 s windows, none of the 4 s of silence
+    assert len(sizes) == 3 and sizes[0] == 4 * SAMPLE_RATE
+    assert sum(sizes) < 12 * SAMPLE_RATE
+    assert all(options == {"beam_size": 3} for _, options in model.windows)
+    assert -0.3 < confidence < -0.1
+
+
+def test_celery_asr_skips_whisper_without_speech(monkeypatch, tmp_path):
+    model = FakeWhisper()
+    monkeypatch.setattr(whisper_registry, "get_model", lambda backend, size: model)
+    path = write_wav(str(tmp_path / "silence.wav"), np.zeros(3 * SAMPLE_RATE, dtype=np.float32))
+    assert asr.transcribe_audio(path) == ("", 0.0)
+    assert model.windows == []